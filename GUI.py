@@ -1,10 +1,18 @@
 import tkinter as tk
 from tkinter import scrolledtext, messagebox, font
-from PIL import Image, ImageTk, ImageDraw
 import ai_model
-from main import create_event
+import fast_parser
+import metrics
+from chat_feed import ChatFeed
+from history import history
+from image_cache import BubbleImageCache, cached_asset
+from outbox import outbox
 import os
 import sys
+import queue
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 class ModernChatUI:
     def __init__(self, master):
@@ -31,6 +39,7 @@ class ModernChatUI:
         self.header_font = font.Font(family="Helvetica", size=14, weight="bold")
 
         # Initialize images
+        self.bubble_cache = BubbleImageCache()
         self.triangle_image = None
         self.elf_image = None
         self.stars_image = None
@@ -68,7 +77,7 @@ class ModernChatUI:
             
             # Try to load stars image if it exists
             if os.path.exists(stars_path):
-                self.stars_image = ImageTk.PhotoImage(Image.open(stars_path).resize((120, 36)))
+                self.stars_image = self.create_stars_image(stars_path)
         except Exception as e:
             print(f"Image loading error: {e}")
             self.elf_image = self.create_default_avatar(size=32)
@@ -106,18 +115,25 @@ class ModernChatUI:
         self.chat_feed.pack(fill=tk.BOTH, expand=True, padx=10)
         
         # Scrollbar for the canvas
-        self.scrollbar = tk.Scrollbar(self.chat_feed, orient="vertical", command=self.chat_feed.yview)
+        self.scrollbar = tk.Scrollbar(self.chat_feed, orient="vertical")
         self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
         self.chat_feed.configure(yscrollcommand=self.scrollbar.set)
         
-        # Create a frame inside the canvas to hold messages
-        self.messages_frame = tk.Frame(self.chat_feed, bg=self.colors["bg"])
-        self.chat_feed.create_window((0, 0), window=self.messages_frame, anchor="nw", width=self.chat_feed.winfo_width())
-        
-        # Bind canvas resize to update the scrollable region
-        self.chat_feed.bind("<Configure>", self.on_canvas_configure)
-        self.messages_frame.bind("<Configure>", self.on_frame_configure)
+        # Messages are drawn straight onto the canvas; only bubbles near the viewport exist as items
+        self.feed = ChatFeed(
+            self.chat_feed,
+            self.colors,
+            self.message_font,
+            avatar_image=self.elf_image,
+            bubble_image=self.create_round_bubble_image,
+            on_scroll_top=self.load_older_history
+        )
+        # Earlier sessions are read from the history store a page at a time, only when scrolled to
+        self.first_logged_id = None
+        self.history_cursor = None
+        self.history_exhausted = False
+        self.scrollbar.configure(command=self.feed.yview)
 
         # Input area at the bottom
         self.input_area = tk.Frame(master, bg="#ffffff", height=60)
@@ -132,8 +148,9 @@ class ModernChatUI:
         self.input_frame = tk.Frame(self.input_area, bg="#f1f3f6", bd=0)
         self.input_frame.pack(fill=tk.X, expand=True, padx=10, pady=10)
         
-        # Make the input frame appear rounded by adding corners
-        self.round_input_frame()
+        # Make the input frame appear rounded once it has a size, and again on resize
+        self.input_bg_label = None
+        self.input_frame.bind("<Configure>", self.round_input_frame)
 
         # Entry widget for typing messages
         self.message_entry = tk.Entry(
@@ -177,18 +194,46 @@ class ModernChatUI:
         
         # Variable to store pending events
         self.pending_events = None
+        # The message they were parsed from, kept for the history store
+        self.pending_prompt = None
+        # The feed message asking to confirm them, updated in place when they are edited
+        self.confirmation_message = None
+        # Id of the outbox work preparing them while the user decides
+        self.pending_confirmation_id = None
+
+        # Parsed results still waiting for a yes/no
+        self.awaiting_confirmation = deque()
+
+        # Worker threads for AI calls. Calendar writes go through the outbox's own flusher thread.
+        self.ai_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="eventelf-ai")
+
+        # Workers post (request_id, kind, payload) tuples here; the Tk loop drains it
+        self.results = queue.Queue()
+        self.in_flight = {}
+        self.next_request_id = 0
+        self.master.after(50, self.poll_results)
+        outbox.add_listener(lambda results: self.results.put((None, "created", results)))
+        # Events confirmed in an earlier session that never reached the calendar are sent now
+        outbox.start()
+        self.message_entry.bind("<Escape>", self.cancel_requests)
+        master.protocol("WM_DELETE_WINDOW", self.on_close)
         
-        # Welcome message
-        self.master.after(500, lambda: self.append_message("EventElf", "Hello! I can help you create calendar events. What event would you like to schedule?"))
+        # Welcome message (not logged, it would repeat in every session's history)
+        self.create_message_bubble(
+            "EventElf",
+            "Hello! I can help you create calendar events. What event would you like to schedule?",
+            remember=False
+        )
 
     def create_default_avatar(self, size=40):
         """Create a default avatar when image files are missing"""
-        try:
+        def render():
+            from PIL import Image, ImageDraw
+
             img = Image.new('RGBA', (size, size), self.colors["accent"])
             draw = ImageDraw.Draw(img)
             
             # Add a text "EE" for EventElf in the center
-            font_size = size // 2
             draw.text((size//2, size//2), "EE", fill="white", anchor="mm")
             
             # Create a mask for circular cropping
@@ -199,15 +244,19 @@ class ModernChatUI:
             # Apply the mask to make it circular
             result = Image.new('RGBA', (size, size), (0, 0, 0, 0))
             result.paste(img, (0, 0), mask)
-            
-            return ImageTk.PhotoImage(result)
+            return result
+
+        try:
+            return cached_asset("default-avatar", (size, self.colors["accent"]), render)
         except Exception as e:
             print(f"Default avatar creation error: {e}")
             return None
     
     def create_circular_avatar(self, image_path, size=40):
         """Create a circular avatar image"""
-        try:
+        def render():
+            from PIL import Image, ImageDraw
+
             # Open the image
             img = Image.open(image_path)
             img = img.resize((size, size))
@@ -220,8 +269,11 @@ class ModernChatUI:
             # Apply the mask
             result = Image.new('RGBA', (size, size), (0, 0, 0, 0))
             result.paste(img, (0, 0), mask)
-            
-            return ImageTk.PhotoImage(result)
+            return result
+
+        try:
+            # The source file's mtime is part of the key so edits to elf.png are picked up
+            return cached_asset("avatar", (os.path.abspath(image_path), os.path.getmtime(image_path), size), render)
         except Exception as e:
             print(f"Avatar creation error: {e}")
             # Create a default avatar instead
@@ -229,7 +281,9 @@ class ModernChatUI:
 
     def create_send_icon(self, size=20):
         """Create a send button icon"""
-        try:
+        def render():
+            from PIL import Image, ImageDraw
+
             # Create a new image with an arrow
             img = Image.new('RGBA', (size, size), (0, 0, 0, 0))
             draw = ImageDraw.Draw(img)
@@ -246,159 +300,46 @@ class ModernChatUI:
                 (size//3*2, size//2)    # Middle-left indent
             ]
             draw.polygon(points, fill=arrow_color)
-            
-            return ImageTk.PhotoImage(img)
+            return img
+
+        try:
+            return cached_asset("send-icon", (size, self.colors["accent"]), render)
         except Exception as e:
             print(f"Send icon creation error: {e}")
             return None
 
-    def on_canvas_configure(self, event):
-        """Update the scrollable region when the canvas is resized"""
-        self.chat_feed.itemconfig(1, width=event.width)
-        
-    def on_frame_configure(self, event):
-        """Update the scrollable region when the frame changes size"""
-        self.chat_feed.configure(scrollregion=self.chat_feed.bbox("all"))
-        self.chat_feed.yview_moveto(1.0)  # Scroll to bottom
+    def create_stars_image(self, image_path):
+        """Load the decorative stars image"""
+        def render():
+            from PIL import Image
+
+            return Image.open(image_path).resize((120, 36))
+
+        return cached_asset("stars", (os.path.abspath(image_path), os.path.getmtime(image_path)), render)
 
     def create_round_bubble_image(self, width, height, color, radius=15):
-        """Create a round rectangle image for message bubbles"""
-        image = Image.new("RGBA", (width, height), (0, 0, 0, 0))
-        draw = ImageDraw.Draw(image)
-        
-        # Draw a rounded rectangle
-        draw.rounded_rectangle([(0, 0), (width, height)], radius, fill=color)
-        
-        return ImageTk.PhotoImage(image)
+        """Create a round rectangle image for message bubbles (memoized, width rounded up to a bucket)"""
+        return self.bubble_cache.get(width, height, color, radius)
     
-    def create_message_bubble(self, sender, message, is_user=False):
-        """Create a message bubble in the chat feed with rounder corners"""
-        # Frame for this message
-        message_frame = tk.Frame(self.messages_frame, bg=self.colors["bg"])
-        message_frame.pack(fill=tk.X, padx=10, pady=5)
-        
-        # Calculate appropriate width based on message length
-        message_width = min(len(message) * 8 + 50, 220)  # Limit max width
-        message_height = (len(message) // 30 + 1) * 20 + 16  # Estimate height
-        
-        if is_user:
-            # User message (right-aligned)
-            spacer = tk.Frame(message_frame, bg=self.colors["bg"], width=40)
-            spacer.pack(side=tk.LEFT, fill=tk.X, expand=True)
-            
-            # Create rounded bubble background
-            try:
-                bubble_bg = self.create_round_bubble_image(
-                    message_width, 
-                    message_height, 
-                    self.colors["user_bubble"],
-                    radius=18  # More rounded corners
-                )
-                
-                # Container for bubble
-                bubble_container = tk.Label(
-                    message_frame,
-                    image=bubble_bg,
-                    bg=self.colors["bg"],
-                    bd=0
-                )
-                bubble_container.image = bubble_bg  # Keep reference
-                bubble_container.pack(side=tk.RIGHT)
-                
-                # Text over the bubble
-                bubble = tk.Label(
-                    bubble_container,
-                    text=message,
-                    bg=self.colors["user_bubble"],
-                    fg=self.colors["user_text"],
-                    font=self.message_font,
-                    justify=tk.LEFT,
-                    anchor="w",
-                    padx=12,
-                    pady=8,
-                    wraplength=message_width - 24
-                )
-                bubble.place(relx=0.5, rely=0.5, anchor="center")
-            except Exception as e:
-                # Fallback if image creation fails
-                print(f"Bubble creation error: {e}")
-                bubble = tk.Label(
-                    message_frame,
-                    text=message,
-                    bg=self.colors["user_bubble"],
-                    fg=self.colors["user_text"],
-                    font=self.message_font,
-                    justify=tk.LEFT,
-                    anchor="w",
-                    padx=12,
-                    pady=8,
-                    wraplength=200,
-                    bd=0
-                )
-                bubble.pack(side=tk.RIGHT)
-        else:
-            # Bot message (left-aligned with avatar)
-            if self.elf_image:
-                avatar = tk.Label(message_frame, image=self.elf_image, bg=self.colors["bg"])
-                avatar.pack(side=tk.LEFT, padx=(0, 8))
-            
-            # Create rounded bubble background
-            try:
-                bubble_bg = self.create_round_bubble_image(
-                    message_width, 
-                    message_height, 
-                    self.colors["bot_bubble"],
-                    radius=18  # More rounded corners
-                )
-                
-                # Container for bubble
-                bubble_container = tk.Label(
-                    message_frame,
-                    image=bubble_bg,
-                    bg=self.colors["bg"],
-                    bd=0
-                )
-                bubble_container.image = bubble_bg  # Keep reference
-                bubble_container.pack(side=tk.LEFT)
-                
-                # Text over the bubble
-                bubble = tk.Label(
-                    bubble_container,
-                    text=message,
-                    bg=self.colors["bot_bubble"],
-                    fg=self.colors["bot_text"],
-                    font=self.message_font,
-                    justify=tk.LEFT,
-                    anchor="w",
-                    wraplength=message_width - 24
-                )
-                bubble.place(relx=0.5, rely=0.5, anchor="center")
-            except Exception as e:
-                # Fallback if image creation fails
-                print(f"Bubble creation error: {e}")
-                bubble = tk.Label(
-                    message_frame,
-                    text=message,
-                    bg=self.colors["bot_bubble"],
-                    fg=self.colors["bot_text"],
-                    font=self.message_font,
-                    justify=tk.LEFT,
-                    anchor="w",
-                    padx=12,
-                    pady=8,
-                    wraplength=200,
-                    bd=0
-                )
-                bubble.pack(side=tk.LEFT)
-            
-            # Add spacer to push the message to the left
-            spacer = tk.Frame(message_frame, bg=self.colors["bg"], width=40)
-            spacer.pack(side=tk.RIGHT, fill=tk.X, expand=True)
-        
-        # Update scrollable region and scroll to bottom
-        self.messages_frame.update_idletasks()
-        self.chat_feed.configure(scrollregion=self.chat_feed.bbox("all"))
-        self.chat_feed.yview_moveto(1.0)
+    def create_message_bubble(self, sender, message, is_user=False, remember=True):
+        """Add a message bubble to the chat feed and return its record"""
+        if remember:
+            message_id = history.log_message(message, is_user)
+            if self.first_logged_id is None:
+                self.first_logged_id = message_id
+        return self.feed.append(message, is_user)
+
+    def load_older_history(self):
+        """Insert the previous page of logged messages above the feed (runs when scrolled to the top)"""
+        if self.history_exhausted:
+            return
+        before = self.history_cursor if self.history_cursor is not None else self.first_logged_id
+        rows = history.messages_before(before, limit=30)
+        if not rows:
+            self.history_exhausted = True
+            return
+        self.history_cursor = rows[0][0]
+        self.feed.prepend([(text, is_user) for _, text, is_user in rows])
 
     def append_message(self, sender, message, is_user=False):
         """Append a message to the chat feed."""
@@ -413,58 +354,72 @@ class ModernChatUI:
         user_message = self.message_entry.get().strip()
         if not user_message:
             return  # Do nothing if the input is empty
-            
-        # Check if we're waiting for a yes/no response to event confirmation
-        if self.pending_events is not None:
-            if user_message.lower() in ["yes", "y"]:
+
+        # Check if we're waiting for a yes/no response to event confirmation;
+        # "cancel" then declines the events rather than cancelling requests
+        answer = fast_parser.confirmation_answer(user_message) if self.pending_events is not None else None
+        if answer is None and user_message.lower() == "cancel":
+            self.message_entry.delete(0, tk.END)
+            self.cancel_requests()
+            return
+
+        if answer is not None:
+            self.message_entry.delete(0, tk.END)
+            if answer == "yes":
                 self.create_pending_events()
             else:
                 self.append_message("EventElf", "Event creation cancelled. What else would you like to schedule?")
+                if self.pending_prompt is not None:
+                    history.record(self.pending_prompt, self.pending_events, confirmed=False)
+                outbox.discard(self.pending_confirmation_id)
                 self.pending_events = None
+                self.show_next_confirmation()
+            return
+        if self.pending_events is not None and (
+            fast_parser.refers_to_events(user_message)
+            or fast_parser.apply_edit(self.pending_events, user_message) is not None
+        ):
+            # A change to the pending events ("make it 3pm"); anything else is a new request and is queued
             self.message_entry.delete(0, tk.END)
+            self.edit_pending_events(user_message)
             return
 
         # Append the user's message to the chat feed
         self.append_message("You", user_message, is_user=True)
         self.message_entry.delete(0, tk.END)
 
-        # Create a temporary "thinking" message
-        thinking_frame = tk.Frame(self.messages_frame, bg=self.colors["bg"])
-        thinking_frame.pack(fill=tk.X, padx=10, pady=5)
-        
-        if self.elf_image:
-            avatar = tk.Label(thinking_frame, image=self.elf_image, bg=self.colors["bg"])
-            avatar.pack(side=tk.LEFT, padx=(0, 8))
-        
-        thinking_bubble = tk.Label(
-            thinking_frame,
-            text="Thinking...",
-            bg=self.colors["bot_bubble"],
-            fg=self.colors["bot_text"],
-            font=self.message_font,
-            padx=12,
-            pady=8
-        )
-        thinking_bubble.pack(side=tk.LEFT)
-        
-        # Update scrollable region and scroll to bottom
-        self.messages_frame.update_idletasks()
-        self.chat_feed.configure(scrollregion=self.chat_feed.bbox("all"))
-        self.chat_feed.yview_moveto(1.0)
-        
-        # Process the AI response after a short delay to simulate thinking
-        self.master.after(100, lambda: self.process_ai_response(user_message, thinking_frame))
+        # Show a "thinking" bubble until the worker's result arrives
+        thinking_message = self.show_thinking_bubble()
 
-    def round_input_frame(self):
-        """Apply rounded corners to the input frame"""
+        # Process the message on a worker thread so the window stays responsive
+        request_id = self.next_request_id
+        self.next_request_id += 1
+        future = self.ai_executor.submit(self.process_ai_response, request_id, user_message)
+        self.in_flight[request_id] = (future, thinking_message, time.perf_counter())
+
+    def show_thinking_bubble(self):
+        """Add a temporary "Thinking..." message to the chat feed and return its record"""
+        return self.feed.append("Thinking...", is_user=False)
+
+    def cancel_requests(self, event=None):
+        """Cancel every message that is still waiting for the AI model"""
+        if not self.in_flight:
+            return
+        count = len(self.in_flight)
+        for future, thinking_message, _ in self.in_flight.values():
+            # Queued work is dropped; running work finishes but its result is ignored
+            future.cancel()
+            self.feed.remove(thinking_message)
+        self.in_flight.clear()
+        self.append_message("EventElf", f"Cancelled {count} request(s).")
+
+    def round_input_frame(self, event=None):
+        """Apply rounded corners to the input frame (runs whenever the frame is resized)"""
         try:
-            # Get dimensions of the input frame
-            self.input_frame.update_idletasks()
             width = self.input_frame.winfo_width()
             height = self.input_frame.winfo_height()
             
             if width <= 1 or height <= 1:  # Not yet properly sized
-                self.master.after(100, self.round_input_frame)
                 return
                 
             # Create rounded rectangle background
@@ -475,46 +430,201 @@ class ModernChatUI:
                 radius=20  # Very rounded corners
             )
             
-            # Apply the rounded background
-            bg_label = tk.Label(self.input_frame, image=rounded_bg, bg=self.colors["bg"])
-            bg_label.image = rounded_bg  # Keep reference
-            bg_label.place(x=0, y=0)
+            # Apply the rounded background, reusing the label on later resizes
+            if self.input_bg_label is None:
+                self.input_bg_label = tk.Label(self.input_frame, bg=self.colors["bg"], bd=0)
+                self.input_bg_label.place(x=0, y=0)
+            self.input_bg_label.configure(image=rounded_bg)
+            self.input_bg_label.image = rounded_bg  # Keep reference
             
             # Bring entry and button to front
-            self.message_entry.lift()
-            self.send_button.lift()
+            self.input_bg_label.lower()
         except Exception as e:
             print(f"Input frame rounding error: {e}")
     
-    def process_ai_response(self, user_message, thinking_frame):
-        """Process user message and get AI response"""
-        # Remove the "thinking" message frame
-        thinking_frame.destroy()
-        
-        # Process the message using ai_model.py
-        ai_model.run_conversation(user_message, self.handle_event_response)
+    def edit_pending_events(self, edit):
+        """Apply a follow-up edit to the pending events, locally if possible"""
+        self.append_message("You", edit, is_user=True)
+        events = self.pending_events
+        edited = ai_model.edit_events(events, edit, use_model=False)
+        if edited is not None:
+            self.show_edited_events(events, edited)
+            return
+
+        # Only the pending events and the edit go to the model, not the original message
+        thinking_message = self.show_thinking_bubble()
+        request_id = self.next_request_id
+        self.next_request_id += 1
+        future = self.ai_executor.submit(self.process_edit, request_id, events, edit)
+        self.in_flight[request_id] = (future, thinking_message, time.perf_counter())
+
+    def process_edit(self, request_id, events, edit):
+        """Ask the model to apply an edit the local patcher did not understand (runs on a worker thread)"""
+        try:
+            edited = ai_model.edit_events(events, edit)
+        except Exception as e:
+            print(f"Edit failed: {e}")
+            edited = None
+        self.results.put((request_id, "edited", (events, edited)))
+
+    def show_edited_events(self, events, edited):
+        """Replace the pending events with their edited version and update the confirmation in place"""
+        if self.pending_events is not events:
+            return  # Confirmed or cancelled while the edit was being worked out
+        if edited is None:
+            self.append_message(
+                "EventElf",
+                "I couldn't work out that change. Reply yes to create the events, no to cancel, "
+                "or describe the change differently."
+            )
+            return
+        if edited == events:
+            self.append_message("EventElf", "Those events already look like that. Create them now? (yes/no)")
+            return
+        self.pending_events = edited
+        outbox.discard(self.pending_confirmation_id)
+        self.pending_confirmation_id = outbox.prepare(edited)
+        confirmation_text = ai_model.build_confirmation_text(edited)
+        if self.confirmation_message in self.feed.messages:
+            self.feed.update(self.confirmation_message, confirmation_text)
+            self.append_message("EventElf", "Updated the events above. Create them now? (yes/no)")
+        else:
+            self.confirmation_message = self.create_message_bubble("EventElf", confirmation_text)
+
+    def process_ai_response(self, request_id, user_message):
+        """Process user message and get AI response (runs on a worker thread)"""
+        def on_events(events, response_text):
+            self.results.put((request_id, "events", (events, response_text, user_message)))
+
+        def on_partial_event(index, event):
+            self.results.put((request_id, "partial", (index, event)))
+
+        try:
+            # Process the message using ai_model.py, streaming events as they are parsed
+            response_text = ai_model.run_conversation(user_message, on_events, on_event=on_partial_event)
+            if response_text is not None:
+                self.results.put((request_id, "message", response_text))
+        except Exception as e:
+            self.results.put((request_id, "message", f"Error processing your message: {str(e)}"))
+
+    def poll_results(self):
+        """Drain results posted by worker threads; Tk widgets are only touched here"""
+        try:
+            while True:
+                request_id, kind, payload = self.results.get_nowait()
+                self.handle_result(request_id, kind, payload)
+        except queue.Empty:
+            pass
+        self.master.after(50, self.poll_results)
+
+    def handle_result(self, request_id, kind, payload):
+        """Dispatch one worker result on the Tk main thread"""
+        if kind == "created":
+            self.handle_created_events(payload)
+            return
 
-    def handle_event_response(self, events, response_text):
+        if kind == "partial":
+            entry = self.in_flight.get(request_id)
+            if entry is not None:
+                self.show_partial_event(entry[1], *payload)
+            return
+
+        entry = self.in_flight.pop(request_id, None)
+        if entry is None:
+            return  # The request was cancelled
+        # Time from pressing send to the reply reaching the Tk thread
+        metrics.observe("gui_response", time.perf_counter() - entry[2], kind=kind)
+        # Replace the "thinking" bubble with the actual response
+        self.feed.remove(entry[1])
+
+        if kind == "events":
+            self.handle_event_response(*payload)
+        elif kind == "edited":
+            self.show_edited_events(*payload)
+        else:
+            self.append_message("EventElf", payload)
+
+    def show_partial_event(self, thinking_message, index, event):
+        """Show a streamed event in the "thinking" bubble before the full response is done"""
+        thinking_message.partial_events[index] = event
+        lines = ["Thinking... parsed so far:"]
+        for i in sorted(thinking_message.partial_events):
+            partial = thinking_message.partial_events[i]
+            lines.append(
+                f"Event {i+1}: {partial.get('title', 'N/A')}, {partial.get('date', 'N/A')} "
+                f"{partial.get('start_time', 'N/A')}-{partial.get('end_time', 'N/A')}"
+            )
+        self.feed.update(thinking_message, "\n".join(lines))
+
+    def handle_event_response(self, events, response_text, prompt=None):
         """Callback function to handle the parsed events and response"""
+        # Confirmations are asked one at a time, in the order results arrive
+        self.awaiting_confirmation.append((events, response_text, prompt))
+        if self.pending_events is None:
+            self.show_next_confirmation()
+
+    def show_next_confirmation(self):
+        """Ask the user to confirm the next set of parsed events, if any"""
+        if not self.awaiting_confirmation:
+            return
+        events, response_text, prompt = self.awaiting_confirmation.popleft()
         self.pending_events = events
-        self.append_message("EventElf", response_text)
+        self.pending_prompt = prompt
+        self.confirmation_message = self.create_message_bubble("EventElf", response_text)
+        # Build the requests and ready the Calendar connection while the user reads this
+        self.pending_confirmation_id = outbox.prepare(events)
 
     def create_pending_events(self):
         """Create the pending events that were confirmed by the user"""
+        events = self.pending_events
+        self.pending_events = None
         try:
-            for event in self.pending_events:
-                create_calendar_event_result = create_event(event)
-            
-            self.append_message("EventElf", f"Successfully created {len(self.pending_events)} event(s) in your calendar.")
+            # Saved locally first; the outbox flusher sends them and reports back
+            event_ids = outbox.enqueue(events, confirmation_id=self.pending_confirmation_id)
+            if self.pending_prompt is not None:
+                # Retries of failed events have no prompt; they were recorded the first time
+                history.record(self.pending_prompt, events, event_ids)
+            self.append_message("EventElf", f"Got it! Adding {len(events)} event(s) to your calendar.")
         except Exception as e:
-            self.append_message("EventElf", f"Error creating event: {str(e)}")
-        
-        # Reset pending events
-        self.pending_events = None
+            self.append_message("EventElf", f"Error saving event: {str(e)}")
+        self.show_next_confirmation()
+
+    def handle_created_events(self, results):
+        """Report events the outbox has finished with (created, or failed for good)"""
+        failed = [result for result in results if result["error"] is not None]
+        created = len(results) - len(failed)
+
+        if not failed:
+            self.append_message("EventElf", f"Successfully created {created} event(s) in your calendar.")
+            return
 
-def main():
+        errors = "\n".join(
+            f"{result['event'].get('title', 'N/A')}: {result['error']}" for result in failed
+        )
+        self.append_message("EventElf", f"Created {created} event(s), but {len(failed)} failed:\n{errors}")
+        # Offer the failed events on their own, after any confirmation already on screen
+        self.handle_event_response(
+            [result["event"] for result in failed],
+            "Do you want to retry the failed events? (yes/no)"
+        )
+
+    def on_close(self):
+        """Stop the worker threads and close the window"""
+        self.ai_executor.shutdown(wait=False, cancel_futures=True)
+        outbox.stop()
+        self.master.destroy()
+
+def main(on_first_frame=None):
     root = tk.Tk()
     app = ModernChatUI(root)
+
+    if on_first_frame is not None:
+        def first_frame(event):
+            root.unbind("<Map>")
+            # Idle callbacks run once the mapped window has been drawn
+            root.after_idle(on_first_frame)
+        root.bind("<Map>", first_frame)
+
     root.mainloop()
 
 if __name__ == "__main__":
@@ -1,17 +1,54 @@
-from openai import OpenAI
 from config.config import API_KEY
 import json
 from datetime import datetime
-from main import create_event
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
+import contextvars
+import threading
+import time
+from calendar_service import create_event
+import calendar_mirror
+import chunking
+import fast_parser
+from history import history
+import metrics
+import recurrence
+import response_cache
+import scheduler
 
-client = OpenAI(api_key=API_KEY)
+# The OpenAI SDK is slow to import, so the client is built on first use (or by warm_up)
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
+
+# How often each parsing path is taken: "local" (fast_parser), "cache" (response_cache),
+# "history" (a past confirmed event) or "model" (OpenAI)
+parse_path_counts = Counter()
+_stats_lock = threading.Lock()
+
+# Occurrences of a recurring event listed in the confirmation
+PREVIEW_OCCURRENCES = 5
+
+# Chunks of a long paste extracted at once (the OpenAI backend caps concurrency anyway)
+MAX_CHUNK_WORKERS = 8
+
+# Caps on one completion and on the size of each tool call's arguments; a chunk of a long
+# paste (at most chunking.MAX_CHUNK_DATES events) fits comfortably
+MAX_COMPLETION_TOKENS = 2048
+MAX_TITLE_CHARS = 200
+MAX_RECURRENCE_CHARS = 200
+MAX_REMINDER_MINUTES = 40320  # Google Calendar allows reminders up to four weeks before
+
+NO_EVENTS_MESSAGE = "No event details were parsed from your message. Please provide more specific details about the event."
 
 tool_parameters = {
     "type": "object",
     "properties": {
         "title": {
             "type": "string",
-            "description": "The title of the calendar event"
+            "description": "The title of the calendar event",
+            "maxLength": MAX_TITLE_CHARS
         },
         "date": {
             "type": "string",
@@ -27,84 +64,527 @@ tool_parameters = {
         },
         "recurrence": {
             "type": "string",
-            "description": "Recurrence rule in RRULE format (e.g., 'RRULE:FREQ=WEEKLY;BYDAY=Mon') if the event repeats"
+            "description": "Recurrence rule in RRULE format (e.g., 'RRULE:FREQ=WEEKLY;BYDAY=MO') if the event repeats",
+            "maxLength": MAX_RECURRENCE_CHARS
         },
         "reminder": {
             "type": "integer",
-            "description": "Reminder time in minutes before the event start"
+            "description": "Reminder time in minutes before the event start",
+            "minimum": 0,
+            "maximum": MAX_REMINDER_MINUTES
         }
     },
     "required": ["title", "date", "start_time", "end_time"],
     "additionalProperties": False
 }
 
-def run_conversation(content, callback=None):
+# Everything up to the user's message is identical on every request, so the provider can
+# reuse its prompt cache for it; the date and the message follow as a short suffix
+SYSTEM_PROMPT = (
+    "You turn messages into Google Calendar events. Call create_calendar_event once for "
+    "every event the message describes, and never for anything else. Resolve relative dates "
+    "(\"tomorrow\", \"next Friday\") against the date given with the message. Use 24-hour HH:MM "
+    "times; if no end time is given, make the event one hour long. Only set recurrence for "
+    "events that repeat, as an RRULE with two-letter day codes (MO, TU, WE, TH, FR, SA, SU). "
+    "Only set reminder when the message asks for one."
+)
+
+TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "create_calendar_event",
+            "description": "Create a calendar event based on the given parameters (like title, date, start time, end time, recurrence, and reminder)",
+            "parameters": tool_parameters,
+        },
+    }
+]
+
+_SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+
+# Keyword arguments shared by every chat.completions.create call
+REQUEST_OPTIONS = {
+    "model": "gpt-4o-mini",
+    "tools": TOOLS,
+    "tool_choice": "auto",
+    "max_tokens": MAX_COMPLETION_TOKENS,
+}
+
+def get_client():
+    """Returns the shared OpenAI client, importing the SDK and building it on first use"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            from openai import OpenAI
+
+            # scheduler retries; SDK retries underneath would hide 429s from its rate limiter
+            _client = OpenAI(api_key=API_KEY, max_retries=0)
+        return _client
+
+def get_async_client():
+    """Returns the shared AsyncOpenAI client; its connection pool is reused across requests"""
+    global _async_client
+    with _client_lock:
+        if _async_client is None:
+            from openai import AsyncOpenAI
+
+            _async_client = AsyncOpenAI(api_key=API_KEY, max_retries=0)
+        return _async_client
+
+def warm_up():
+    """Builds the OpenAI client ahead of the first message"""
+    get_client()
+
+def get_parse_path_stats():
+    """Returns how many messages took the local fast path, the response cache, the history or the OpenAI model"""
+    with _stats_lock:
+        local = parse_path_counts["local"]
+        cache = parse_path_counts["cache"]
+        past = parse_path_counts["history"]
+        model = parse_path_counts["model"]
+    total = local + cache + past + model
+    return {
+        "local": local,
+        "cache": cache,
+        "history": past,
+        "model": model,
+        "local_ratio": local / total if total else 0.0,
+        "response_cache": response_cache.stats()
+    }
+
+def _count_path(path):
+    with _stats_lock:
+        parse_path_counts[path] += 1
+    metrics.inc(f"parse_path_{path}")
+
+def _record_usage(usage):
+    """Counts the tokens an OpenAI response reports in response.usage"""
+    if usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    metrics.inc("openai_calls")
+    metrics.inc("openai_prompt_tokens", usage.prompt_tokens or 0)
+    metrics.inc("openai_cached_tokens", getattr(details, "cached_tokens", None) or 0)
+    metrics.inc("openai_completion_tokens", usage.completion_tokens or 0)
+
+def _recurrence_preview(event):
+    """(rule as it will be sent, preview or warning line) for a recurring event, all computed locally"""
+    rule = event.get("recurrence")
+    try:
+        start = calendar_mirror.event_span(event)[0].replace(tzinfo=None)
+    except (KeyError, ValueError):
+        start = None
+    try:
+        rule = recurrence.normalize_rule(rule, start)
+    except ValueError as e:
+        return rule, f"  Warning: Invalid recurrence rule ({e}); this event will not be created as is"
+    if start is None:
+        return rule, None
+    dates = recurrence.preview(start, rule, PREVIEW_OCCURRENCES)
+    if not dates:
+        return rule, "  Warning: This rule never selects a date on or after the start date"
+    return rule, "  Next: " + ", ".join(date.strftime("%a %Y-%m-%d") for date in dates)
+
+def build_confirmation_text(events, notes=()):
+    """Builds a confirmation message that lists each event's details, then any notes"""
+    confirmation_text = "I parsed the following events:\n"
+    for i, event in enumerate(events):
+        confirmation_text += (
+            f"Event {i+1}: Title: {event.get('title', 'N/A')}, "
+            f"Date: {event.get('date', 'N/A')}, "
+            f"Start Time: {event.get('start_time', 'N/A')}, "
+            f"End Time: {event.get('end_time', 'N/A')}"
+        )
+        preview = None
+        if event.get("recurrence"):
+            rule, preview = _recurrence_preview(event)
+            confirmation_text += f", Recurrence: {rule}"
+        if "reminder" in event:
+            confirmation_text += f", Reminder: {event.get('reminder')} minutes before"
+        confirmation_text += "\n"
+        if preview:
+            confirmation_text += preview + "\n"
+        # Checked against the local calendar mirror, so this never waits on the network
+        for note in calendar_mirror.mirror.describe_conflicts(event):
+            confirmation_text += f"  Warning: {note}\n"
+    for note in notes:
+        confirmation_text += f"Note: {note}\n"
+    confirmation_text += "Do you want to create these events? (yes/no)"
+    return confirmation_text
+
+def _respond(events, callback, notes=()):
+    """Hands parsed events to the callback, or returns the confirmation text"""
+    confirmation_text = build_confirmation_text(events, notes)
+    if callback:
+        # Pass the events and confirmation text to the callback function
+        callback(events, confirmation_text)
+        return None
+    else:
+        return confirmation_text
+
+class StreamingToolCallParser:
+    """
+    Rebuilds tool_call.function.arguments from streamed chat completion deltas.
+
+    Each tool call's JSON is scanned as it arrives, and feed() returns the events
+    whose argument object just closed, so they can be shown before the stream ends.
+    """
+
+    def __init__(self):
+        self.arguments = {}
+        self.events = {}
+        self._scan = {}
+
+    def feed(self, tool_call_deltas):
+        """Adds one chunk's tool call deltas and returns (index, event) for each newly completed event"""
+        completed = []
+        for delta in tool_call_deltas or []:
+            index = delta.index
+            fragment = delta.function.arguments if delta.function else None
+            if not fragment or index in self.events:
+                continue
+            self.arguments[index] = self.arguments.get(index, "") + fragment
+            if self._closes_object(index, fragment):
+                try:
+                    event = _limit_arguments(json.loads(self.arguments[index]))
+                except json.JSONDecodeError:
+                    continue
+                self.events[index] = event
+                completed.append((index, event))
+        return completed
+
+    def finish(self):
+        """Returns every parsed event in tool call order; raises JSONDecodeError on a broken call"""
+        for index, arguments in self.arguments.items():
+            if index not in self.events:
+                self.events[index] = _limit_arguments(json.loads(arguments))
+        return [self.events[index] for index in sorted(self.events)]
+
+    def _closes_object(self, index, fragment):
+        """Tracks brace depth outside of strings; True once the top-level object closes"""
+        depth, in_string, escaped = self._scan.get(index, (0, False, False))
+        closed = False
+        for char in fragment:
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == "\\":
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char == "{":
+                depth += 1
+            elif char == "}":
+                depth -= 1
+                closed = depth == 0
+        self._scan[index] = (depth, in_string, escaped)
+        return closed
+
+def run_conversation(content, callback=None, on_event=None):
     """
     Process user input through OpenAI API to extract event parameters.
     
     Args:
         content: User input string
         callback: Optional callback function to handle parsed events
+        on_event: Optional function called with (index, event) as soon as each event's
+            arguments are complete. Passing it streams the OpenAI response.
         
     Returns:
         Response text if no callback is provided, or None if callback is used
     """
-    today_str = datetime.now().strftime("%Y-%m-%d")
-    conversation_prompt = f"Today's date is {today_str}. " + content
+    with metrics.request(), metrics.timer("run_conversation"):
+        return _run_conversation(content, callback, on_event)
 
-    messages = [{"role": "user", "content": conversation_prompt}]
-    tools = [
-        {
-        "type": "function",
-        "function": {
-            "name": "create_calendar_event",
-            "description": "Create a calendar event based on the given parameters (like title, date, start time, end time, recurrence, and reminder)",
-            "parameters": tool_parameters,
-        },
-    }]
-    
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=messages,
-        tools=tools,
-        tool_choice="auto"
-    )
-    response_message = response.choices[0].message
-    tool_calls = response_message.tool_calls
+def _run_conversation(content, callback, on_event):
+    events = _local_events(content)
+    if events is not None:
+        return _respond(events, callback)
 
-    if tool_calls:
-        events = []
-        for tool_call in tool_calls:
-            try:
-                event_params = json.loads(tool_call.function.arguments)
-                events.append(event_params)
-            except json.JSONDecodeError:
-                return "Error parsing event parameters."
-        
+    # Long pastes (syllabi, agendas) are extracted in parallel chunks
+    chunks = chunking.split_schedule(content)
+    if len(chunks) > 1:
+        events, notes = _extract_chunks(chunks, on_event)
         if not events:
-            return "No valid event details were parsed."
-        
-        # Build a confirmation message that lists each event's details.
-        confirmation_text = "I parsed the following events:\n"
-        for i, event in enumerate(events):
-            confirmation_text += (
-                f"Event {i+1}: Title: {event.get('title', 'N/A')}, "
-                f"Date: {event.get('date', 'N/A')}, "
-                f"Start Time: {event.get('start_time', 'N/A')}, "
-                f"End Time: {event.get('end_time', 'N/A')}"
-            )
-            if "recurrence" in event:
-                confirmation_text += f", Recurrence: {event.get('recurrence')}"
-            if "reminder" in event:
-                confirmation_text += f", Reminder: {event.get('reminder')} minutes before"
-            confirmation_text += "\n"
-        confirmation_text += "Do you want to create these events? (yes/no)"
-        
-        if callback:
-            # Pass the events and confirmation text to the callback function
-            callback(events, confirmation_text)
-            return None
-        else:
-            return confirmation_text
+            return NO_EVENTS_MESSAGE
+        response_cache.put(content, events)
+        return _respond(events, callback, notes)
+
+    messages = _model_messages(content)
+    if on_event is not None:
+        try:
+            events = _stream_tool_calls(messages, on_event)
+        except json.JSONDecodeError:
+            return "Error parsing event parameters."
+        if events is None:
+            return NO_EVENTS_MESSAGE
     else:
-        return "No event details were parsed from your message. Please provide more specific details about the event."
\ No newline at end of file
+        with metrics.timer("openai_request"):
+            response = scheduler.call(
+                "openai",
+                get_client().chat.completions.create,
+                messages=messages,
+                **REQUEST_OPTIONS
+            )
+        _record_usage(response.usage)
+        response_message = response.choices[0].message
+        tool_calls = response_message.tool_calls
+
+        if not tool_calls:
+            return NO_EVENTS_MESSAGE
+
+        try:
+            events = _events_from_tool_calls(tool_calls)
+        except json.JSONDecodeError:
+            return "Error parsing event parameters."
+
+    if not events:
+        return "No valid event details were parsed."
+
+    response_cache.put(content, events)
+    return _respond(events, callback)
+
+async def run_conversation_async(content):
+    """
+    Async variant of run_conversation for the service mode.
+
+    Returns:
+        (events, text): the parsed events (None if nothing was parsed) and the
+        confirmation or error text
+    """
+    # The history is the desktop user's own, so it is not consulted for service users.
+    # The cache lookup and writes touch SQLite, so they run off the event loop.
+    events = await asyncio.to_thread(_local_events, content, use_history=False)
+    notes = []
+    chunks = chunking.split_schedule(content) if events is None else [content]
+    if len(chunks) > 1:
+        results = await asyncio.gather(
+            *(_extract_chunk_async(chunk, i, len(chunks)) for i, chunk in enumerate(chunks)),
+            return_exceptions=True
+        )
+        events, notes = _merge_chunk_results(results)
+        if not events:
+            return None, NO_EVENTS_MESSAGE
+        await asyncio.to_thread(response_cache.put, content, events)
+    elif events is None:
+        messages = _model_messages(content)
+        with metrics.timer("openai_request"):
+            response = await scheduler.acall(
+                "openai",
+                get_async_client().chat.completions.create,
+                messages=messages,
+                **REQUEST_OPTIONS
+            )
+        _record_usage(response.usage)
+        tool_calls = response.choices[0].message.tool_calls
+        if not tool_calls:
+            return None, NO_EVENTS_MESSAGE
+        try:
+            events = _events_from_tool_calls(tool_calls)
+        except json.JSONDecodeError:
+            return None, "Error parsing event parameters."
+        if not events:
+            return None, "No valid event details were parsed."
+        await asyncio.to_thread(response_cache.put, content, events)
+    return events, build_confirmation_text(events, notes)
+
+def edit_events(events, edit, use_model=True):
+    """
+    Applies a follow-up edit ("make it 3pm", "move it to Thursday") to events awaiting confirmation.
+
+    The local patcher handles the common edits; anything else goes to a small model call
+    that sees only the pending events and the edit, not the original message.
+
+    Returns:
+        The edited events, or None if the edit could not be applied
+    """
+    edited = fast_parser.apply_edit(events, edit)
+    if edited is not None:
+        metrics.inc("edit_local")
+        return edited
+    if not use_model:
+        return None
+
+    metrics.inc("edit_model")
+    messages = _model_messages(
+        "These calendar events are awaiting confirmation:\n"
+        f"{json.dumps(events)}\n"
+        f"Apply this change: {edit}\n"
+        "Call create_calendar_event once per event, in the same order, with every field of the updated event."
+    )
+    with metrics.timer("openai_request", kind="edit"):
+        response = scheduler.call(
+            "openai",
+            get_client().chat.completions.create,
+            messages=messages,
+            **REQUEST_OPTIONS
+        )
+    _record_usage(response.usage)
+    tool_calls = response.choices[0].message.tool_calls
+    if not tool_calls:
+        return None
+    try:
+        edited = _events_from_tool_calls(tool_calls)
+    except json.JSONDecodeError:
+        return None
+    return edited or None
+
+def _local_events(content, use_history=True):
+    """Events from the local fast path, the response cache or the history, or None if the model is needed"""
+    # Simple phrasings are parsed locally without an API call; the fast parser finds one
+    # event, so text with several dated lines always goes further
+    single = chunking.date_lines(content) <= 1
+    if single:
+        event, confidence = fast_parser.parse_event(content)
+        if event is not None and confidence >= fast_parser.CONFIDENCE_THRESHOLD:
+            _count_path("local")
+            return [event]
+
+    # Prompts seen before are answered from the date-normalized cache
+    cached_events = response_cache.get(content)
+    if cached_events:
+        _count_path("cache")
+        return cached_events
+
+    # "Book the usual 1:1 with Sam" reuses the fields of a past confirmed event
+    if single and use_history:
+        past_events = history.lookup(content)
+        if past_events:
+            _count_path("history")
+            return past_events
+    _count_path("model")
+    return None
+
+def _model_messages(content):
+    """The messages for an OpenAI request: the shared system block, then the dated user message"""
+    today_str = datetime.now().strftime("%Y-%m-%d (%A)")
+    return [_SYSTEM_MESSAGE, {"role": "user", "content": f"Today's date is {today_str}.\n{content}"}]
+
+def _limit_arguments(event):
+    """Drops unknown fields from one tool call's arguments and cuts oversized values down to size"""
+    if not isinstance(event, dict):
+        return {}
+    event = {key: value for key, value in event.items() if key in tool_parameters["properties"]}
+    for key, limit in (("title", MAX_TITLE_CHARS), ("recurrence", MAX_RECURRENCE_CHARS)):
+        if isinstance(event.get(key), str) and len(event[key]) > limit:
+            event[key] = event[key][:limit]
+    if isinstance(event.get("reminder"), int):
+        event["reminder"] = min(max(event["reminder"], 0), MAX_REMINDER_MINUTES)
+    return event
+
+def _chunk_prompt(chunk, index, total):
+    return (
+        f"This is part {index + 1} of {total} of a longer schedule. "
+        f"Create an event for every item listed in this part:\n{chunk}"
+    )
+
+def _extract_chunk(chunk, index, total):
+    """Extracts the events of one chunk of a long paste with a single tool-call completion"""
+    messages = _model_messages(_chunk_prompt(chunk, index, total))
+    with metrics.timer("openai_request", chunk=index):
+        response = scheduler.call(
+            "openai",
+            get_client().chat.completions.create,
+            messages=messages,
+            **REQUEST_OPTIONS
+        )
+    _record_usage(response.usage)
+    return _events_from_tool_calls(response.choices[0].message.tool_calls or [])
+
+async def _extract_chunk_async(chunk, index, total):
+    messages = _model_messages(_chunk_prompt(chunk, index, total))
+    with metrics.timer("openai_request", chunk=index):
+        response = await scheduler.acall(
+            "openai",
+            get_async_client().chat.completions.create,
+            messages=messages,
+            **REQUEST_OPTIONS
+        )
+    _record_usage(response.usage)
+    return _events_from_tool_calls(response.choices[0].message.tool_calls or [])
+
+def _merge_chunk_results(results):
+    """(merged events, notes) from per-chunk event lists or exceptions, in chunk order"""
+    failures = [result for result in results if isinstance(result, Exception)]
+    if len(failures) == len(results):
+        raise failures[0]
+    notes = []
+    for index, result in enumerate(results):
+        if isinstance(result, Exception):
+            metrics.inc("chunk_failures")
+            notes.append(
+                f"Part {index + 1} of your message could not be read ({result}), so its events may be missing."
+            )
+    events = chunking.merge_events(result for result in results if not isinstance(result, Exception))
+    return events, notes
+
+def _extract_chunks(chunks, on_event=None):
+    """
+    Extracts the chunks of a long paste concurrently and merges their events.
+
+    Latency is that of the slowest chunk rather than the sum. With on_event, each new
+    (deduplicated) event is reported as soon as its chunk finishes.
+    """
+    metrics.inc("chunked_prompts")
+    metrics.inc("prompt_chunks", len(chunks))
+    results = [None] * len(chunks)
+    reported = set()
+    with ThreadPoolExecutor(max_workers=min(len(chunks), MAX_CHUNK_WORKERS), thread_name_prefix="eventelf-chunk") as executor:
+        # Each chunk runs in a copy of this context so its spans keep the request id
+        futures = {
+            executor.submit(contextvars.copy_context().run, _extract_chunk, chunk, i, len(chunks)): i
+            for i, chunk in enumerate(chunks)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                results[index] = e
+                continue
+            if on_event is not None:
+                for event in results[index]:
+                    key = chunking.event_key(event)
+                    if key not in reported:
+                        on_event(len(reported), event)
+                        reported.add(key)
+    return _merge_chunk_results(results)
+
+def _events_from_tool_calls(tool_calls):
+    """Decodes each tool call's arguments; raises json.JSONDecodeError on malformed JSON"""
+    return [_limit_arguments(json.loads(tool_call.function.arguments)) for tool_call in tool_calls]
+
+def _stream_tool_calls(messages, on_event):
+    """Streams the completion, reporting each event as soon as its JSON is complete"""
+    started = time.perf_counter()
+    parser = StreamingToolCallParser()
+    saw_tool_calls = False
+    first_chunk = True
+    with scheduler.stream(
+        "openai",
+        get_client().chat.completions.create,
+        messages=messages,
+        **REQUEST_OPTIONS,
+        stream=True,
+        # The final chunk then carries the token usage
+        stream_options={"include_usage": True}
+    ) as stream:
+        for chunk in stream:
+            if first_chunk:
+                metrics.observe("openai_first_chunk", time.perf_counter() - started)
+                first_chunk = False
+            if getattr(chunk, "usage", None) is not None:
+                _record_usage(chunk.usage)
+            if not chunk.choices:
+                continue
+            tool_call_deltas = chunk.choices[0].delta.tool_calls
+            if tool_call_deltas:
+                saw_tool_calls = True
+            for index, event in parser.feed(tool_call_deltas):
+                on_event(index, event)
+    metrics.observe("openai_request", time.perf_counter() - started)
+    if not saw_tool_calls:
+        return None
+    return parser.finish()
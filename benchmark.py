@@ -0,0 +1,555 @@
+"""
+Offline benchmark for the parse and create hot paths.
+
+Usage: python main.py bench [-n 200] [-c 8] [--scenarios conversation,stream,insert,batch,ingest]
+                            [--openai-latency 0.05] [--calendar-latency 0.02] [--error-rate 0.01]
+                            [--json results.json] [--baseline results.json]
+
+Local stand-ins for the OpenAI chat-completions endpoint (plain and streamed tool calls)
+and the Calendar events.insert and batch endpoints run on 127.0.0.1 with configurable
+latency and error rates, so the real client libraries, scheduler, caches and batching are
+exercised end to end without API credits or a real calendar. Each scenario reports
+p50/p95/p99 latency and throughput; with --baseline the run fails when a scenario's p95 or
+throughput regresses by more than --max-regression.
+"""
+import email
+import json
+import math
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import types
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SCENARIOS = ("conversation", "stream", "insert", "batch", "ingest")
+
+# Phrasings the local fast path is not confident about, so they reach the model
+PROMPT_TEMPLATES = (
+    "Plan the quarterly offsite with the design team, probably the Thursday after next from 1 to 4",
+    "Lunch with Sam next week sometime, maybe Thursday around noon",
+    "Block two hours for the budget review whenever works on Monday afternoon",
+    "Remind me about the dentist appointment the week after next, mornings are best",
+)
+
+
+class FakeBackend:
+    """Latency and failure settings shared by a fake server's request handlers"""
+
+    def __init__(self, latency=0.02, jitter=0.25, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Sleeps for the configured latency, +/- jitter (a fraction of it)"""
+        with self._lock:
+            self.requests += 1
+            delay = self.latency * (1 + self.random.uniform(-self.jitter, self.jitter))
+        if delay > 0:
+            time.sleep(delay)
+
+    def should_fail(self):
+        with self._lock:
+            failed = self.random.random() < self.error_rate
+            self.errors += failed
+            return failed
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def backend(self):
+        return self.server.backend
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def send(self, status, body, content_type="application/json", headers=None):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeOpenAIHandler(_Handler):
+    """POST /v1/chat/completions answering with create_calendar_event tool calls"""
+
+    def do_POST(self):
+        request = json.loads(self.read_body() or b"{}")
+        if self.path.split("?")[0].rstrip("/") != "/v1/chat/completions":
+            self.send(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+            return
+        self.backend.wait()
+        if self.backend.should_fail():
+            if self.backend.random.random() < 0.5:
+                self.send(429, {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}},
+                          headers={"retry-after": "0"})
+            else:
+                self.send(500, {"error": {"message": "The server had an error", "type": "server_error"}})
+            return
+
+        arguments = [json.dumps(event) for event in self.events_for(request)]
+        if request.get("stream"):
+            self.stream(request, arguments)
+            return
+        self.send(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-4o-mini"),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "tool_calls",
+                "message": {
+                    "role": "assistant",
+                    "content": None,
+                    "tool_calls": [
+                        {"id": f"call_{i}", "type": "function",
+                         "function": {"name": "create_calendar_event", "arguments": args}}
+                        for i, args in enumerate(arguments)
+                    ],
+                },
+            }],
+            "usage": self.usage(request, arguments),
+        })
+
+    def events_for(self, request):
+        """Deterministic events for a prompt, one per --events-per-prompt"""
+        prompt = request["messages"][-1]["content"] if request.get("messages") else ""
+        day = (datetime.now() + timedelta(days=1 + len(prompt) % 7)).strftime("%Y-%m-%d")
+        events = []
+        for i in range(self.server.events_per_prompt):
+            hour = 9 + (len(prompt) + i) % 8
+            events.append({
+                "title": f"Benchmark Event {i + 1}",
+                "date": day,
+                "start_time": f"{hour:02d}:00",
+                "end_time": f"{hour + 1:02d}:00",
+            })
+        return events
+
+    @staticmethod
+    def usage(request, arguments):
+        messages = request.get("messages", [])
+        # Rough token estimates; like the real API, a stable prefix (tools plus every message
+        # before the last) of 1024 tokens or more is reported as cached in 128-token steps
+        prefix_tokens = (len(json.dumps(request.get("tools", []))) + sum(len(str(m.get("content", ""))) for m in messages[:-1])) // 4
+        prompt_tokens = prefix_tokens + sum(len(str(m.get("content", ""))) for m in messages[-1:]) // 4 + 10
+        cached_tokens = prefix_tokens // 128 * 128 if prefix_tokens >= 1024 else 0
+        completion_tokens = sum(len(args) for args in arguments) // 4 + 10
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": cached_tokens}}
+
+    def stream(self, request, arguments):
+        """Server-sent events: one tool call header per event, then its arguments in fragments"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        chunk_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+        def chunk(choices, usage=None):
+            data = {"id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": "gpt-4o-mini", "choices": choices}
+            if usage is not None:
+                data["usage"] = usage
+            self.wfile.write(f"data: {json.dumps(data)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        for index, args in enumerate(arguments):
+            chunk([{"index": 0, "delta": {"tool_calls": [{
+                "index": index, "id": f"call_{index}", "type": "function",
+                "function": {"name": "create_calendar_event", "arguments": ""}}]}, "finish_reason": None}])
+            for start in range(0, len(args), 16):
+                chunk([{"index": 0, "delta": {"tool_calls": [{
+                    "index": index, "function": {"arguments": args[start:start + 16]}}]}, "finish_reason": None}])
+        chunk([{"index": 0, "delta": {}, "finish_reason": "tool_calls"}])
+        chunk([], usage=self.usage(request, arguments))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class FakeCalendarHandler(_Handler):
+    """events.insert and the batch endpoint of the Calendar API"""
+
+    def do_POST(self):
+        body = self.read_body()
+        path = self.path.split("?")[0]
+        if path.startswith("/batch/"):
+            self.batch(body)
+        elif path.endswith("/events"):
+            self.backend.wait()
+            status, response = self.insert(json.loads(body or b"{}"))
+            self.send(status, response)
+        else:
+            self.send(404, {"error": {"code": 404, "message": f"Unknown path {self.path}"}})
+
+    def insert(self, event):
+        """(status, response body) for one insert, honoring client ids like the real API"""
+        if self.backend.should_fail():
+            if self.backend.random.random() < 0.5:
+                return 403, {"error": {"code": 403, "message": "Rate Limit Exceeded",
+                                       "errors": [{"reason": "rateLimitExceeded"}]}}
+            return 503, {"error": {"code": 503, "message": "Backend Error"}}
+        event_id = event.get("id") or uuid.uuid4().hex
+        with self.server.ids_lock:
+            if event_id in self.server.ids:
+                return 409, {"error": {"code": 409, "message": "The requested identifier already exists."}}
+            self.server.ids.add(event_id)
+        return 200, dict(event, id=event_id, status="confirmed", kind="calendar#event")
+
+    def batch(self, body):
+        """Answers a multipart/mixed batch with one application/http part per request"""
+        self.backend.wait()
+        message = email.message_from_bytes(
+            b"Content-Type: " + self.headers["Content-Type"].encode("latin-1") + b"\r\n\r\n" + body
+        )
+        boundary = f"batch_{uuid.uuid4().hex}"
+        parts = []
+        for part in message.get_payload():
+            content_id = part["Content-ID"].strip("<>")
+            payload = part.get_payload()
+            request_body = re.split(r"\r?\n\r?\n", payload, maxsplit=1)[1] if "{" in payload else "{}"
+            status, response = self.insert(json.loads(request_body))
+            parts.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} {self.responses.get(status, ('',))[0]}\r\n"
+                f"Content-Type: application/json; charset=UTF-8\r\n\r\n{json.dumps(response)}\r\n"
+            )
+        parts.append(f"--{boundary}--\r\n")
+        self.send(200, "".join(parts).encode("utf-8"), content_type=f"multipart/mixed; boundary={boundary}")
+
+
+def start_fake_server(handler, backend, **attributes):
+    """Starts a fake server on a free local port and returns (server, base_url)"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    server.backend = backend
+    for name, value in attributes.items():
+        setattr(server, name, value)
+    threading.Thread(target=server.serve_forever, name="eventelf-bench-server", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+def fake_calendar_service(root_url):
+    """A Calendar service built from the bundled discovery document, pointed at root_url"""
+    import httplib2
+    from googleapiclient.discovery import build_from_document
+    from googleapiclient.discovery_cache import get_static_doc
+
+    document = json.loads(get_static_doc("calendar", "v3"))
+    document["rootUrl"] = root_url
+    document["baseUrl"] = root_url + document["servicePath"]
+    return build_from_document(document, http=httplib2.Http())
+
+
+def percentile(samples, q):
+    """Nearest-rank percentile of a list of numbers"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+def summarize(name, latencies, elapsed, events, errors):
+    return {
+        "scenario": name,
+        "ops": len(latencies),
+        "errors": errors,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "ops_per_sec": len(latencies) / elapsed if elapsed else 0.0,
+        "events_per_sec": events / elapsed if elapsed else 0.0,
+    }
+
+
+def _timed_pool(fn, items, concurrency):
+    """Runs fn over items on a thread pool; returns (latencies, elapsed, events, errors)"""
+    latencies = []
+    counts = {"events": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def run(item):
+        started = time.perf_counter()
+        try:
+            events = fn(item)
+        except Exception:
+            events = None
+        duration = time.perf_counter() - started
+        with lock:
+            latencies.append(duration)
+            if events is None:
+                counts["errors"] += 1
+            else:
+                counts["events"] += events
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="eventelf-bench") as executor:
+        list(executor.map(run, items))
+    return latencies, time.perf_counter() - started, counts["events"], counts["errors"]
+
+
+def _prompts(count, run_id):
+    # A run id keeps prompts unique, so the response cache never answers for the model
+    return [f"{PROMPT_TEMPLATES[i % len(PROMPT_TEMPLATES)]} (ref {run_id}-{i})" for i in range(count)]
+
+
+def _events(count):
+    day = (datetime.now() + timedelta(days=3)).strftime("%Y-%m-%d")
+    return [{"title": f"Bench {i}", "date": day, "start_time": f"{9 + i % 8:02d}:00",
+             "end_time": f"{10 + i % 8:02d}:00"} for i in range(count)]
+
+
+def bench_conversation(options):
+    import ai_model
+
+    def parse(prompt):
+        parsed = []
+        ai_model.run_conversation(prompt, lambda events, text: parsed.extend(events))
+        if not parsed:
+            raise ValueError("nothing parsed")
+        return len(parsed)
+
+    return summarize("conversation", *_timed_pool(parse, _prompts(options.requests, uuid.uuid4().hex[:6]),
+                                                  options.concurrency))
+
+
+def bench_stream(options):
+    import ai_model
+
+    first_event = []
+    lock = threading.Lock()
+
+    def parse(prompt):
+        started = time.perf_counter()
+        parsed = []
+        seen = []
+
+        def on_event(index, event):
+            if not seen:
+                with lock:
+                    first_event.append(time.perf_counter() - started)
+            seen.append(index)
+
+        ai_model.run_conversation(prompt, lambda events, text: parsed.extend(events), on_event=on_event)
+        if not parsed:
+            raise ValueError("nothing parsed")
+        return len(parsed)
+
+    result = summarize("stream", *_timed_pool(parse, _prompts(options.requests, uuid.uuid4().hex[:6]),
+                                              options.concurrency))
+    result["first_event_p50_ms"] = percentile(first_event, 0.50) * 1000
+    result["first_event_p95_ms"] = percentile(first_event, 0.95) * 1000
+    return result
+
+
+def bench_insert(options, calendar_url):
+    from calendar_service import create_event
+
+    # httplib2 transports are not thread-safe, so each worker gets its own service
+    local = threading.local()
+
+    def insert(event):
+        if not hasattr(local, "service"):
+            local.service = fake_calendar_service(calendar_url)
+        create_event(event, service=local.service)
+        return 1
+
+    return summarize("insert", *_timed_pool(insert, _events(options.requests), options.concurrency))
+
+
+def bench_batch(options, calendar_url):
+    from calendar_service import create_events
+
+    service = fake_calendar_service(calendar_url)
+    events = _events(options.requests)
+    chunks = [events[i:i + options.batch_size] for i in range(0, len(events), options.batch_size)]
+
+    def create(chunk):
+        results = create_events(chunk, service=service)
+        failed = sum(1 for result in results if result["error"] is not None)
+        if failed:
+            raise RuntimeError(f"{failed} events failed")
+        return len(chunk)
+
+    # One caller at a time, as in the outbox and ingest paths
+    return summarize("batch", *_timed_pool(create, chunks, 1))
+
+
+def bench_ingest(options, calendar_url, workdir):
+    import calendar_service
+    import ingest
+
+    class BenchServiceManager(calendar_service.CalendarServiceManager):
+        def get_service(self, interactive=True):
+            if self._service is None:
+                self._service = fake_calendar_service(calendar_url)
+            return self._service
+
+    calendar_service.service_manager = BenchServiceManager(token_path=os.path.join(workdir, "token.pickle"))
+    input_path = os.path.join(workdir, "prompts.jsonl")
+    output_path = os.path.join(workdir, "ingested.jsonl")
+    with open(input_path, "w", encoding="utf-8") as f:
+        for prompt in _prompts(options.requests, uuid.uuid4().hex[:6]):
+            f.write(json.dumps({"prompt": prompt}) + "\n")
+
+    started = time.perf_counter()
+    ingest.run(input_path, output_path, workers=options.concurrency, commit=True)
+    elapsed = time.perf_counter() - started
+    created = errors = 0
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            item = json.loads(line)
+            created += sum(1 for event_id in item.get("created", []) if event_id)
+            errors += "error" in item or "commit_error" in item
+    return summarize("ingest", [elapsed], elapsed, created, errors)
+
+
+def _use_offline_config():
+    """Lets ai_model import without a real config/config.py; the fake server ignores the key"""
+    try:
+        import config.config  # noqa: F401
+    except ImportError:
+        module = types.ModuleType("config.config")
+        module.API_KEY = "benchmark"
+        sys.modules["config.config"] = module
+
+
+def print_report(results, out=None):
+    out = out or sys.stdout
+    print(f"{'scenario':<14}{'ops':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'ops/s':>10}{'events/s':>10}", file=out)
+    for r in results:
+        print(f"{r['scenario']:<14}{r['ops']:>7}{r['errors']:>8}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}"
+              f"{r['p99_ms']:>10.1f}{r['ops_per_sec']:>10.1f}{r['events_per_sec']:>10.1f}", file=out)
+        if "first_event_p50_ms" in r:
+            print(f"{'':<14}first event p50 {r['first_event_p50_ms']:.1f} ms, "
+                  f"p95 {r['first_event_p95_ms']:.1f} ms", file=out)
+
+
+def compare(results, baseline, max_regression):
+    """Regression messages for scenarios whose p95 or throughput got worse than allowed"""
+    previous = {r["scenario"]: r for r in baseline.get("results", [])}
+    regressions = []
+    for r in results:
+        before = previous.get(r["scenario"])
+        if before is None:
+            continue
+        if before["p95_ms"] and r["p95_ms"] > before["p95_ms"] * (1 + max_regression):
+            regressions.append(f"{r['scenario']}: p95 {before['p95_ms']:.1f} -> {r['p95_ms']:.1f} ms")
+        if before["events_per_sec"] and r["events_per_sec"] < before["events_per_sec"] * (1 - max_regression):
+            regressions.append(
+                f"{r['scenario']}: {before['events_per_sec']:.1f} -> {r['events_per_sec']:.1f} events/s"
+            )
+    return regressions
+
+
+def run(options):
+    """Runs the selected scenarios against fresh fake servers; returns the process exit code"""
+    scenarios = [name.strip() for name in options.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        print(f"Unknown scenarios: {', '.join(sorted(unknown))} (choose from {', '.join(SCENARIOS)})")
+        return 2
+
+    _use_offline_config()
+    openai_backend = FakeBackend(options.openai_latency, options.jitter, options.error_rate, options.seed)
+    calendar_backend = FakeBackend(options.calendar_latency, options.jitter, options.error_rate, options.seed)
+    openai_server, openai_url = start_fake_server(FakeOpenAIHandler, openai_backend,
+                                                  events_per_prompt=options.events_per_prompt)
+    calendar_server, calendar_url = start_fake_server(FakeCalendarHandler, calendar_backend,
+                                                      ids=set(), ids_lock=threading.Lock())
+    # The OpenAI SDK reads its endpoint from the environment when the client is built
+    os.environ["OPENAI_BASE_URL"] = openai_url + "v1"
+
+    import metrics
+    import response_cache
+    import scheduler
+
+    metrics.enable()
+    if not options.real_limits:
+        # Measure EventElf itself rather than the production rate limits
+        for name in ("openai", "calendar"):
+            scheduler.configure(name, rate=1e6, burst=1e6, max_concurrency=max(options.concurrency, 1) * 4)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="eventelf-bench-") as workdir:
+        # Keep the user's response cache out of the measurements (and free of fake events)
+        response_cache.cache = response_cache.ResponseCache(path=os.path.join(workdir, "response_cache.db"))
+        for name in scenarios:
+            if name == "conversation":
+                results.append(bench_conversation(options))
+            elif name == "stream":
+                results.append(bench_stream(options))
+            elif name == "insert":
+                results.append(bench_insert(options, calendar_url))
+            elif name == "batch":
+                results.append(bench_batch(options, calendar_url))
+            elif name == "ingest":
+                results.append(bench_ingest(options, calendar_url, workdir))
+        response_cache.cache = response_cache.ResponseCache()
+
+    openai_server.shutdown()
+    calendar_server.shutdown()
+
+    print_report(results)
+    stages = metrics.snapshot()["histograms"]
+    if stages:
+        print("\nper stage (p50 / p95 ms):")
+        for name, histogram in stages.items():
+            print(f"  {name:<26} {histogram['p50'] * 1000:8.1f} / {histogram['p95'] * 1000:8.1f}"
+                  f"   ({histogram['count']} samples)")
+
+    counters = metrics.snapshot()["counters"]
+    calls = counters.get("openai_calls", 0)
+    tokens = {name: counters.get(f"openai_{name}_tokens", 0) for name in ("prompt", "cached", "completion")}
+    if calls:
+        print("\ntokens per OpenAI call: " + ", ".join(f"{name} {count / calls:.0f}" for name, count in tokens.items()))
+
+    report = {
+        "settings": {key: value for key, value in vars(options).items() if key in (
+            "requests", "concurrency", "batch_size", "openai_latency", "calendar_latency",
+            "jitter", "error_rate", "events_per_prompt", "real_limits")},
+        "results": results,
+        "stages": stages,
+        "tokens": dict(tokens, calls=calls),
+        "fake_servers": {"openai": {"requests": openai_backend.requests, "errors": openai_backend.errors},
+                         "calendar": {"requests": calendar_backend.requests, "errors": calendar_backend.errors}},
+    }
+    if options.json:
+        with open(options.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if options.baseline:
+        with open(options.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), options.max_regression)
+        if regressions:
+            print("\nRegressions against the baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+    return 0
@@ -0,0 +1,349 @@
+"""
+Local mirror of the primary calendar for instant conflict checks.
+
+One full events.list sync, then incremental syncs with the returned syncToken, stored in
+SQLite. Events are held in memory in an interval index (recurring events expanded over a
+rolling window), so checking a parsed event for overlaps and suggesting free slots needs
+no network call. Events marked "show as available" (transparent) never conflict, and
+all-day events are kept in their own index and reported apart from conflicts.
+"""
+import json
+import math
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import recurrence
+import scheduler
+
+WINDOW_PAST_DAYS = 1
+WINDOW_FUTURE_DAYS = 90
+# Free slots are only suggested inside these hours (UTC, like create_event's times)
+DAY_START_HOUR = 8
+DAY_END_HOUR = 20
+SLOT_STEP_MINUTES = 15
+
+
+def parse_api_time(value):
+    """Converts an API start/end object ({'dateTime': ...} or {'date': ...}) to an aware UTC datetime"""
+    if "dateTime" in value:
+        parsed = datetime.fromisoformat(value["dateTime"].replace("Z", "+00:00"))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.astimezone(timezone.utc)
+    return datetime.strptime(value["date"], "%Y-%m-%d").replace(tzinfo=timezone.utc)
+
+
+def event_span(event_params):
+    """(start, end) of a parsed event as aware UTC datetimes, matching create_event's UTC times"""
+    start = datetime.strptime(f"{event_params['date']} {event_params['start_time']}", "%Y-%m-%d %H:%M")
+    end = datetime.strptime(f"{event_params['date']} {event_params['end_time']}", "%Y-%m-%d %H:%M")
+    return start.replace(tzinfo=timezone.utc), end.replace(tzinfo=timezone.utc)
+
+
+class IntervalIndex:
+    """
+    Static augmented interval tree over (start, end, payload) tuples.
+
+    The tree is implicit: intervals are sorted by start, each midpoint of a range is a
+    node, and max_end holds the largest end in that node's subtree.
+    """
+
+    def __init__(self, intervals=()):
+        intervals = sorted(intervals, key=lambda interval: interval[0])
+        self.starts = [interval[0] for interval in intervals]
+        self.ends = [interval[1] for interval in intervals]
+        self.payloads = [interval[2] for interval in intervals]
+        self.max_end = [0.0] * len(intervals)
+        self._build(0, len(intervals))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _build(self, lo, hi):
+        if lo >= hi:
+            return -math.inf
+        mid = (lo + hi) // 2
+        self.max_end[mid] = max(self.ends[mid], self._build(lo, mid), self._build(mid + 1, hi))
+        return self.max_end[mid]
+
+    def overlapping(self, start, end):
+        """Payloads of every interval that overlaps [start, end)"""
+        found = []
+        self._query(0, len(self.starts), start, end, found)
+        return found
+
+    def _query(self, lo, hi, start, end, found):
+        if lo >= hi:
+            return
+        mid = (lo + hi) // 2
+        if self.max_end[mid] <= start:
+            return  # Everything in this subtree ends before the query starts
+        self._query(lo, mid, start, end, found)
+        if self.starts[mid] < end:
+            if self.ends[mid] > start:
+                found.append(self.payloads[mid])
+            self._query(mid + 1, hi, start, end, found)
+
+
+class CalendarMirror:
+    """SQLite-backed copy of the primary calendar with an in-memory interval index"""
+
+    def __init__(self, path="calendar_mirror.db"):
+        self.path = path
+        self.index = IntervalIndex()
+        self.all_day_index = IntervalIndex()
+        self.loaded = False
+        self.last_sync = None
+        self._window_day = None
+        self._db = None
+        self._lock = threading.RLock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _connect(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                "id TEXT PRIMARY KEY, status TEXT, summary TEXT, start REAL, end REAL, "
+                "recurrence TEXT, recurring_event_id TEXT, original_start REAL, transparent INTEGER, all_day INTEGER)"
+            )
+            self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(events)")}
+            if "transparent" not in columns:
+                # A mirror from before these columns: add them and resync everything to fill them in
+                self._db.execute("ALTER TABLE events ADD COLUMN transparent INTEGER")
+                self._db.execute("ALTER TABLE events ADD COLUMN all_day INTEGER")
+                self._db.execute("DELETE FROM meta WHERE key = 'sync_token'")
+                self._db.commit()
+        return self._db
+
+    def load(self):
+        """Builds the in-memory index from the SQLite copy (no network)"""
+        with self._lock:
+            self._rebuild()
+            self.loaded = True
+
+    def sync(self, service, http=None):
+        """
+        Brings the mirror up to date: a full sync the first time, then incremental syncs.
+
+        Args:
+            service: Calendar service used to build the list requests
+            http: Optional authorized transport, so the sync can run on its own thread
+        """
+        with self._lock:
+            db = self._connect()
+            row = db.execute("SELECT value FROM meta WHERE key = 'sync_token'").fetchone()
+            sync_token = row[0] if row else None
+            try:
+                next_token = self._pull(service, http, sync_token)
+            except Exception as e:
+                if scheduler.status_of(e) != 410:
+                    raise
+                # The sync token expired; start over with a full sync
+                db.execute("DELETE FROM events")
+                next_token = self._pull(service, http, None)
+            db.execute("INSERT OR REPLACE INTO meta VALUES ('sync_token', ?)", (next_token,))
+            db.commit()
+            self.last_sync = time.time()
+            self._rebuild()
+            self.loaded = True
+
+    def _pull(self, service, http, sync_token):
+        """Pages through events.list and stores every change; returns the next sync token"""
+        db = self._connect()
+        if sync_token is None:
+            db.execute("DELETE FROM events")
+        params = {"calendarId": "primary", "maxResults": 2500}
+        if sync_token:
+            params["syncToken"] = sync_token
+        else:
+            params["showDeleted"] = True  # Cancelled instances of recurring events are exclusions
+        page_token = None
+        while True:
+            request = service.events().list(pageToken=page_token, **params)
+            kwargs = {"http": http} if http is not None else {}
+            response = scheduler.call("calendar", request.execute, **kwargs)
+            for item in response.get("items", []):
+                self._store(db, item)
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                return response.get("nextSyncToken")
+
+    @staticmethod
+    def _store(db, item):
+        original = item.get("originalStartTime")
+        original_start = parse_api_time(original).timestamp() if original else None
+        if item.get("status") == "cancelled" and not item.get("recurringEventId"):
+            db.execute("DELETE FROM events WHERE id = ?", (item["id"],))
+            return
+        start = parse_api_time(item["start"]).timestamp() if "start" in item else None
+        end = parse_api_time(item["end"]).timestamp() if "end" in item else None
+        db.execute(
+            "INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                item["id"],
+                item.get("status", "confirmed"),
+                item.get("summary", "(no title)"),
+                start,
+                end,
+                json.dumps(item["recurrence"]) if item.get("recurrence") else None,
+                item.get("recurringEventId"),
+                original_start,
+                item.get("transparency") == "transparent",
+                "date" in item.get("start", {}),
+            )
+        )
+
+    def _rebuild(self):
+        """Recomputes the interval index, expanding recurring events over the rolling window"""
+        db = self._connect()
+        now = datetime.now(timezone.utc)
+        window_start = now - timedelta(days=WINDOW_PAST_DAYS)
+        window_end = now + timedelta(days=WINDOW_FUTURE_DAYS)
+        rows = db.execute(
+            "SELECT id, status, summary, start, end, recurrence, recurring_event_id, original_start, transparent, all_day "
+            "FROM events"
+        ).fetchall()
+
+        # Instances that were moved or cancelled replace the occurrence they came from
+        exceptions = {}
+        for row in rows:
+            if row[6] and row[7] is not None:
+                exceptions.setdefault(row[6], set()).add(datetime.fromtimestamp(row[7], timezone.utc))
+
+        intervals = []
+        all_day = []
+        for event_id, status, summary, start, end, rules, _, _, transparent, is_all_day in rows:
+            # Transparent events ("show as available") never block time
+            if status == "cancelled" or transparent or start is None or end is None:
+                continue
+            found = all_day if is_all_day else intervals
+            if not rules:
+                found.append((start, end, (summary, start, end)))
+                continue
+            dtstart = datetime.fromtimestamp(start, timezone.utc)
+            duration = end - start
+            try:
+                starts = recurrence.expand(
+                    dtstart, json.loads(rules), window_start, window_end, exceptions.get(event_id, ())
+                )
+            except ValueError as e:
+                print(f"Skipping recurring event {summary!r}: {e}")
+                continue
+            for occurrence in starts:
+                occurrence_start = occurrence.timestamp()
+                found.append((occurrence_start, occurrence_start + duration, (summary, occurrence_start, occurrence_start + duration)))
+
+        self.index = IntervalIndex(intervals)
+        self.all_day_index = IntervalIndex(all_day)
+        self._window_day = now.date()
+
+    def _ensure_window(self):
+        """Rolls the recurrence window forward once a day"""
+        if self.loaded and self._window_day != datetime.now(timezone.utc).date():
+            with self._lock:
+                self._rebuild()
+
+    def conflicts(self, start, end):
+        """Timed events overlapping [start, end) as (summary, start, end) with aware UTC datetimes"""
+        self._ensure_window()
+        found = self.index.overlapping(start.timestamp(), end.timestamp())
+        return sorted(
+            (summary, datetime.fromtimestamp(s, timezone.utc), datetime.fromtimestamp(e, timezone.utc))
+            for summary, s, e in found
+        )
+
+    def all_day_events(self, start, end):
+        """Summaries of the all-day events on the days [start, end) touches"""
+        self._ensure_window()
+        return sorted(summary for summary, _, _ in self.all_day_index.overlapping(start.timestamp(), end.timestamp()))
+
+    def free_slots(self, start, end, count=3):
+        """Up to count free start times on the same day as start, closest to it first"""
+        duration = end - start
+        day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        candidate = day + timedelta(hours=DAY_START_HOUR)
+        last = day + timedelta(hours=DAY_END_HOUR) - duration
+        slots = []
+        while candidate <= last:
+            if candidate != start and not self.index.overlapping(candidate.timestamp(), (candidate + duration).timestamp()):
+                slots.append(candidate)
+            candidate += timedelta(minutes=SLOT_STEP_MINUTES)
+        slots.sort(key=lambda slot: abs((slot - start).total_seconds()))
+        return sorted(slots[:count])
+
+    def describe_conflicts(self, event_params, max_occurrences=10):
+        """
+        Human-readable conflict notes for a parsed event, or [] if it is clear.
+
+        Recurring events are checked over their next few occurrences. All-day events are
+        listed in a note of their own, since they rarely mean the time is taken.
+        """
+        if not self.loaded:
+            return []
+        try:
+            start, end = event_span(event_params)
+        except (KeyError, ValueError):
+            return []
+        if end <= start:
+            return []
+
+        starts = [start]
+        if event_params.get("recurrence"):
+            try:
+                window_end = start + timedelta(days=WINDOW_FUTURE_DAYS)
+                rule = recurrence.normalize_rule(event_params["recurrence"], start.replace(tzinfo=None))
+                starts = recurrence.expand(start, [rule], start, window_end)[:max_occurrences]
+            except ValueError:
+                pass
+
+        notes = []
+        for occurrence in starts:
+            occurrence_end = occurrence + (end - start)
+            clashes = self.conflicts(occurrence, occurrence_end)
+            if clashes:
+                names = ", ".join(
+                    f"{summary} ({s.strftime('%H:%M')}-{e.strftime('%H:%M')})" for summary, s, e in clashes
+                )
+                note = f"Conflicts on {occurrence.strftime('%Y-%m-%d')} with {names}"
+                if occurrence == start:
+                    slots = self.free_slots(occurrence, occurrence_end)
+                    if slots:
+                        note += ". Free at: " + ", ".join(slot.strftime("%H:%M") for slot in slots)
+                notes.append(note)
+            all_day = self.all_day_events(occurrence, occurrence_end)
+            if all_day:
+                notes.append(f"All day on {occurrence.strftime('%Y-%m-%d')}: {', '.join(all_day)}")
+        return notes
+
+    def start_background_sync(self, service_manager, interval=300):
+        """Syncs now and then every interval seconds on a daemon thread"""
+        if self._thread is not None:
+            return
+
+        def run():
+            http = None
+            while not self._stop.is_set():
+                try:
+                    service = service_manager.get_service(interactive=False)
+                    if http is None:
+                        # A separate transport, since httplib2 connections are not thread-safe
+                        http = service_manager.new_http()
+                    self.sync(service, http)
+                except Exception as e:
+                    print(f"Calendar mirror sync failed: {e}")
+                self._stop.wait(interval)
+
+        self._thread = threading.Thread(target=run, name="eventelf-mirror", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+mirror = CalendarMirror()
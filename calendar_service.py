@@ -0,0 +1,357 @@
+"""
+The Google Calendar side of EventElf: one shared, long-lived service and the event writes.
+
+Everything that talks to the Calendar API imports it from here (never from main, which
+runs as __main__ and would be loaded a second time with its own service manager).
+"""
+# The Google client libraries are slow to import, so they are imported on first use
+from datetime import datetime, timezone
+import os.path
+import pickle
+import threading
+import time
+import metrics
+import recurrence
+import scheduler
+
+# If modifying these SCOPES, delete the file token.pickle.
+SCOPES = ['https://www.googleapis.com/auth/calendar']
+# An HTTPS connection idle for longer than this is re-opened by prepare()
+WARM_INTERVAL = 60
+
+class CalendarServiceManager:
+    """Process-wide owner of the Google Calendar service.
+
+    The service (and its authorized HTTP transport) is built once and reused for
+    every request. Credentials are refreshed on a background timer shortly before
+    they expire, and token.pickle is only rewritten when the credentials change.
+    """
+
+    def __init__(self, token_path='token.pickle', refresh_margin=300, background_refresh=True):
+        self.token_path = token_path
+        # Seconds before expiry at which the background refresh fires
+        self.refresh_margin = refresh_margin
+        # Without the timer thread, expired credentials are refreshed by get_service on use
+        self.background_refresh = background_refresh
+        self._lock = threading.RLock()
+        self._creds = None
+        self._service = None
+        self._timer = None
+        self._saved_state = None
+        self._warmed_at = None
+
+    def get_service(self, interactive=True):
+        """Returns the shared Calendar service, building it on first use
+
+        With interactive=False a missing or unrefreshable token raises instead of
+        opening the browser sign-in flow.
+        """
+        with self._lock:
+            if self._service is not None and not self._creds.valid:
+                if self._creds.refresh_token:
+                    self._refresh()
+                    self._schedule_refresh()
+                else:
+                    # Nothing to refresh with: sign in again as on first use (or raise)
+                    self._service = None
+            if self._service is None:
+                from googleapiclient.discovery import build
+
+                with metrics.timer('calendar_auth'):
+                    self._creds = self._load_credentials(interactive)
+                # Use the discovery document bundled with googleapiclient instead of fetching it
+                with metrics.timer('calendar_discovery_build'):
+                    self._service = build(
+                        'calendar', 'v3',
+                        credentials=self._creds,
+                        static_discovery=True,
+                        cache_discovery=False
+                    )
+                self._schedule_refresh()
+            return self._service
+
+    def new_http(self):
+        """Returns a separate authorized transport on the shared credentials, for another thread"""
+        import google_auth_httplib2
+        import httplib2
+
+        with self._lock:
+            self.get_service(interactive=False)
+            return google_auth_httplib2.AuthorizedHttp(self._creds, http=httplib2.Http())
+
+    def warm_up(self):
+        """Builds the service ahead of time if saved credentials exist (never starts the OAuth flow)"""
+        # Importing the client libraries is most of the cost, so do it even without a token
+        import googleapiclient.discovery
+        import google.auth.transport.requests
+
+        if not os.path.exists(self.token_path):
+            return
+        try:
+            self.get_service(interactive=False)
+        except Exception as e:
+            print(f"Calendar warm-up skipped: {e}")
+
+    def prepare(self):
+        """Gets the service ready for a write that is about to happen, without ever starting sign-in
+
+        Credentials expiring within refresh_margin are refreshed now (the background timer
+        can fire late after the machine sleeps) and a cheap request re-opens the HTTPS
+        connection if it has been idle, so the write itself is a single round-trip.
+        Call it from the thread that will send the write; the transport is not thread-safe.
+        """
+        service = self.get_service(interactive=False)
+        with self._lock:
+            expiry = self._creds.expiry
+            if expiry is not None:
+                remaining = (expiry.replace(tzinfo=timezone.utc) - datetime.now(timezone.utc)).total_seconds()
+                if remaining < self.refresh_margin:
+                    self._refresh()
+                    self._schedule_refresh()
+        if self._warmed_at is None or time.monotonic() - self._warmed_at > WARM_INTERVAL:
+            # Same host as the batch endpoint, so the batch reuses this connection
+            with metrics.timer('calendar_warm'):
+                scheduler.call('calendar', service.calendars().get(calendarId='primary', fields='id').execute)
+            self._warmed_at = time.monotonic()
+        return service
+
+    def close(self):
+        """Stops the refresh timer and drops the cached service"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._save_if_changed()
+            self._service = None
+            self._creds = None
+            self._warmed_at = None
+
+    def _load_credentials(self, interactive=True):
+        """Loads credentials from token.pickle, refreshing or running the OAuth flow if needed"""
+        from google.auth.transport.requests import Request
+
+        creds = None
+        if os.path.exists(self.token_path):
+            with open(self.token_path, 'rb') as token:
+                creds = pickle.load(token)
+            self._saved_state = self._state_of(creds)
+        if not creds or not creds.valid:
+            if creds and creds.expired and creds.refresh_token:
+                creds.refresh(Request())
+            elif not interactive:
+                raise RuntimeError("Saved credentials cannot be refreshed; sign-in is required")
+            else:
+                from google_auth_oauthlib.flow import InstalledAppFlow
+
+                script_dir = os.path.dirname(os.path.abspath(__file__))
+                credentials_path = os.path.join(script_dir, 'config', 'credentials.json')
+                flow = InstalledAppFlow.from_client_secrets_file(
+                    credentials_path, SCOPES)
+                creds = flow.run_local_server(port=0)
+        self._creds = creds
+        self._save_if_changed()
+        return creds
+
+    def _refresh(self):
+        """Refreshes the shared credentials in place so the existing transport picks them up"""
+        from google.auth.transport.requests import Request
+
+        with self._lock:
+            if self._creds is None or not self._creds.refresh_token:
+                return
+            with metrics.timer('calendar_auth_refresh'):
+                self._creds.refresh(Request())
+            self._save_if_changed()
+
+    def _schedule_refresh(self):
+        """Arms a daemon timer that refreshes the credentials ahead of expiry"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self.background_refresh or self._creds is None or not self._creds.refresh_token or not self._creds.expiry:
+            return
+        # google-auth stores expiry as a naive UTC datetime
+        expiry = self._creds.expiry.replace(tzinfo=timezone.utc)
+        delay = (expiry - datetime.now(timezone.utc)).total_seconds() - self.refresh_margin
+        self._timer = threading.Timer(max(delay, 0), self._on_refresh_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _on_refresh_timer(self):
+        try:
+            self._refresh()
+        except Exception as e:
+            # Try again shortly; get_service() will also refresh on demand
+            print(f"Background credential refresh failed: {e}")
+            with self._lock:
+                self._timer = threading.Timer(60, self._on_refresh_timer)
+                self._timer.daemon = True
+                self._timer.start()
+            return
+        with self._lock:
+            self._schedule_refresh()
+
+    def _save_if_changed(self):
+        """Writes token.pickle only when the token or its expiry differs from what is on disk"""
+        if self._creds is None:
+            return
+        state = self._state_of(self._creds)
+        if state == self._saved_state:
+            return
+        with open(self.token_path, 'wb') as token:
+            pickle.dump(self._creds, token)
+        self._saved_state = state
+
+    @staticmethod
+    def _state_of(creds):
+        return (getattr(creds, 'token', None), getattr(creds, 'expiry', None))
+
+
+service_manager = CalendarServiceManager()
+
+def get_calendar_service():
+    """Returns the process-wide Google Calendar service object, authenticating on first use"""
+    with metrics.timer('get_calendar_service'):
+        return service_manager.get_service()
+    
+def build_event_body(event_params):
+    """Builds the Calendar API request body for one parsed event"""
+    # Build the start and end datetime strings (assuming UTC here, adjust as needed)
+    start_datetime = f"{event_params['date']}T{event_params['start_time']}:00"
+    end_datetime = f"{event_params['date']}T{event_params['end_time']}:00"
+
+    event_body = {
+        "summary": event_params['title'],
+        "start": {"dateTime": start_datetime, "timeZone": "UTC"},
+        "end": {"dateTime": end_datetime, "timeZone": "UTC"}
+    }
+
+    if 'recurrence' in event_params and event_params['recurrence']:
+        # The API expects a list of recurrence rules. Malformed rules are fixed here, or
+        # rejected with a ValueError before they cost a round-trip.
+        start = datetime.strptime(start_datetime, '%Y-%m-%dT%H:%M:%S')
+        event_body["recurrence"] = [recurrence.normalize_rule(event_params['recurrence'], start)]
+
+    if 'reminder' in event_params and event_params['reminder']:
+        event_body["reminders"] = {
+            "useDefault": False,
+            "overrides": [{"method": "popup", "minutes": event_params['reminder']}]
+        }
+
+    return event_body
+
+def create_event(event_params, service=None):
+    """Creates a Google Calendar event"""
+    if service is None:
+        service = get_calendar_service()
+
+    event_body = build_event_body(event_params)
+    with metrics.timer('calendar_insert'):
+        created_event = scheduler.call('calendar', service.events().insert(calendarId='primary', body=event_body).execute)
+    metrics.inc('calendar_events_created')
+    return created_event
+
+# Google Calendar accepts at most 50 calls in one batch request
+BATCH_LIMIT = 50
+
+def create_events(events, service=None, event_ids=None, build=build_event_body, bodies=None, backend='calendar'):
+    """
+    Creates several Google Calendar events using batch HTTP requests.
+
+    Args:
+        events: List of parsed event parameter dicts
+        service: Optional Calendar service, defaults to the shared one
+        event_ids: Optional client-generated Calendar event ids, one per event, which
+            make resending the same event fail with 409 instead of creating a duplicate
+        build: Turns one entry of events into an API request body (pass dict when the
+            events are request bodies already)
+        bodies: Optional request bodies built ahead of time, one per event; events whose
+            entry is None are built here
+        backend: The scheduler backend whose rate limit and retry policy apply (a
+            scheduler.Backend of its own keeps one user's throttling away from others)
+
+    Returns:
+        A list with one entry per input event, in the same order. Each entry is a
+        dict with the original "event", the "created" event (or None) and the
+        "error" raised for it (or None), so failed events can be retried alone.
+    """
+    if service is None:
+        service = get_calendar_service()
+
+    results = [{"event": event, "created": None, "error": None} for event in events]
+
+    def on_response(request_id, response, exception):
+        result = results[int(request_id)]
+        if exception is not None:
+            result["error"] = exception
+        else:
+            result["created"] = response
+
+    policy = scheduler.get_backend(backend)
+    remaining = list(range(len(events)))
+    attempt = 0
+    while remaining:
+        batch_failed = set()  # call_once already told the scheduler about these
+        for offset in range(0, len(remaining), BATCH_LIMIT):
+            chunk = remaining[offset:offset + BATCH_LIMIT]
+            batch = service.new_batch_http_request(callback=on_response)
+            added = 0
+            for index in chunk:
+                try:
+                    if bodies is not None and bodies[index] is not None:
+                        event_body = dict(bodies[index])
+                    else:
+                        event_body = build(events[index])
+                    if event_ids is not None:
+                        event_body["id"] = event_ids[index]
+                except KeyError as e:
+                    results[index]["error"] = ValueError(f"Missing event field: {e}")
+                    continue
+                except ValueError as e:
+                    results[index]["error"] = e
+                    continue
+                batch.add(
+                    service.events().insert(calendarId='primary', body=event_body),
+                    request_id=str(index)
+                )
+                added += 1
+            if not added:
+                continue
+            try:
+                # Each insert in the batch counts against the quota
+                with metrics.timer('calendar_batch', size=added):
+                    # One attempt: this loop retries, and only the inserts that need it
+                    scheduler.call_once(backend, batch.execute, cost=added)
+            except Exception as e:
+                # The whole batch request failed; mark every event in it that has no outcome yet
+                for index in chunk:
+                    result = results[index]
+                    if result["created"] is None and result["error"] is None:
+                        result["error"] = e
+                        batch_failed.add(index)
+
+        # Resend only what failed transiently: the whole batch request, or single inserts
+        # throttled inside a batch that succeeded
+        retry = [
+            index for index in remaining
+            if results[index]["error"] is not None and scheduler.is_retryable(results[index]["error"])
+        ]
+        if not retry or attempt >= policy.max_retries:
+            break
+        retry_after = None
+        for index in retry:
+            error = results[index]["error"]
+            if scheduler.is_throttled(error) and index not in batch_failed:
+                policy.bucket.throttled()
+            error_retry_after = scheduler.retry_after_of(error)
+            if error_retry_after is not None:
+                retry_after = max(retry_after or 0, error_retry_after)
+            results[index]["error"] = None
+        metrics.inc('calendar_batch_retries', len(retry))
+        time.sleep(policy.backoff(attempt, retry_after))
+        attempt += 1
+        remaining = retry
+
+    metrics.inc('calendar_events_created', sum(1 for result in results if result["created"] is not None))
+    metrics.inc('calendar_events_failed', sum(1 for result in results if result["error"] is not None))
+    return results
@@ -0,0 +1,277 @@
+"""
+Virtualized chat feed drawn directly on a Tk Canvas.
+
+Messages are kept as plain records with sizes measured from real font metrics. Only the
+bubbles near the viewport are materialized as canvas items; items scrolled out of view are
+recycled for the next visible message, and layout/scrollregion updates are coalesced into a
+single redraw per frame, so long sessions cost the same to render as short ones. Older
+history is pulled in through on_scroll_top and inserted above with prepend().
+"""
+import bisect
+import tkinter as tk
+
+import metrics
+
+
+class ChatMessage:
+    """One message in the feed"""
+
+    def __init__(self, text, is_user):
+        self.text = text
+        self.is_user = is_user
+        self.width = 0
+        self.height = 0
+        # Scratch data for callers, e.g. events streamed into a "thinking" bubble
+        self.partial_events = {}
+
+
+class _Slot:
+    """A reusable set of canvas items that can show any one message"""
+
+    def __init__(self, canvas, font):
+        self.background = canvas.create_image(0, 0, anchor="nw", state="hidden")
+        self.fallback = canvas.create_rectangle(0, 0, 0, 0, width=0, state="hidden")
+        self.text = canvas.create_text(0, 0, anchor="nw", font=font, justify=tk.LEFT, state="hidden")
+        self.avatar = canvas.create_image(0, 0, anchor="nw", state="hidden")
+        self.image = None  # Keep a reference to the bubble image while it is shown
+        self.width = 0  # Bubble images may be wider than the text needs
+        self.message = None
+
+
+class ChatFeed:
+    """Virtualized list of chat bubbles on a Canvas"""
+
+    OUTER_PADX = 10
+    PADY = 5
+    BUBBLE_PADX = 12
+    BUBBLE_PADY = 8
+    AVATAR_GAP = 8
+
+    def __init__(self, canvas, colors, font, avatar_image=None, bubble_image=None,
+                 max_bubble_width=220, overscan=400, on_scroll_top=None):
+        """
+        Args:
+            canvas: Canvas to draw on
+            colors: The UI color scheme dict
+            font: tkinter.font.Font used for message text and measurements
+            avatar_image: Optional PhotoImage shown next to bot messages
+            bubble_image: Optional function (width, height, color, radius) -> PhotoImage
+            max_bubble_width: Widest a bubble may get, in pixels
+            overscan: Extra pixels above and below the viewport that are kept materialized
+            on_scroll_top: Optional function called when the user scrolls up past the top
+        """
+        self.canvas = canvas
+        self.colors = colors
+        self.font = font
+        self.avatar_image = avatar_image
+        self.bubble_image = bubble_image
+        self.max_bubble_width = max_bubble_width
+        self.overscan = overscan
+        self.on_scroll_top = on_scroll_top
+        self.line_height = font.metrics("linespace")
+        self.avatar_size = avatar_image.width() if avatar_image else 0
+
+        self.messages = []
+        self.tops = []  # y offset of each message, kept in step with self.messages
+        self.total_height = 0
+        self._slots = {}  # message -> _Slot currently showing it
+        self._free_slots = []
+        self._render_pending = False
+        self._stick_to_bottom = True
+
+        canvas.bind("<Configure>", lambda event: self.schedule_render())
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            canvas.bind(sequence, self._on_mousewheel)
+
+    def append(self, text, is_user=False):
+        """Add a message at the bottom and return its record"""
+        message = ChatMessage(text, is_user)
+        self._measure(message)
+        self.messages.append(message)
+        self.tops.append(self.total_height)
+        self.total_height += message.height + 2 * self.PADY
+        self._stick_to_bottom = True
+        self.schedule_render()
+        return message
+
+    def prepend(self, items):
+        """Insert older (text, is_user) messages above the current ones without moving the view"""
+        if not items:
+            return []
+        added = [ChatMessage(text, is_user) for text, is_user in items]
+        for message in added:
+            self._measure(message)
+        view_top = self.canvas.canvasy(0)
+        self.messages[0:0] = added
+        self.tops[0:0] = [0] * len(added)
+        self._relayout(0)
+        # Keep what was on screen in place: scroll down by the height that was inserted
+        height = max(self.canvas.winfo_height(), 1)
+        total = max(self.total_height, height)
+        self.canvas.configure(scrollregion=(0, 0, self.canvas.winfo_width(), total))
+        self.canvas.yview_moveto((view_top + self.tops[len(added)]) / total)
+        self._stick_to_bottom = False
+        self.schedule_render()
+        return added
+
+    def update(self, message, text):
+        """Replace a message's text, e.g. to show progress in a "thinking" bubble"""
+        message.text = text
+        self._measure(message)
+        self._relayout(self.messages.index(message))
+        # Force the slot to redraw with the new size
+        self._release(message)
+        self.schedule_render()
+
+    def remove(self, message):
+        """Remove a message from the feed"""
+        if message not in self.messages:
+            return
+        self._release(message)
+        index = self.messages.index(message)
+        del self.messages[index]
+        del self.tops[index]
+        self._relayout(index)
+        self.schedule_render()
+
+    def yview(self, *args):
+        """Scrollbar command: scroll, then redraw whatever became visible"""
+        self.canvas.yview(*args)
+        top, bottom = self.canvas.yview()
+        self._stick_to_bottom = bottom >= 1.0
+        self.schedule_render()
+        upward = args[0] == "moveto" or int(args[1]) < 0
+        if top <= 0.0 and upward and self.on_scroll_top is not None:
+            self.on_scroll_top()
+
+    def schedule_render(self):
+        """Coalesce redraw requests into one per frame"""
+        if not self._render_pending:
+            self._render_pending = True
+            self.canvas.after_idle(self._render)
+
+    def _on_mousewheel(self, event):
+        if getattr(event, "num", None) == 4 or getattr(event, "delta", 0) > 0:
+            self.yview("scroll", -1, "units")
+        else:
+            self.yview("scroll", 1, "units")
+
+    def _measure(self, message):
+        """Size a bubble from real font metrics, wrapping words like the text item will"""
+        wrap = self.max_bubble_width - 2 * self.BUBBLE_PADX
+        widest = 0
+        lines = 0
+        for paragraph in message.text.split("\n"):
+            line = ""
+            for word in paragraph.split(" "):
+                candidate = f"{line} {word}" if line else word
+                if line and self.font.measure(candidate) > wrap:
+                    widest = max(widest, self.font.measure(line))
+                    lines += 1
+                    line = word
+                else:
+                    line = candidate
+            widest = max(widest, min(self.font.measure(line), wrap))
+            lines += 1
+        message.width = min(widest, wrap) + 2 * self.BUBBLE_PADX
+        message.height = lines * self.line_height + 2 * self.BUBBLE_PADY
+        if not message.is_user:
+            message.height = max(message.height, self.avatar_size)
+
+    def _relayout(self, start):
+        """Recompute offsets from the given index down"""
+        y = self.tops[start - 1] + self.messages[start - 1].height + 2 * self.PADY if start else 0
+        for index in range(start, len(self.messages)):
+            self.tops[index] = y
+            y += self.messages[index].height + 2 * self.PADY
+        self.total_height = y
+
+    def _release(self, message):
+        slot = self._slots.pop(message, None)
+        if slot is None:
+            return
+        for item in (slot.background, slot.fallback, slot.text, slot.avatar):
+            self.canvas.itemconfigure(item, state="hidden")
+        slot.image = None
+        slot.message = None
+        self._free_slots.append(slot)
+
+    def _render(self):
+        self._render_pending = False
+        with metrics.timer("gui_render"):
+            self._render_visible()
+
+    def _render_visible(self):
+        canvas = self.canvas
+        height = max(canvas.winfo_height(), 1)
+        canvas.configure(scrollregion=(0, 0, canvas.winfo_width(), max(self.total_height, height)))
+        if self._stick_to_bottom:
+            canvas.yview_moveto(1.0)
+
+        # Find the messages that overlap the viewport (plus overscan)
+        view_top = canvas.canvasy(0) - self.overscan
+        view_bottom = canvas.canvasy(height) + self.overscan
+        first = max(bisect.bisect_right(self.tops, view_top) - 1, 0)
+        last = bisect.bisect_right(self.tops, view_bottom)
+        visible = set(self.messages[first:last])
+
+        # Recycle slots for messages that scrolled out of range
+        for message in [m for m in self._slots if m not in visible]:
+            self._release(message)
+
+        width = canvas.winfo_width()
+        for index in range(first, min(last, len(self.messages))):
+            message = self.messages[index]
+            slot = self._slots.get(message)
+            if slot is None:
+                slot = self._free_slots.pop() if self._free_slots else _Slot(canvas, self.font)
+                self._slots[message] = slot
+                self._draw(slot, message, width)
+            self._place(slot, message, self.tops[index] + self.PADY, width)
+
+    def _draw(self, slot, message, width):
+        """Configure a slot's items for a message (only when the slot is (re)assigned)"""
+        canvas = self.canvas
+        slot.message = message
+        bubble_color = self.colors["user_bubble"] if message.is_user else self.colors["bot_bubble"]
+        text_color = self.colors["user_text"] if message.is_user else self.colors["bot_text"]
+
+        slot.image = None
+        if self.bubble_image is not None:
+            try:
+                slot.image = self.bubble_image(message.width, message.height, bubble_color, 18)
+            except Exception as e:
+                print(f"Bubble creation error: {e}")
+        slot.width = slot.image.width() if slot.image is not None else message.width
+        if slot.image is not None:
+            canvas.itemconfigure(slot.background, image=slot.image, state="normal")
+            canvas.itemconfigure(slot.fallback, state="hidden")
+        else:
+            canvas.itemconfigure(slot.background, state="hidden")
+            canvas.itemconfigure(slot.fallback, fill=bubble_color, state="normal")
+
+        canvas.itemconfigure(
+            slot.text,
+            text=message.text,
+            fill=text_color,
+            width=self.max_bubble_width - 2 * self.BUBBLE_PADX,
+            state="normal"
+        )
+        if not message.is_user and self.avatar_image is not None:
+            canvas.itemconfigure(slot.avatar, image=self.avatar_image, state="normal")
+        else:
+            canvas.itemconfigure(slot.avatar, state="hidden")
+
+    def _place(self, slot, message, y, width):
+        """Position a slot's items; cheap enough to run for every visible slot on each frame"""
+        if message.is_user:
+            # Leave room for the scrollbar on the right
+            x = width - self.OUTER_PADX - slot.width - 20
+        else:
+            x = self.OUTER_PADX
+            if self.avatar_image is not None:
+                self.canvas.coords(slot.avatar, x, y)
+                x += self.avatar_size + self.AVATAR_GAP
+        self.canvas.coords(slot.background, x, y)
+        self.canvas.coords(slot.fallback, x, y, x + slot.width, y + message.height)
+        self.canvas.coords(slot.text, x + self.BUBBLE_PADX, y + self.BUBBLE_PADY)
@@ -0,0 +1,142 @@
+"""
+Splitting long pasted schedules into chunks for parallel extraction.
+
+A syllabus or conference agenda with dozens of dates is too much for one completion: the
+model drops events and one long response is slow. split_schedule() cuts the text at
+paragraph boundaries (or between dated lines inside an oversized paragraph), repeats the
+section heading and the last line of the previous chunk at the top of the next one so no
+event loses its context, and merge_events() joins the per-chunk results, dropping the
+duplicates the overlap produces. Only text with several dated lines is split (a long email
+about one meeting is a single request), and chunks without a date are not sent at all.
+"""
+import re
+
+from fast_parser import MONTHS, WEEKDAYS
+
+# A chunk holds at most this much text or this many dated lines
+MAX_CHUNK_CHARS = 1200
+MAX_CHUNK_DATES = 12
+# Long text is only split when it has at least this many dated lines
+MIN_CHUNK_DATES = 3
+# Lines from the end of one chunk repeated at the start of the next
+OVERLAP_LINES = 1
+# Short first lines of a paragraph ("Week 3", "Day 2 - March 5") are headings
+MAX_HEADING_CHARS = 80
+
+_MONTH = "(?:" + "|".join(sorted(MONTHS, key=len, reverse=True)) + ")"
+_FULL_WEEKDAY = "(?:" + "|".join(sorted((day for day in WEEKDAYS if day.endswith("day")), key=len, reverse=True)) + ")"
+_SHORT_WEEKDAY = "(?:" + "|".join(sorted((day for day in WEEKDAYS if not day.endswith("day")), key=len, reverse=True)) + ")"
+# Month names and short weekday names ("may", "sun", "mar") only count next to a day number
+DATE_RE = re.compile(
+    r"\b\d{4}-\d{1,2}-\d{1,2}\b|\b\d{1,2}/\d{1,2}(?:/\d{2,4})?\b|\b\d{1,2}(?:st|nd|rd|th)\b"
+    r"|\b" + _MONTH + r"\.?\s+\d{1,2}\b"
+    r"|\b\d{1,2}\s+(?:of\s+)?" + _MONTH + r"\b"
+    r"|\b" + _FULL_WEEKDAY + r"s?\b"
+    r"|\b" + _SHORT_WEEKDAY + r"\b\.?(?=,?\s*\d)",
+    re.IGNORECASE
+)
+
+
+def has_date(line):
+    return DATE_RE.search(line) is not None
+
+
+def date_lines(content):
+    """Number of lines in content that mention a date"""
+    return sum(1 for line in content.splitlines() if has_date(line))
+
+
+def needs_chunking(content, max_chars=MAX_CHUNK_CHARS, max_dates=MAX_CHUNK_DATES):
+    """True for text with too many dated lines for one request, or long text with several"""
+    dates = date_lines(content)
+    return dates > max_dates or (len(content) > max_chars and dates >= MIN_CHUNK_DATES)
+
+
+def _units(content):
+    """[(lines, heading)] paragraphs; heading is the paragraph's title line, if it has one"""
+    units = []
+    for paragraph in re.split(r"\n\s*\n", content.strip()):
+        lines = [line.rstrip() for line in paragraph.splitlines() if line.strip()]
+        if not lines:
+            continue
+        heading = lines[0] if len(lines) > 1 and len(lines[0]) <= MAX_HEADING_CHARS else None
+        units.append((lines, heading))
+    return units
+
+
+def split_schedule(content, max_chars=MAX_CHUNK_CHARS, max_dates=MAX_CHUNK_DATES, overlap=OVERLAP_LINES):
+    """
+    Splits a long schedule into overlapping chunks of text.
+
+    Returns:
+        A list of chunk strings; just [content] when it is small enough for one request or
+        only one chunk would have a date in it. Chunks without a dated line are left out.
+    """
+    if not needs_chunking(content, max_chars, max_dates):
+        return [content]
+
+    units = _units(content)
+    # A short first line ("CS 101 - Fall 2026") names the whole document, e.g. its year
+    first_line = units[0][0][0] if units else ""
+    title = first_line if len(first_line) <= MAX_HEADING_CHARS and not has_date(first_line) else None
+
+    chunks = []
+    current = []
+    added = 0  # Lines in current that are not repeated from the previous chunk
+    added_dates = 0  # Of those, the ones with a date
+    heading = None
+
+    def size(lines):
+        return sum(len(line) + 1 for line in lines), sum(1 for line in lines if has_date(line))
+
+    def emit():
+        nonlocal current, added, added_dates
+        if added_dates:
+            chunks.append("\n".join(current))
+        carry = current[-overlap:] if overlap else []
+        context = [line for line in (title, heading) if line and line not in carry]
+        current = context + carry
+        added = 0
+        added_dates = 0
+
+    for lines, unit_heading in units:
+        chars, dates = size(lines)
+        if chars > max_chars or dates > max_dates:
+            # An oversized paragraph is split between lines instead
+            pieces = [([line], unit_heading if i == 0 else None) for i, line in enumerate(lines)]
+        else:
+            pieces = [(lines, unit_heading)]
+        for piece, piece_heading in pieces:
+            used_chars, used_dates = size(current)
+            piece_chars, piece_dates = size(piece)
+            if added and (used_chars + piece_chars > max_chars or used_dates + piece_dates > max_dates):
+                emit()
+            if piece_heading is not None:
+                heading = piece_heading
+            current.extend(piece)
+            added += len(piece)
+            added_dates += piece_dates
+    if added_dates:
+        chunks.append("\n".join(current))
+    return chunks if len(chunks) > 1 else [content]
+
+
+def event_key(event):
+    """(title, date, start_time) with the title normalized, for spotting duplicates"""
+    title = re.sub(r"\s+", " ", str(event.get("title", ""))).strip().casefold()
+    return title, event.get("date"), event.get("start_time")
+
+
+def merge_events(event_lists):
+    """
+    Concatenates per-chunk events in order, dropping duplicates by (title, date, start_time).
+
+    Of two duplicates the one with more fields (e.g. a recurrence or reminder) is kept.
+    """
+    merged = {}
+    for events in event_lists:
+        for event in events:
+            key = event_key(event)
+            if key not in merged or len(event) > len(merged[key]):
+                merged[key] = event
+    return list(merged.values())
@@ -0,0 +1,260 @@
+"""
+Headless command line: parse prompts into events and optionally create them, without the GUI.
+
+Usage:
+    python cli.py "lunch with Ana Friday noon" [--yes | --dry-run] [--format text|json|ndjson]
+    python cli.py [--yes] [--format ndjson]        (no prompt: one prompt per line, a REPL on a terminal)
+
+The same commands are available as `python main.py parse ...` and `python main.py repl`.
+Nothing here imports tkinter or Pillow. The OpenAI SDK is only imported when a prompt
+needs the model and the Google client only when events are created, so a prompt the
+local parser understands is answered without either. The REPL warms both up in the
+background and reuses them for every line.
+
+--format json prints one object per prompt ({"prompt", "events", "message", "results"}),
+ndjson prints one line per event. In both, stdout carries nothing else: diagnostics from
+the libraries go to stderr, so the output can be piped straight into other tools.
+"""
+import argparse
+import json
+import sys
+import threading
+
+FORMATS = ("text", "json", "ndjson")
+
+
+class Session:
+    """Parses prompts and creates their events, keeping the clients and outbox listener between prompts"""
+
+    def __init__(self, out, output_format="text", commit=None, interactive=False):
+        """
+        Args:
+            out: Stream the results are written to
+            output_format: "text", "json" or "ndjson"
+            commit: True to create events without asking, False never to create them,
+                None to ask (only when interactive, otherwise nothing is created)
+            interactive: Whether questions can be asked on stdin
+        """
+        self.out = out
+        self.output_format = output_format
+        self.commit = commit
+        self.interactive = interactive
+        self.compact = False  # json objects on one line each (the REPL's output is NDJSON)
+        self._finished = {}
+        self._waiting = set()  # Event ids of the create() in progress
+        self._listening = False
+        self.queued = []  # New prompts typed while events were waiting for a yes/no
+
+    def parse(self, prompt):
+        """(events, message): the parsed events (None if there are none) and the confirmation or error text"""
+        import ai_model
+
+        parsed = {}
+
+        def on_events(events, text):
+            parsed["events"] = events
+            parsed["message"] = text
+
+        message = ai_model.run_conversation(prompt, on_events)
+        return parsed.get("events"), parsed.get("message", message)
+
+    def create(self, prompt, events):
+        """Creates events through the outbox; returns one {"id", "error"} per event"""
+        from history import history
+        from outbox import outbox
+
+        if not self._listening:
+            outbox.add_listener(self._on_results)
+            self._listening = True
+        # Recorded durably first; whatever is not sent now stays queued in the outbox
+        event_ids = outbox.enqueue(events, start=False)
+        history.record(prompt, events, event_ids)
+        self._waiting = set(event_ids)
+        problem = "Not sent yet; it stays queued and is sent the next time the outbox runs"
+        try:
+            # Only this prompt's events: other entries in the log may belong to the GUI
+            outbox.flush(event_ids)
+        except Exception as e:
+            problem = f"Not sent yet ({e}); it stays queued and is sent the next time the outbox runs"
+        finally:
+            self._waiting = set()
+        results = []
+        for event_id in event_ids:
+            result = self._finished.pop(event_id, None)
+            if result is None:
+                results.append({"id": None, "error": problem})
+            elif result["error"] is not None:
+                results.append({"id": None, "error": str(result["error"])})
+            else:
+                results.append({"id": result["created"].get("id", event_id), "error": None})
+        return results
+
+    def _on_results(self, results):
+        """Outbox listener: keeps the results of the events create() is waiting for"""
+        self._finished.update((r["event_id"], r) for r in results if r["event_id"] in self._waiting)
+
+    def handle(self, prompt):
+        """Parses one prompt, confirms and creates its events as configured, and prints the outcome"""
+        events, message = self.parse(prompt)
+        parsed = bool(events)
+        results = None
+        if events and self.commit is None and self.interactive and self.output_format == "text":
+            events = self.confirm(events, message)
+            message = None  # Already on screen
+            if events:
+                results = self.create(prompt, events)
+            else:
+                print("Nothing created.", file=self.out)
+        elif events and self.commit:
+            results = self.create(prompt, events)
+        self.report(prompt, events, message, results)
+        ok = parsed and all(result["error"] is None for result in results or [])
+        while self.queued:
+            ok = self.handle(self.queued.pop(0)) and ok
+        return ok
+
+    def confirm(self, events, message):
+        """
+        Asks yes/no on the terminal and returns the events to create or None. An answer about
+        the events is applied as an edit; anything else is queued as the next prompt.
+        """
+        import ai_model
+        import fast_parser
+
+        print(message, file=self.out)
+        while True:
+            try:
+                answer = input("> ").strip()
+            except EOFError:
+                return None
+            reply = fast_parser.confirmation_answer(answer) if answer else "no"
+            if reply == "yes":
+                return events
+            if reply == "no":
+                return None
+            if not fast_parser.refers_to_events(answer) and fast_parser.apply_edit(events, answer) is None:
+                self.queued.append(answer)
+                print("I'll look at that next. Create these events first? (yes/no)", file=self.out)
+                continue
+            edited = ai_model.edit_events(events, answer)
+            if edited is None:
+                print("I couldn't work out that change. Reply yes, no, or describe the change differently.", file=self.out)
+                continue
+            if edited == events:
+                print("The events already look like that. Create them? (yes/no)", file=self.out)
+                continue
+            events = edited
+            print(ai_model.build_confirmation_text(events), file=self.out)
+
+    def report(self, prompt, events, message, results):
+        if self.output_format == "json":
+            item = {"prompt": prompt, "events": events or [], "message": message, "results": results}
+            self.out.write(json.dumps(item, indent=None if self.compact else 2) + "\n")
+        elif self.output_format == "ndjson":
+            for i, event in enumerate(events or []):
+                line = dict(event)
+                if results is not None:
+                    line.update(id=results[i]["id"], error=results[i]["error"])
+                self.out.write(json.dumps(line) + "\n")
+            if not events:
+                self.out.write(json.dumps({"prompt": prompt, "error": message}) + "\n")
+        else:
+            if message:
+                print(message, file=self.out)
+            for event, result in zip(events or [], results or []):
+                status = f"created ({result['id']})" if result["error"] is None else f"failed: {result['error']}"
+                print(f"{event.get('title', 'N/A')}: {status}", file=self.out)
+        self.out.flush()
+
+
+def warm_up():
+    """Loads the OpenAI and Calendar clients on a daemon thread so the first REPL line does not wait"""
+    def run():
+        import ai_model
+        import calendar_mirror
+        from calendar_service import service_manager
+
+        # The last synced copy of the calendar is enough for conflict warnings
+        calendar_mirror.mirror.load()
+        try:
+            ai_model.warm_up()
+        except Exception as e:
+            print(f"OpenAI warm-up failed: {e}", file=sys.stderr)
+        try:
+            service_manager.warm_up()
+        except Exception as e:
+            print(f"Calendar warm-up failed: {e}", file=sys.stderr)
+
+    thread = threading.Thread(target=run, name="eventelf-cli-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def repl(session):
+    """Handles one prompt per line of stdin until EOF, "quit" or "exit" """
+    session.compact = True
+    warm_up()
+    ok = True
+    while True:
+        try:
+            line = input("eventelf> " if session.interactive else "")
+        except (EOFError, KeyboardInterrupt):
+            break
+        line = line.strip()
+        if not line:
+            continue
+        if line.lower() in ("quit", "exit"):
+            break
+        try:
+            ok = session.handle(line) and ok
+        except Exception as e:
+            ok = False
+            print(f"Error processing {line!r}: {e}", file=sys.stderr)
+    return 0 if ok else 1
+
+
+def add_arguments(parser):
+    """The options shared by cli.py and the parse/repl subcommands of main.py"""
+    choice = parser.add_mutually_exclusive_group()
+    choice.add_argument('-y', '--yes', action='store_true', help="create the parsed events without asking")
+    choice.add_argument('-n', '--dry-run', action='store_true', help="only parse, never create")
+    parser.add_argument('-f', '--format', choices=FORMATS, default='text', help="output format (default: text)")
+    parser.add_argument('--json', dest='format', action='store_const', const='json', help="same as --format json")
+    parser.add_argument('--ndjson', dest='format', action='store_const', const='ndjson', help="same as --format ndjson")
+
+
+def run(prompt=None, yes=False, dry_run=False, output_format="text"):
+    """
+    Handles one prompt, or every line of stdin when prompt is None.
+
+    Returns:
+        0 when every prompt gave events (and every requested event was created), 1 otherwise
+    """
+    out = sys.stdout
+    if output_format != "text":
+        # Keep stdout for results; stray prints from the libraries go to stderr
+        sys.stdout = sys.stderr
+    try:
+        session = Session(out, output_format, commit=True if yes else False if dry_run else None,
+                          interactive=sys.stdin.isatty())
+        if prompt is None:
+            return repl(session)
+        try:
+            return 0 if session.handle(prompt) else 1
+        except Exception as e:
+            print(f"Error processing your message: {e}", file=sys.stderr)
+            return 1
+    finally:
+        sys.stdout = out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="EventElf without the GUI: parse prompts into events and create them")
+    parser.add_argument('prompt', nargs='*', help="the prompt (omit it to read one prompt per line)")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    return run(" ".join(args.prompt) or None, yes=args.yes, dry_run=args.dry_run, output_format=args.format)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,810 @@
+"""
+Deterministic local parser for simple event requests.
+
+Handles the common phrasings ("team meeting tomorrow at 11am", "dentist Friday 3-4pm",
+"standup every weekday at 9") without calling OpenAI. parse_event returns an event dict
+with the same shape as ai_model.tool_parameters together with a confidence score, so the
+caller can decide whether to trust it or fall back to the model. apply_edit does the same
+for short follow-up edits ("make it 3pm") to events that are awaiting confirmation, and
+reschedule moves a past event to the day a new request names ("the usual 1:1 tomorrow").
+"""
+import re
+from datetime import date, datetime, timedelta
+
+# Results at or above this confidence are used without asking the model
+CONFIDENCE_THRESHOLD = 0.8
+
+DEFAULT_DURATION_MINUTES = 60
+
+RRULE_DAYS = ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]
+
+WEEKDAYS = {
+    "monday": 0, "mon": 0,
+    "tuesday": 1, "tue": 1, "tues": 1,
+    "wednesday": 2, "wed": 2,
+    "thursday": 3, "thu": 3, "thur": 3, "thurs": 3,
+    "friday": 4, "fri": 4,
+    "saturday": 5, "sat": 5,
+    "sunday": 6, "sun": 6,
+}
+
+MONTHS = {
+    "january": 1, "jan": 1, "february": 2, "feb": 2, "march": 3, "mar": 3,
+    "april": 4, "apr": 4, "may": 5, "june": 6, "jun": 6, "july": 7, "jul": 7,
+    "august": 8, "aug": 8, "september": 9, "sep": 9, "sept": 9,
+    "october": 10, "oct": 10, "november": 11, "nov": 11, "december": 12, "dec": 12,
+}
+
+_WEEKDAY = r"(?:" + "|".join(sorted(WEEKDAYS, key=len, reverse=True)) + r")"
+_MONTH = r"(?:" + "|".join(sorted(MONTHS, key=len, reverse=True)) + r")"
+_TIME = r"(?:\d{1,2}(?::\d{2})?\s*(?:[ap]\.?m\.?)?|noon|midnight)"
+_UNIT = r"(?:minutes?|mins?|hours?|hrs?|h)"
+
+REMINDER_RE = re.compile(
+    r"\b(?:with\s+an?\s+)?(?:remind(?:er)?\s+(?:me\s+)?)?(\d+)\s*(" + _UNIT + r")\s+"
+    r"(?:reminder|before(?:hand)?)\b"
+    r"|\bremind(?:er)?\s+(?:me\s+)?(\d+)\s*(" + _UNIT + r")(?:\s+before(?:hand)?)?\b"
+)
+ISO_DATE_RE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+MONTH_DAY_RE = re.compile(
+    r"\b(?:on\s+)?(" + _MONTH + r")\.?\s+(\d{1,2})(?:st|nd|rd|th)?(?:,?\s+(\d{4}))?\b"
+)
+DAY_MONTH_RE = re.compile(
+    r"\b(?:on\s+)?(?:the\s+)?(\d{1,2})(?:st|nd|rd|th)?\s+(?:of\s+)?(" + _MONTH + r")\b(?:,?\s+(\d{4}))?"
+)
+IN_DAYS_RE = re.compile(r"\bin\s+(\d{1,2})\s+days?\b")
+RELATIVE_DAY_RE = re.compile(r"\b(day\s+after\s+tomorrow|tomorrow|today|tonight)\b")
+EVERY_WEEKDAY_RE = re.compile(r"\b(?:every\s+)?weekdays?\b")
+DAILY_RE = re.compile(r"\b(?:every\s+day|daily)\b")
+WEEKLY_RE = re.compile(r"\b(?:every\s+week|weekly)\b")
+_DAY_SEPARATOR = r"\s*(?:,\s*and|,|and|&|\+)\s*"
+EVERY_DAYS_RE = re.compile(
+    r"\b(?:every|on)\s+(" + _WEEKDAY + r"s?(?:" + _DAY_SEPARATOR + _WEEKDAY + r"s?)*)\b"
+)
+# "mondays and wednesdays": a list that starts with a plural day is a weekly recurrence
+PLURAL_WEEKDAY_RE = re.compile(
+    r"\b(?:on\s+)?(" + _WEEKDAY + r"s(?:" + _DAY_SEPARATOR + _WEEKDAY + r"s?)*)\b"
+)
+WEEKDAY_RE = re.compile(r"\b(?:on\s+)?(this\s+|next\s+)?(" + _WEEKDAY + r")\b")
+RANGE_RE = re.compile(
+    r"\b(?:from\s+)?(" + _TIME + r")\s*(?:-|–|to|until|till)\s*(" + _TIME + r")(?![\w:])"
+)
+TIME_RE = re.compile(
+    r"(?:\b(?:at|@)\s*)?\b(\d{1,2}(?::\d{2})?\s*[ap]\.?m\.?|\d{1,2}:\d{2}|noon|midnight)(?![\w:])"
+)
+BARE_HOUR_RE = re.compile(r"(?:\b(?:at|@)\s*)(\d{1,2})\b(?!:)")
+DURATION_RE = re.compile(r"\bfor\s+(\d+(?:\.\d+)?|an?|half\s+an)\s*(" + _UNIT + r")\b")
+# Explicit time zones ("2pm EST", "9:30 CET", "noon eastern time", "3pm pt"); events are created in UTC
+TIME_ZONE_RE = re.compile(
+    r"\b(?:(?:utc|gmt)(?:\s*[+-]\s*\d{1,2}(?::?\d{2})?)?|[ecmp][sd]t|ak[sd]t|h[sd]t|bst|cest?|eest|ist|jst|kst"
+    r"|aest|aedt|nzst|nzdt|(?:eastern|central|mountain|pacific|atlantic)(?:\s+(?:standard|daylight))?\s+time"
+    r"|time\s*zone)\b"
+    r"|(?:\d|[ap]\.?m\.?|noon)\s*(?:et|ct|mt|pt)\b"
+)
+QUESTION_RE = re.compile(
+    r"\?\s*$|^\s*(?:what|what's|whats|when|where|who|why|which|how|is|are|am|do|does|did|any|show|list"
+    r"|check|find|tell)\b"
+)
+
+LEADING_FILLER = {
+    "schedule", "add", "create", "book", "set", "up", "put", "make", "plan",
+    "new", "event", "a", "an", "the", "my", "please",
+}
+SMALL_WORDS = {"with", "and", "of", "for", "to", "the", "a", "an", "in", "on", "at", "&"}
+CONNECTORS = {"on", "at", "from", "for", "this", "every", "in", "by", "to", "starting"}
+# Requests about existing events; the first word after any polite lead-in gives them away
+CHANGE_VERBS = {
+    "cancel", "delete", "remove", "move", "reschedule", "postpone", "push", "clear", "drop", "undo",
+    "change", "edit", "update", "rename", "shift", "unschedule",
+}
+POLITE_LEAD_IN = {"please", "can", "could", "would", "will", "you", "i", "want", "need", "to", "like", "let's", "lets"}
+# Words that place a bare hour ("at 7") in the evening or the morning
+EVENING_WORDS = {
+    "dinner", "supper", "drinks", "party", "tonight", "evening", "night", "concert", "movie", "movies",
+    "bar", "pub", "gala", "banquet", "theater", "theatre", "karaoke",
+}
+MORNING_WORDS = {"breakfast", "brunch", "morning", "sunrise"}
+# Words left over after parsing that suggest a phrasing the local rules do not understand
+COMPLEX_HINTS = {
+    "next", "after", "before", "until", "through", "except", "other", "biweekly",
+    "fortnight", "fortnightly", "last", "first", "second", "third", "weeks", "months",
+    "month", "year", "yearly", "monthly", "days", "then", "also", "am", "pm", "morning",
+    "afternoon", "evening", "night", "noon", "midnight", "o'clock", "between", "or",
+    "hourly", "twice", "week", "weekend", "tonight", "tomorrow", "today",
+}
+
+
+class _Text:
+    """The user's message plus a lowercase copy whose parsed spans are blanked out"""
+
+    def __init__(self, content):
+        self.original = content
+        self.lower = content.lower()
+
+    def take(self, pattern):
+        """Returns the first match of pattern and blanks its span so later rules skip it"""
+        match = pattern.search(self.lower)
+        if match:
+            self.blank(match.start(), match.end())
+        return match
+
+    def blank(self, start, end):
+        filler = " " * (end - start)
+        self.lower = self.lower[:start] + filler + self.lower[end:]
+        self.original = self.original[:start] + filler + self.original[end:]
+
+
+def _parse_time(text, pm_hint=None):
+    """Converts '3pm', '11:30 am', '15:00', 'noon' into (hour, minute, had_meridiem)"""
+    text = text.strip().replace(".", "")
+    if text == "noon":
+        return 12, 0, True
+    if text == "midnight":
+        return 0, 0, True
+    match = re.match(r"(\d{1,2})(?::(\d{2}))?\s*([ap]m)?$", text)
+    if not match:
+        return None
+    hour, minute = int(match.group(1)), int(match.group(2) or 0)
+    meridiem = match.group(3) or pm_hint
+    if minute > 59 or hour > 23:
+        return None
+    if meridiem:
+        if hour > 12 or hour == 0:
+            return None
+        if meridiem == "pm" and hour != 12:
+            hour += 12
+        elif meridiem == "am" and hour == 12:
+            hour = 0
+    return hour, minute, bool(match.group(3)) or ":" in text
+
+
+def _meridiem(text):
+    match = re.search(r"([ap])\.?m\.?\s*$", text)
+    return match.group(1) + "m" if match else None
+
+
+def _day_part(words):
+    """"evening", "morning" or None, from words like "dinner" or "breakfast" in the request"""
+    if words & EVENING_WORDS:
+        return "evening"
+    if words & MORNING_WORDS:
+        return "morning"
+    return None
+
+
+def _guess_bare_hour(hour, day_part=None):
+    """Maps an hour with no am/pm to the most plausible time of day"""
+    if day_part == "evening" and hour < 12:
+        return hour + 12
+    if day_part == "morning":
+        return hour
+    # 7-11 read as morning, 1-6 as afternoon
+    if 1 <= hour <= 6:
+        return hour + 12
+    return hour
+
+
+def needs_model(content):
+    """True for requests that must go to the model: questions, changes to existing events, time zones"""
+    lower = content.lower()
+    if QUESTION_RE.search(lower) or TIME_ZONE_RE.search(lower):
+        return True
+    words = re.findall(r"[a-z']+", lower)
+    while words and words[0] in POLITE_LEAD_IN:
+        words.pop(0)
+    return bool(words) and (words[0] in CHANGE_VERBS or words[:2] == ["call", "off"])
+
+
+def _next_weekday(today, weekday, include_today=False):
+    days = (weekday - today.weekday()) % 7
+    if days == 0 and not include_today:
+        days = 7
+    return today + timedelta(days=days)
+
+
+def _resolve_month_day(today, month, day, year):
+    try:
+        resolved = date(int(year) if year else today.year, month, day)
+    except ValueError:
+        return None
+    if not year and resolved < today:
+        # "March 5" after March 5 means next year's
+        try:
+            resolved = resolved.replace(year=today.year + 1)
+        except ValueError:
+            return None
+    return resolved
+
+
+def _weekday_list(text):
+    days = []
+    for name in re.findall(_WEEKDAY, text):
+        day = WEEKDAYS[name]
+        if day not in days:
+            days.append(day)
+    return sorted(days)
+
+
+def _clean_title(text):
+    words = re.sub(r"[,;.!?]+", " ", text).split()
+    while words and words[0].lower() in LEADING_FILLER | CONNECTORS | POLITE_LEAD_IN:
+        words.pop(0)
+    while words and words[-1].lower() in CONNECTORS | {"a", "an", "the", "and"}:
+        words.pop()
+    words = [word for word in words if word.lower() not in {"on", "at"}]
+    # Keep the user's capitalization for names, capitalize everything else
+    return " ".join(
+        word if not word.islower() or (i and word in SMALL_WORDS) else word.capitalize()
+        for i, word in enumerate(words)
+    )
+
+
+def parse_event(content, today=None):
+    """
+    Parse a simple single-event request without calling OpenAI.
+
+    Args:
+        content: User input string
+        today: Optional date used to resolve relative dates (defaults to today)
+
+    Returns:
+        A (event, confidence) tuple. event uses the tool_parameters shape (title, date,
+        start_time, end_time and optionally recurrence and reminder) or is None when
+        nothing usable was found; confidence is between 0.0 and 1.0.
+    """
+    today = today or datetime.now().date()
+    text = _Text(content)
+    if needs_model(content):
+        return None, 0.0
+    confidence = 1.0
+    event = {}
+    day_part = _day_part(set(re.findall(r"[a-z]+", text.lower)))
+
+    # Reminders first, since "10 minutes before" would otherwise look like a time
+    match = text.take(REMINDER_RE)
+    if match:
+        amount = int(match.group(1) or match.group(3))
+        unit = match.group(2) or match.group(4)
+        event["reminder"] = amount * 60 if unit.startswith("h") else amount
+
+    match = text.take(DURATION_RE)
+    duration = None
+    if match:
+        amount = match.group(1)
+        amount = 0.5 if amount.startswith("half") else 1 if amount in ("a", "an") else float(amount)
+        duration = int(amount * 60) if match.group(2).startswith("h") else int(amount)
+
+    # Dates
+    event_date = None
+    match = text.take(ISO_DATE_RE)
+    if match:
+        try:
+            event_date = date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+        except ValueError:
+            return None, 0.0
+    if event_date is None:
+        match = text.take(MONTH_DAY_RE)
+        if match:
+            event_date = _resolve_month_day(today, MONTHS[match.group(1)], int(match.group(2)), match.group(3))
+        else:
+            match = text.take(DAY_MONTH_RE)
+            if match:
+                event_date = _resolve_month_day(today, MONTHS[match.group(2)], int(match.group(1)), match.group(3))
+        if match and event_date is None:
+            return None, 0.0
+    if event_date is None:
+        match = text.take(IN_DAYS_RE)
+        if match:
+            event_date = today + timedelta(days=int(match.group(1)))
+    if event_date is None:
+        match = text.take(RELATIVE_DAY_RE)
+        if match:
+            word = match.group(1)
+            event_date = today + timedelta(days=2 if word.startswith("day") else 1 if word == "tomorrow" else 0)
+
+    # Weekly recurrences
+    recurrence_days = None
+    if text.take(EVERY_WEEKDAY_RE):
+        recurrence_days = [0, 1, 2, 3, 4]
+    elif text.take(DAILY_RE):
+        event["recurrence"] = "RRULE:FREQ=DAILY"
+        event_date = event_date or today
+    else:
+        match = text.take(EVERY_DAYS_RE)
+        if match and (match.group(0).startswith("every") or re.search(r"s\b", match.group(1))):
+            recurrence_days = _weekday_list(match.group(1))
+        elif match:
+            # "on friday" is a single date, not a recurrence
+            days = _weekday_list(match.group(1))
+            event_date = event_date or _next_weekday(today, days[0])
+            if len(days) > 1:
+                confidence -= 0.5
+        else:
+            match = text.take(PLURAL_WEEKDAY_RE)
+            if match:
+                recurrence_days = _weekday_list(match.group(1))
+            elif text.take(WEEKLY_RE):
+                recurrence_days = []
+
+    if recurrence_days is not None:
+        if event_date is None:
+            # Start on the first matching day, today included
+            candidates = recurrence_days or [today.weekday()]
+            event_date = min(_next_weekday(today, day, include_today=True) for day in candidates)
+        days = recurrence_days or [event_date.weekday()]
+        event["recurrence"] = "RRULE:FREQ=WEEKLY;BYDAY=" + ",".join(RRULE_DAYS[day] for day in days)
+
+    if event_date is None:
+        match = text.take(WEEKDAY_RE)
+        if match:
+            qualifier = (match.group(1) or "").strip()
+            weekday = WEEKDAYS[match.group(2)]
+            event_date = _next_weekday(today, weekday, include_today=qualifier == "this")
+            if qualifier == "next":
+                # "next friday" may mean this coming friday or the one after
+                confidence -= 0.3
+
+    # Times
+    start = end = None
+    match = text.take(RANGE_RE)
+    if match:
+        end_meridiem = _meridiem(match.group(2))
+        start_meridiem = _meridiem(match.group(1))
+        end = _parse_time(match.group(2))
+        start = _parse_time(match.group(1), pm_hint=start_meridiem or end_meridiem)
+        if start is None or end is None:
+            return None, 0.0
+        if start[:2] >= end[:2] and not start_meridiem and end_meridiem == "pm":
+            # "11-1pm" starts in the morning
+            start = _parse_time(match.group(1), pm_hint="am")
+        if not (start[2] or end[2]):
+            start = (_guess_bare_hour(start[0], day_part), start[1], False)
+            end = (_guess_bare_hour(end[0], day_part), end[1], False)
+            confidence -= 0.1
+    else:
+        match = text.take(TIME_RE)
+        if match:
+            start = _parse_time(match.group(1))
+        else:
+            match = text.take(BARE_HOUR_RE)
+            if match:
+                hour = int(match.group(1))
+                if hour > 12 or hour == 0:
+                    return None, 0.0
+                start = (_guess_bare_hour(hour, day_part), 0, False)
+                # Bare hours are a guess. Without "dinner" or "breakfast" to go by, only 8am-5pm is a safe one
+                confidence -= 0.1 if day_part or 8 <= start[0] <= 17 else 0.4
+
+    if start is None:
+        return None, 0.0
+
+    start_dt = datetime.combine(event_date or today, datetime.min.time()).replace(hour=start[0], minute=start[1])
+    if end is not None:
+        end_dt = start_dt.replace(hour=end[0], minute=end[1])
+    else:
+        end_dt = start_dt + timedelta(minutes=duration or DEFAULT_DURATION_MINUTES)
+    if end_dt <= start_dt or end_dt.date() != start_dt.date():
+        # Events that cross midnight do not fit the single-date shape
+        confidence -= 0.5
+        end_dt = start_dt.replace(hour=23, minute=59)
+
+    if event_date is None:
+        # A time with no day is probably today, but the model may know better
+        event_date = today
+        confidence -= 0.25
+
+    title = _clean_title(text.original)
+    if not title:
+        return None, 0.0
+
+    leftover = set(re.findall(r"[a-z']+", text.lower))
+    if leftover & COMPLEX_HINTS or any(
+        word in WEEKDAYS or word.removesuffix("s") in WEEKDAYS or word in MONTHS for word in leftover
+    ):
+        confidence -= 0.3
+    if re.search(r"\d", text.lower):
+        # Numbers the rules did not consume usually mean a second time or date
+        confidence -= 0.4
+
+    event = {
+        "title": title,
+        "date": event_date.strftime("%Y-%m-%d"),
+        "start_time": start_dt.strftime("%H:%M"),
+        "end_time": end_dt.strftime("%H:%M"),
+        **event,
+    }
+    return event, max(0.0, round(confidence, 2))
+
+
+# Follow-up edits to events awaiting confirmation ("make it 3pm", "move it to thursday")
+
+_SHIFT_UNIT = r"(?:minutes?|mins?|hours?|hrs?|h|days?|weeks?)"
+_AMOUNT = r"(\d+(?:\.\d+)?|an?|half\s+an)"
+
+TARGET_RE = re.compile(
+    r"\b(?:the\s+)?(first|second|third|fourth|fifth|last|1st|2nd|3rd|4th|5th)\s+(?:one|event)\b"
+    r"|\bevent\s+#?(\d{1,2})\b|#(\d{1,2})\b"
+)
+ALL_TARGET_RE = re.compile(r"\b(?:all(?:\s+of\s+them)?|both(?:\s+of\s+them)?|them|everything|each(?:\s+one)?)\b")
+RENAME_RE = re.compile(
+    r"^\s*(?:please\s+)?(?:rename\s+(?:it|this|that|them|the\s+event)?\s*(?:to|as)?"
+    r"|call\s+(?:it|this|that)|name\s+(?:it|this|that)"
+    r"|change\s+the\s+(?:title|name)\s+to|(?:set\s+the\s+)?(?:title|name)\s*(?:to|:))\s+(.+?)\s*$",
+    re.IGNORECASE
+)
+NO_REMINDER_RE = re.compile(r"\b(?:no\s+|remove\s+(?:the\s+)?|drop\s+(?:the\s+)?|without\s+(?:a\s+)?)reminders?\b")
+NO_RECURRENCE_RE = re.compile(
+    r"\b(?:(?:don'?t|do\s+not)\s+repeat|no\s+(?:recurrence|repeat)|(?:just\s+)?once|one[-\s]time"
+    r"|not\s+recurring|stop\s+repeating)\b"
+)
+SHIFT_RE = re.compile(
+    r"\b(?:by\s+)?" + _AMOUNT + r"\s*(" + _SHIFT_UNIT + r")\s+(later|earlier|sooner|back|forward|ahead)\b"
+    r"|\b(later|earlier|back|forward|up)\s+(?:by\s+)?" + _AMOUNT + r"\s*(" + _SHIFT_UNIT + r")\b"
+)
+LENGTH_RE = re.compile(r"\b(?:for\s+)?" + _AMOUNT + r"\s*(" + _UNIT + r")(?:\s+long)?\b")
+END_RE = re.compile(r"\b(?:end(?:s|ing)?|finish(?:es|ing)?|until|till)\s+(?:at\s+)?(" + _TIME + r")(?![\w:])")
+EDIT_BARE_HOUR_RE = re.compile(
+    r"\b(?:to|at|@|make\s+it|make\s+them|start(?:s|ing)?(?:\s+at)?)\s*(\d{1,2})\b(?!:|\s*(?:st|nd|rd|th)\b)"
+)
+ORDINAL_DAY_RE = re.compile(r"\b(?:the\s+)?(\d{1,2})(?:st|nd|rd|th)\b")
+NEXT_WEEK_RE = re.compile(r"\bnext\s+week\b")
+# Words an edit may contain besides the values it sets
+EDIT_FILLER = {
+    "make", "it", "its", "it's", "them", "move", "change", "changed", "to", "the", "time", "date",
+    "day", "at", "on", "please", "instead", "actually", "set", "start", "starts", "starting",
+    "push", "bring", "shift", "bump", "reschedule", "can", "you", "and", "a", "an", "be", "that",
+    "this", "event", "events", "one", "should", "let's", "lets", "so", "ok", "okay", "but",
+    "put", "add", "with", "have", "give", "me", "switch", "just", "for", "by", "of", "is",
+    "from", "starting", "reminder", "long", "oh", "sorry", "i", "meant", "mean", "hmm",
+}
+# Replies to "Do you want to create these events?"; any words after the first must be ANSWER_FILLER
+AFFIRMATIVE = {
+    "y", "yes", "yeah", "yea", "yep", "yup", "ya", "sure", "ok", "okay", "k", "confirm", "confirmed",
+    "correct", "perfect", "great", "absolutely", "definitely", "affirmative", "go", "do", "create", "add",
+    "looks", "sounds", "fine", "good", "that's", "thats", "lgtm",
+}
+NEGATIVE = {"n", "no", "nope", "nah", "cancel", "stop", "discard", "skip", "negative", "never", "forget", "don't", "dont"}
+ANSWER_FILLER = {
+    "please", "thanks", "thank", "you", "do", "it", "go", "ahead", "that", "that's", "thats", "is", "right",
+    "looks", "sounds", "good", "fine", "them", "all", "of", "course", "mind", "not", "now", "just", "sure",
+    "yes", "no", "ok", "okay", "thx", "ty", "lgtm", "the", "events", "event", "these", "this", "one", "ones",
+}
+# Words that tie a reply to the events on screen ("make it 3pm", "move them", "the second one")
+REFERS_RE = re.compile(
+    r"\b(?:it|its|it's|them|they|this|that|these|those|both|instead|actually|one|ones|event|events)\b"
+    r"|^\s*(?:y|yes|yeah|yep|ok|okay|sure|n|no|nope|nah)\b[,.!]?\s+\S"
+    r"|^\s*(?:no,?\s+|yes,?\s+but\s+|but\s+)?(?:make|change|move|rename|call\s+it|push|pull|shift|bump|set"
+    r"|switch|start|end|add|remove|drop|put)\b"
+)
+ORDINALS = {"first": 0, "1st": 0, "second": 1, "2nd": 1, "third": 2, "3rd": 2,
+            "fourth": 3, "4th": 3, "fifth": 4, "5th": 4}
+
+
+def _amount(text):
+    text = text.strip()
+    return 0.5 if text.startswith("half") else 1.0 if text in ("a", "an") else float(text)
+
+
+def _edit_targets(text, count):
+    """Indices of the events an edit applies to, or None when that is ambiguous"""
+    match = text.take(TARGET_RE)
+    if match:
+        if match.group(1):
+            index = count - 1 if match.group(1) == "last" else ORDINALS[match.group(1)]
+        else:
+            index = int(match.group(2) or match.group(3)) - 1
+        return [index] if 0 <= index < count else None
+    if text.take(ALL_TARGET_RE) or count == 1:
+        return list(range(count))
+    return None
+
+
+def _edit_date(text, today):
+    """
+    The date an edit asks for, as a function of the event's current date, or None if it
+    names none (raises ValueError for an invalid date)
+    """
+    match = text.take(ISO_DATE_RE)
+    if match:
+        resolved = date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+        return lambda current: resolved
+    match = text.take(MONTH_DAY_RE)
+    if match:
+        resolved = _resolve_month_day(today, MONTHS[match.group(1)], int(match.group(2)), match.group(3))
+    else:
+        match = text.take(DAY_MONTH_RE)
+        resolved = match and _resolve_month_day(today, MONTHS[match.group(2)], int(match.group(1)), match.group(3))
+    if match:
+        if resolved is None:
+            raise ValueError("invalid date")
+        return lambda current: resolved
+    match = text.take(IN_DAYS_RE)
+    if match:
+        resolved = today + timedelta(days=int(match.group(1)))
+        return lambda current: resolved
+    match = text.take(RELATIVE_DAY_RE)
+    if match:
+        word = match.group(1)
+        resolved = today + timedelta(days=2 if word.startswith("day") else 1 if word == "tomorrow" else 0)
+        return lambda current: resolved
+    if text.take(NEXT_WEEK_RE):
+        return lambda current: current + timedelta(weeks=1)
+    match = text.take(WEEKDAY_RE)
+    if match:
+        qualifier = (match.group(1) or "").strip()
+        resolved = _next_weekday(today, WEEKDAYS[match.group(2)], include_today=qualifier == "this")
+        return lambda current: resolved
+    match = text.take(ORDINAL_DAY_RE)
+    if match:
+        day = int(match.group(1))
+        if not 1 <= day <= 31:
+            raise ValueError("invalid date")
+
+        def in_month(current):
+            # "the 12th" is in the event's month, or the next month that has that day
+            candidate = current.replace(day=1)
+            while True:
+                try:
+                    resolved = candidate.replace(day=day)
+                except ValueError:
+                    resolved = None
+                if resolved is not None and resolved >= min(current, today):
+                    return resolved
+                candidate = (candidate + timedelta(days=32)).replace(day=1)
+        return in_month
+    return None
+
+
+def _edit_times(text):
+    """(start, end) as (hour, minute) tuples from an edit; either may be None"""
+    match = text.take(RANGE_RE)
+    if match:
+        start_meridiem = _meridiem(match.group(1))
+        end_meridiem = _meridiem(match.group(2))
+        end = _parse_time(match.group(2))
+        start = _parse_time(match.group(1), pm_hint=start_meridiem or end_meridiem)
+        if start is None or end is None:
+            raise ValueError("invalid time range")
+        if start[:2] >= end[:2] and not start_meridiem and end_meridiem == "pm":
+            start = _parse_time(match.group(1), pm_hint="am")
+        if not (start[2] or end[2]):
+            start = (_guess_bare_hour(start[0]), start[1], False)
+            end = (_guess_bare_hour(end[0]), end[1], False)
+        return start[:2], end[:2]
+
+    end = None
+    match = text.take(END_RE)
+    if match:
+        end = _parse_time(match.group(1))
+        if end is None:
+            raise ValueError("invalid end time")
+        if not end[2]:
+            end = (_guess_bare_hour(end[0]), end[1], False)
+        end = end[:2]
+
+    start = None
+    match = text.take(TIME_RE)
+    if match:
+        start = _parse_time(match.group(1))
+        if start is None:
+            raise ValueError("invalid time")
+        start = start[:2]
+    else:
+        match = text.take(EDIT_BARE_HOUR_RE)
+        if match:
+            hour = int(match.group(1))
+            if hour > 12 or hour == 0:
+                raise ValueError("invalid hour")
+            start = (_guess_bare_hour(hour), 0)
+    return start, end
+
+
+def _edit_recurrence(text):
+    """A new RRULE, "" to drop the recurrence, or None to leave it alone
+
+    "WEEKLY" stands for a weekly rule on the event's own weekday.
+    """
+    if text.take(NO_RECURRENCE_RE):
+        return ""
+    if text.take(EVERY_WEEKDAY_RE):
+        return "RRULE:FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR"
+    if text.take(DAILY_RE):
+        return "RRULE:FREQ=DAILY"
+    match = EVERY_DAYS_RE.search(text.lower)
+    if match and match.group(0).startswith("every"):
+        text.blank(match.start(), match.end())
+        return "RRULE:FREQ=WEEKLY;BYDAY=" + ",".join(RRULE_DAYS[day] for day in _weekday_list(match.group(1)))
+    if text.take(WEEKLY_RE):
+        return "WEEKLY"
+    return None
+
+
+def apply_edit(events, content, today=None):
+    """
+    Apply a short follow-up edit to parsed events without calling OpenAI.
+
+    Understands new times ("make it 3pm", "2-3pm", "end at 5"), dates ("move it to
+    thursday", "tomorrow", "the 12th"), shifts ("push it back an hour"), lengths ("make it
+    90 minutes"), reminders, recurrence and titles ("call it Team Sync"), aimed at one event
+    ("the second one") or all of them.
+
+    Args:
+        events: The events awaiting confirmation (not modified)
+        content: The user's edit
+        today: Optional date used to resolve relative dates (defaults to today)
+
+    Returns:
+        The edited copy of events (equal to events when the edit changes nothing), or None
+        when the edit is not fully understood and should go to the model instead.
+    """
+    today = today or datetime.now().date()
+    if not events:
+        return None
+
+    match = RENAME_RE.match(content)
+    if match and len(events) == 1:
+        title = match.group(1).strip().strip("\"'")
+        return [dict(events[0], title=title)] if title else None
+
+    text = _Text(content)
+    targets = _edit_targets(text, len(events))
+    if targets is None:
+        return None
+
+    try:
+        changes = {}
+        match = text.take(REMINDER_RE)
+        if match:
+            amount = int(match.group(1) or match.group(3))
+            unit = match.group(2) or match.group(4)
+            changes["reminder"] = amount * 60 if unit.startswith("h") else amount
+        elif text.take(NO_REMINDER_RE):
+            changes["reminder"] = None
+
+        shift = None
+        match = text.take(SHIFT_RE)
+        if match:
+            amount = _amount(match.group(1) or match.group(5))
+            unit = match.group(2) or match.group(6)
+            direction = match.group(3) or match.group(4)
+            minutes = amount * {"d": 1440, "w": 10080, "h": 60}.get(unit[0], 1)
+            shift = timedelta(minutes=-minutes if direction in ("earlier", "sooner", "forward", "ahead", "up") else minutes)
+
+        length = None
+        match = text.take(LENGTH_RE) if shift is None else None
+        if match:
+            amount = _amount(match.group(1))
+            length = timedelta(minutes=amount * 60 if match.group(2).startswith("h") else amount)
+
+        recurrence = _edit_recurrence(text)
+        move_date = _edit_date(text, today)
+        start, end = _edit_times(text)
+        edited = []
+        for index, event in enumerate(events):
+            if index not in targets:
+                edited.append(event)
+                continue
+            old_start = datetime.strptime(f"{event['date']} {event['start_time']}", "%Y-%m-%d %H:%M")
+            old_end = datetime.strptime(f"{event['date']} {event['end_time']}", "%Y-%m-%d %H:%M")
+            duration = old_end - old_start
+            new_date = move_date(old_start.date()) if move_date else old_start.date()
+
+            new_start = datetime.combine(new_date, old_start.time())
+            if start is not None:
+                new_start = new_start.replace(hour=start[0], minute=start[1])
+            if shift is not None:
+                new_start += shift
+            if end is not None:
+                new_end = new_start.replace(hour=end[0], minute=end[1])
+            else:
+                new_end = new_start + (length or duration)
+            if new_end <= new_start or new_end.date() != new_start.date():
+                return None
+
+            updated = dict(event, date=new_start.strftime("%Y-%m-%d"),
+                           start_time=new_start.strftime("%H:%M"), end_time=new_end.strftime("%H:%M"))
+            if recurrence == "":
+                updated.pop("recurrence", None)
+            elif recurrence == "WEEKLY":
+                updated["recurrence"] = f"RRULE:FREQ=WEEKLY;BYDAY={RRULE_DAYS[new_start.weekday()]}"
+            elif recurrence is not None:
+                updated["recurrence"] = recurrence
+            elif updated.get("recurrence") and new_start.date() != old_start.date():
+                # A weekly rule on the old weekday moves with the event
+                old_day, new_day = RRULE_DAYS[old_start.weekday()], RRULE_DAYS[new_start.weekday()]
+                updated["recurrence"] = re.sub(
+                    rf"BYDAY={old_day}(?=;|$)", f"BYDAY={new_day}", updated["recurrence"]
+                )
+            if "reminder" in changes:
+                if changes["reminder"] is None:
+                    updated.pop("reminder", None)
+                else:
+                    updated["reminder"] = changes["reminder"]
+            edited.append(updated)
+    except ValueError:
+        return None
+
+    # Anything left over that is not filler means the edit was not fully understood
+    leftover = re.findall(r"[a-z0-9']+", text.lower)
+    if any(word not in EDIT_FILLER for word in leftover):
+        return None
+    return edited
+
+
+def confirmation_answer(reply):
+    """"yes", "no", or None when a reply to the confirmation question is not a plain answer"""
+    words = re.findall(r"[a-z0-9']+", reply.lower())
+    if not words or not all(word in ANSWER_FILLER for word in words[1:]):
+        return None
+    if words[0] in AFFIRMATIVE and "not" not in words:
+        return "yes"
+    if words[0] in NEGATIVE:
+        return "no"
+    return None
+
+
+def refers_to_events(reply):
+    """True when a reply is about the events awaiting confirmation rather than a new request"""
+    return REFERS_RE.search(reply.lower()) is not None
+
+
+def reschedule(event, content, today=None):
+    """
+    Reuse a past event for a new request that names it ("book the usual 1:1 with Sam",
+    "lunch with Sam tomorrow at 1").
+
+    The copy keeps the past event's title, length and reminder. Dates, times, lengths,
+    reminders and recurrence named in content replace them. With no date it goes on the
+    next day with the same weekday as the past event.
+
+    Args:
+        event: The past event (not modified)
+        content: The new request
+        today: Optional date used to resolve relative dates (defaults to today)
+
+    Returns:
+        (event, words): the rescheduled copy (None if content names an impossible date or
+        time) and the words of content that are not about when the event happens, for
+        the caller to compare with the past event's title.
+    """
+    today = today or datetime.now().date()
+    text = _Text(content)
+    try:
+        past_start = datetime.strptime(f"{event['date']} {event['start_time']}", "%Y-%m-%d %H:%M")
+        past_end = datetime.strptime(f"{event['date']} {event['end_time']}", "%Y-%m-%d %H:%M")
+        reminder = None
+        match = text.take(REMINDER_RE)
+        if match:
+            amount = int(match.group(1) or match.group(3))
+            reminder = amount * 60 if (match.group(2) or match.group(4)).startswith("h") else amount
+        match = text.take(DURATION_RE)
+        length = past_end - past_start
+        if match:
+            amount = _amount(match.group(1))
+            length = timedelta(minutes=amount * 60 if match.group(2).startswith("h") else amount)
+        recurrence = _edit_recurrence(text)
+        move_date = _edit_date(text, today)
+        start, end = _edit_times(text)
+    except (KeyError, ValueError):
+        return None, re.findall(r"[a-z0-9']+", text.lower)
+    words = re.findall(r"[a-z0-9']+", text.lower)
+
+    usual_date = _next_weekday(today, past_start.weekday(), include_today=True)
+    new_start = datetime.combine(move_date(usual_date) if move_date else usual_date, past_start.time())
+    if start is not None:
+        new_start = new_start.replace(hour=start[0], minute=start[1])
+    new_end = new_start.replace(hour=end[0], minute=end[1]) if end is not None else new_start + length
+    if new_end <= new_start or new_end.date() != new_start.date():
+        return None, words
+
+    # A past series is not repeated unless the new request asks for one
+    updated = {key: value for key, value in event.items() if key != "recurrence"}
+    updated.update(date=new_start.strftime("%Y-%m-%d"), start_time=new_start.strftime("%H:%M"),
+                   end_time=new_end.strftime("%H:%M"))
+    if recurrence == "WEEKLY":
+        updated["recurrence"] = f"RRULE:FREQ=WEEKLY;BYDAY={RRULE_DAYS[new_start.weekday()]}"
+    elif recurrence:
+        updated["recurrence"] = recurrence
+    if reminder is not None:
+        updated["reminder"] = reminder
+    return updated, words
@@ -0,0 +1,162 @@
+"""
+Persistent chat history with a full-text index.
+
+Every chat bubble is logged so the window can page older conversations back in as you
+scroll up. Confirmed (and cancelled) requests are stored with their events and Calendar
+event ids, and an FTS5 index over event titles and prompts lets run_conversation answer
+"book the usual 1:1 with Sam" from a past confirmed event instead of calling the model.
+"""
+import json
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import fast_parser
+
+# Share of words the request and a past title must have in common to reuse that event
+MATCH_THRESHOLD = 0.75
+# Past events ranked by the full-text index and then checked one by one
+MAX_CANDIDATES = 20
+# Words that say nothing about which event is meant
+IGNORED_WORDS = fast_parser.LEADING_FILLER | fast_parser.SMALL_WORDS | fast_parser.CONNECTORS | {
+    "usual", "same", "again", "as", "last", "time", "like", "regular", "another", "one", "our", "me", "i",
+}
+WORD_RE = re.compile(r"[a-z0-9']+")
+
+
+def _words(text):
+    return {word for word in WORD_RE.findall(text.lower()) if word not in IGNORED_WORDS}
+
+
+class History:
+    """SQLite log of chat messages and confirmed requests, with an FTS5 index over their events"""
+
+    def __init__(self, path="history.db"):
+        self.path = path
+        self._db = None
+        self._lock = threading.Lock()
+        self.fts = True
+
+    def _connect(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY, at REAL, is_user INTEGER, text TEXT)"
+            )
+            # status is 'confirmed' or 'cancelled'
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS requests (id INTEGER PRIMARY KEY, at REAL, prompt TEXT, status TEXT)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                "id INTEGER PRIMARY KEY, request_id INTEGER, title TEXT, params TEXT, event_id TEXT)"
+            )
+            try:
+                # Contentless: the text lives in events/requests, the index only maps words to event rows
+                self._db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5(title, prompt, content='')")
+            except sqlite3.OperationalError as e:
+                print(f"History search disabled, SQLite has no FTS5: {e}")
+                self.fts = False
+            self._db.commit()
+        return self._db
+
+    def log_message(self, text, is_user):
+        """Appends a chat bubble; returns its id (None if it could not be written)"""
+        with self._lock:
+            try:
+                db = self._connect()
+                cursor = db.execute("INSERT INTO messages (at, is_user, text) VALUES (?, ?, ?)",
+                                    (time.time(), int(is_user), text))
+                db.commit()
+                return cursor.lastrowid
+            except sqlite3.Error as e:
+                print(f"History write error: {e}")
+                return None
+
+    def messages_before(self, before_id=None, limit=30):
+        """Up to limit messages older than before_id (or the newest ones), oldest first, as (id, text, is_user)"""
+        with self._lock:
+            try:
+                db = self._connect()
+                rows = db.execute(
+                    "SELECT id, text, is_user FROM messages WHERE id < ? ORDER BY id DESC LIMIT ?",
+                    (before_id if before_id is not None else 2 ** 63 - 1, limit)
+                ).fetchall()
+            except sqlite3.Error as e:
+                print(f"History read error: {e}")
+                return []
+        return [(message_id, text, bool(is_user)) for message_id, text, is_user in reversed(rows)]
+
+    def record(self, prompt, events, event_ids=None, confirmed=True):
+        """Stores a request with the events parsed from it and, once confirmed, their Calendar event ids"""
+        event_ids = event_ids or [None] * len(events)
+        with self._lock:
+            try:
+                db = self._connect()
+                with db:
+                    request_id = db.execute(
+                        "INSERT INTO requests (at, prompt, status) VALUES (?, ?, ?)",
+                        (time.time(), prompt, "confirmed" if confirmed else "cancelled")
+                    ).lastrowid
+                    for event, event_id in zip(events, event_ids):
+                        rowid = db.execute(
+                            "INSERT INTO events (request_id, title, params, event_id) VALUES (?, ?, ?, ?)",
+                            (request_id, event.get("title", ""), json.dumps(event), event_id)
+                        ).lastrowid
+                        if self.fts:
+                            db.execute("INSERT INTO events_fts (rowid, title, prompt) VALUES (?, ?, ?)",
+                                       (rowid, event.get("title", ""), prompt or ""))
+                return request_id
+            except sqlite3.Error as e:
+                print(f"History write error: {e}")
+                return None
+
+    def candidates(self, content, limit=MAX_CANDIDATES):
+        """Past confirmed events whose title or prompt shares words with content, best match first"""
+        words = _words(content)
+        if not words:
+            return []
+        query = " OR ".join('"' + word.replace('"', "") + '"' for word in sorted(words))
+        with self._lock:
+            try:
+                db = self._connect()
+                if not self.fts:
+                    return []
+                rows = db.execute(
+                    "SELECT e.params FROM events_fts f JOIN events e ON e.id = f.rowid "
+                    "JOIN requests r ON r.id = e.request_id "
+                    "WHERE events_fts MATCH ? AND r.status = 'confirmed' "
+                    "ORDER BY bm25(events_fts), e.id DESC LIMIT ?",
+                    (query, limit)
+                ).fetchall()
+            except sqlite3.Error as e:
+                print(f"History read error: {e}")
+                return []
+        return [json.loads(params) for params, in rows]
+
+    def lookup(self, content, today=None):
+        """
+        Reuses a past confirmed event for a request that names it closely enough.
+
+        Returns:
+            [event] moved to the date and time the request asks for (or the same weekday
+            as last time), or None when no past event matches well enough.
+        """
+        if fast_parser.needs_model(content):
+            return None  # "cancel the usual 1:1" is not a request for another one
+        for past in self.candidates(content):
+            event, words = fast_parser.reschedule(past, content, today or datetime.now().date())
+            if event is None:
+                continue
+            request_words = {word for word in words if word not in IGNORED_WORDS}
+            title_words = _words(past.get("title", ""))
+            union = request_words | title_words
+            if union and len(request_words & title_words) / len(union) >= MATCH_THRESHOLD:
+                return [event]
+        return None
+
+
+history = History()
@@ -0,0 +1,482 @@
+"""
+Streaming iCalendar (.ics) import and export.
+
+Usage: python main.py ics import calendar.ics [--dry-run]
+       python main.py ics export calendar.ics [--since 2026-01-01]
+
+Import reads the file line by line (unfolding continuation lines as it goes), turns each
+VEVENT into a Calendar API event body and sends them in batches through create_events,
+so only one batch is ever held in memory. Event ids are derived from the UID, so running
+the same import twice does not duplicate anything. Outlook's Windows time zone names are
+mapped to IANA ones; events in a zone that cannot be resolved are skipped, and the skip
+reasons are listed at the end. Export pages through events.list with
+pageToken and writes each event as soon as it arrives.
+"""
+import re
+import sys
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import scheduler
+from outbox import event_id_for
+from progress import Progress
+
+DURATION_RE = re.compile(r"^([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$")
+# Reminders further out than this are dropped (the API allows up to four weeks)
+MAX_REMINDER_MINUTES = 40320
+# Windows time zone names as written by Outlook and Exchange, to their IANA equivalents
+WINDOWS_ZONES = {
+    "Dateline Standard Time": "Etc/GMT+12",
+    "Hawaiian Standard Time": "Pacific/Honolulu",
+    "Alaskan Standard Time": "America/Anchorage",
+    "Pacific Standard Time": "America/Los_Angeles",
+    "US Mountain Standard Time": "America/Phoenix",
+    "Mountain Standard Time": "America/Denver",
+    "Central Standard Time": "America/Chicago",
+    "Central America Standard Time": "America/Guatemala",
+    "Canada Central Standard Time": "America/Regina",
+    "Mexico Standard Time": "America/Mexico_City",
+    "Central Standard Time (Mexico)": "America/Mexico_City",
+    "Eastern Standard Time": "America/New_York",
+    "US Eastern Standard Time": "America/Indianapolis",
+    "SA Pacific Standard Time": "America/Bogota",
+    "Atlantic Standard Time": "America/Halifax",
+    "Newfoundland Standard Time": "America/St_Johns",
+    "E. South America Standard Time": "America/Sao_Paulo",
+    "Argentina Standard Time": "America/Buenos_Aires",
+    "UTC": "UTC",
+    "Coordinated Universal Time": "UTC",
+    "GMT Standard Time": "Europe/London",
+    "Greenwich Standard Time": "Atlantic/Reykjavik",
+    "W. Europe Standard Time": "Europe/Berlin",
+    "Central Europe Standard Time": "Europe/Budapest",
+    "Romance Standard Time": "Europe/Paris",
+    "Central European Standard Time": "Europe/Warsaw",
+    "W. Central Africa Standard Time": "Africa/Lagos",
+    "GTB Standard Time": "Europe/Bucharest",
+    "FLE Standard Time": "Europe/Kiev",
+    "E. Europe Standard Time": "Europe/Chisinau",
+    "Israel Standard Time": "Asia/Jerusalem",
+    "Egypt Standard Time": "Africa/Cairo",
+    "South Africa Standard Time": "Africa/Johannesburg",
+    "Turkey Standard Time": "Europe/Istanbul",
+    "Russian Standard Time": "Europe/Moscow",
+    "Arab Standard Time": "Asia/Riyadh",
+    "Arabian Standard Time": "Asia/Dubai",
+    "Iran Standard Time": "Asia/Tehran",
+    "Pakistan Standard Time": "Asia/Karachi",
+    "India Standard Time": "Asia/Calcutta",
+    "Bangladesh Standard Time": "Asia/Dhaka",
+    "SE Asia Standard Time": "Asia/Bangkok",
+    "China Standard Time": "Asia/Shanghai",
+    "Singapore Standard Time": "Asia/Singapore",
+    "Taipei Standard Time": "Asia/Taipei",
+    "W. Australia Standard Time": "Australia/Perth",
+    "Tokyo Standard Time": "Asia/Tokyo",
+    "Korea Standard Time": "Asia/Seoul",
+    "Cen. Australia Standard Time": "Australia/Adelaide",
+    "AUS Eastern Standard Time": "Australia/Sydney",
+    "E. Australia Standard Time": "Australia/Brisbane",
+    "Tasmania Standard Time": "Australia/Hobart",
+    "New Zealand Standard Time": "Pacific/Auckland",
+}
+
+
+# Reading
+
+def unfolded_lines(f):
+    """Yields logical content lines, joining folded continuation lines (RFC 5545 3.1)"""
+    current = None
+    for raw in f:
+        line = raw.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current:
+        yield current
+
+
+def parse_line(line):
+    """Splits 'DTSTART;TZID=Europe/Paris:20261020T100000' into (name, params, value)"""
+    # The first colon outside a quoted parameter value ends the name and parameters
+    in_quotes = False
+    for index, char in enumerate(line):
+        if char == '"':
+            in_quotes = not in_quotes
+        elif char == ":" and not in_quotes:
+            head, value = line[:index], line[index + 1:]
+            break
+    else:
+        return None
+    name, *param_parts = head.split(";")
+    params = {}
+    for part in param_parts:
+        key, _, param_value = part.partition("=")
+        params[key.upper()] = param_value.strip('"')
+    return name.upper(), params, value
+
+
+def unescape(value):
+    return re.sub(r"\\([\\;,nN])", lambda m: "\n" if m.group(1) in "nN" else m.group(1), value)
+
+
+def iter_vevents(f):
+    """
+    Yields one dict per VEVENT: {name: [(params, value), ...]}, plus "VALARM" with the
+    properties of its alarms. Other components (VTIMEZONE, VTODO) are skipped.
+    """
+    stack = []
+    event = None
+    alarm = None
+    for line in unfolded_lines(f):
+        if not line:
+            continue
+        parsed = parse_line(line)
+        if parsed is None:
+            continue
+        name, params, value = parsed
+        if name == "BEGIN":
+            stack.append(value.upper())
+            if stack[-1] == "VEVENT":
+                event = {"VALARM": []}
+            elif stack[-1] == "VALARM" and event is not None:
+                alarm = {}
+            continue
+        if name == "END":
+            component = stack.pop() if stack else None
+            if component == "VEVENT" and event is not None:
+                yield event
+                event = None
+            elif component == "VALARM" and alarm is not None:
+                event["VALARM"].append(alarm)
+                alarm = None
+            continue
+        if alarm is not None:
+            alarm.setdefault(name, []).append((params, value))
+        elif event is not None and stack and stack[-1] == "VEVENT":
+            event.setdefault(name, []).append((params, value))
+
+
+def parse_duration(value):
+    """RFC 5545 DURATION ('PT1H30M', '-P1D') to a timedelta"""
+    match = DURATION_RE.match(value.strip().upper())
+    if not match:
+        raise ValueError(f"Invalid duration: {value}")
+    sign, weeks, days, hours, minutes, seconds = match.groups()
+    delta = timedelta(weeks=int(weeks or 0), days=int(days or 0), hours=int(hours or 0),
+                      minutes=int(minutes or 0), seconds=int(seconds or 0))
+    return -delta if sign == "-" else delta
+
+
+def zone_name(tzid):
+    """
+    The IANA name for a TZID: IANA names are kept, Windows names ("Pacific Standard Time")
+    are mapped and prefixed ones ("/mozilla.org/20050126_1/Europe/Berlin") are stripped.
+
+    Raises:
+        ValueError: The time zone is not known, so the event cannot be placed correctly
+    """
+    name = WINDOWS_ZONES.get(tzid.strip(), tzid.strip())
+    parts = name.strip("/").split("/")
+    for index in range(len(parts)):
+        candidate = "/".join(parts[index:])
+        try:
+            ZoneInfo(candidate)
+        except (ZoneInfoNotFoundError, ValueError):
+            continue
+        return candidate
+    raise ValueError(f"unknown time zone {tzid!r}")
+
+
+def to_api_time(params, value):
+    """(API start/end object, naive or aware datetime or date) for a DTSTART/DTEND value"""
+    value = value.strip()
+    if params.get("VALUE", "").upper() == "DATE" or re.fullmatch(r"\d{8}", value):
+        day = datetime.strptime(value, "%Y%m%d").date()
+        return {"date": day.isoformat()}, day
+    if value.endswith("Z"):
+        moment = datetime.strptime(value, "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc)
+        return {"dateTime": moment.strftime("%Y-%m-%dT%H:%M:%SZ"), "timeZone": "UTC"}, moment
+    moment = datetime.strptime(value, "%Y%m%dT%H%M%S")
+    # Floating times are treated as UTC, like the events EventElf creates itself
+    zone = zone_name(params["TZID"]) if "TZID" in params else "UTC"
+    return {"dateTime": moment.strftime("%Y-%m-%dT%H:%M:%S"), "timeZone": zone}, moment
+
+
+def _shift(api_time, moment, delta):
+    """The API time object for moment + delta, in the same form as the start"""
+    if "date" in api_time:
+        # All-day events end on a later day, however short the duration
+        return {"date": (moment + timedelta(days=max(delta.days, 1))).isoformat()}
+    end = moment + delta
+    if end.tzinfo is not None:
+        return {"dateTime": end.strftime("%Y-%m-%dT%H:%M:%SZ"), "timeZone": "UTC"}
+    return {"dateTime": end.strftime("%Y-%m-%dT%H:%M:%S"), "timeZone": api_time["timeZone"]}
+
+
+def event_body(vevent):
+    """
+    Maps a parsed VEVENT to a Calendar API event body.
+
+    Returns:
+        (body, uid), or (None, reason) for events that are not imported
+    """
+    def first(name, default=None):
+        values = vevent.get(name)
+        return values[0] if values else default
+
+    if "DTSTART" not in vevent:
+        return None, "no DTSTART"
+    if (first("STATUS", ({}, ""))[1]).upper() == "CANCELLED":
+        return None, "cancelled"
+    if "RECURRENCE-ID" in vevent:
+        # Changed occurrences of a recurring event would duplicate the occurrence it replaces
+        return None, "modified occurrence"
+
+    uid = first("UID", ({}, None))[1]
+    start_params, start_value = first("DTSTART")
+    start, moment = to_api_time(start_params, start_value)
+    if "DTEND" in vevent:
+        end, _ = to_api_time(*first("DTEND"))
+    elif "DURATION" in vevent:
+        end = _shift(start, moment, parse_duration(first("DURATION")[1]))
+    else:
+        # RFC 5545: an all-day event lasts one day, a timed event without an end is instantaneous
+        end = _shift(start, moment, timedelta(days=1) if "date" in start else timedelta(0))
+
+    body = {
+        "summary": unescape(first("SUMMARY", ({}, "(no title)"))[1]),
+        "start": start,
+        "end": end,
+    }
+    for name, field in (("DESCRIPTION", "description"), ("LOCATION", "location")):
+        if name in vevent:
+            body[field] = unescape(first(name)[1])
+    recurrence = [f"RRULE:{value}" for _, value in vevent.get("RRULE", [])]
+    for kind in ("EXDATE", "RDATE"):
+        for params, value in vevent.get(kind, []):
+            param_text = "".join(f";{key}={param}" for key, param in params.items())
+            recurrence.append(f"{kind}{param_text}:{value}")
+    if recurrence:
+        body["recurrence"] = recurrence
+
+    overrides = []
+    for alarm in vevent["VALARM"]:
+        trigger = alarm.get("TRIGGER")
+        if not trigger or trigger[0][0].get("VALUE", "").upper() == "DATE-TIME":
+            continue
+        try:
+            minutes = int(-parse_duration(trigger[0][1]).total_seconds() // 60)
+        except ValueError:
+            continue
+        if 0 <= minutes <= MAX_REMINDER_MINUTES:
+            method = "email" if (alarm.get("ACTION", [({}, "")])[0][1]).upper() == "EMAIL" else "popup"
+            overrides.append({"method": method, "minutes": minutes})
+    if overrides:
+        body["reminders"] = {"useDefault": False, "overrides": overrides[:5]}
+    return body, uid
+
+
+def import_file(path, service=None, dry_run=False, out=None):
+    """
+    Streams the events of an .ics file into the primary calendar in batches.
+
+    Args:
+        path: The .ics file, or "-" for stdin
+        service: Optional Calendar service, defaults to the shared one
+        dry_run: Only parse and report what would be imported
+        out: Where the dry run writes one JSON event body per line (default stdout)
+
+    Returns:
+        0 when every event was imported (or skipped on purpose), 1 otherwise
+    """
+    import json
+
+    from calendar_service import BATCH_LIMIT, create_events
+
+    progress = Progress("events", "imported", "skipped", "errors")
+    batch = []
+    batch_ids = []
+    seen_ids = set()
+
+    def flush():
+        results = create_events(batch, service=service, event_ids=batch_ids, build=dict)
+        for result in results:
+            error = result["error"]
+            if error is None:
+                progress.imported += 1
+            elif scheduler.status_of(error) == 409:
+                progress.skip("imported by an earlier run")
+            else:
+                progress.errors += 1
+                print(f"\nCould not import {result['event'].get('summary')!r}: {error}", file=sys.stderr)
+        batch.clear()
+        batch_ids.clear()
+
+    f = sys.stdin if path == "-" else open(path, "r", encoding="utf-8", errors="replace", newline="")
+    try:
+        for index, vevent in enumerate(iter_vevents(f)):
+            progress.events += 1
+            try:
+                body, uid = event_body(vevent)
+            except ValueError as e:
+                body, uid = None, str(e)
+            if body is None:
+                progress.skip(uid)
+                progress.update()
+                continue
+            event_id = event_id_for(f"ics:{uid or index}", 0, {} if uid else body)
+            if event_id in seen_ids:
+                progress.skip("same UID twice in the file")
+                continue
+            seen_ids.add(event_id)
+            if dry_run:
+                (out or sys.stdout).write(json.dumps(dict(body, id=event_id)) + "\n")
+                progress.imported += 1
+            else:
+                batch.append(body)
+                batch_ids.append(event_id)
+                if len(batch) >= BATCH_LIMIT:
+                    flush()
+            progress.update()
+        if batch:
+            flush()
+    finally:
+        progress.update(force=True)
+        if f is not sys.stdin:
+            f.close()
+    return 1 if progress.errors else 0
+
+
+# Writing
+
+def escape(value):
+    return (value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def fold(line):
+    """Folds a content line into 75-octet pieces (RFC 5545 3.1)"""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    pieces = []
+    limit = 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        # Never split a multi-byte character
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        pieces.append(encoded[:cut].decode("utf-8"))
+        encoded = encoded[cut:]
+        limit = 74  # Continuation lines start with a space
+    return "\r\n ".join(pieces) + "\r\n"
+
+
+def format_api_time(name, value):
+    """DTSTART/DTEND line for an API start/end object
+
+    Timed events keep their time zone as a TZID so recurrences stay on local time across
+    DST changes; without one (or with an unknown one) they are written in UTC.
+    """
+    if "date" in value:
+        return f"{name};VALUE=DATE:{value['date'].replace('-', '')}"
+    moment = datetime.fromisoformat(value["dateTime"].replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    zone_name = value.get("timeZone")
+    if zone_name and zone_name != "UTC":
+        try:
+            zone = ZoneInfo(zone_name)
+        except (ZoneInfoNotFoundError, ValueError):
+            zone = None
+        if zone is not None:
+            return f"{name};TZID={zone_name}:{moment.astimezone(zone).strftime('%Y%m%dT%H%M%S')}"
+    return f"{name}:{moment.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}"
+
+
+def vevent_lines(event, stamp):
+    """Content lines for one API event, or [] for events that should not be exported"""
+    cancelled = event.get("status") == "cancelled"
+    if cancelled and not event.get("recurringEventId"):
+        return []
+    if "start" not in event and not cancelled:
+        return []
+
+    lines = ["BEGIN:VEVENT", f"UID:{event.get('iCalUID') or event['id']}", f"DTSTAMP:{stamp}"]
+    if event.get("originalStartTime"):
+        lines.append(format_api_time("RECURRENCE-ID", event["originalStartTime"]))
+    if cancelled:
+        # A cancelled occurrence of a recurring event
+        lines += ["STATUS:CANCELLED", "END:VEVENT"]
+        return lines
+    lines.append(format_api_time("DTSTART", event["start"]))
+    if "end" in event:
+        lines.append(format_api_time("DTEND", event["end"]))
+    lines.append(f"SUMMARY:{escape(event.get('summary', ''))}")
+    for field, name in (("description", "DESCRIPTION"), ("location", "LOCATION")):
+        if event.get(field):
+            lines.append(f"{name}:{escape(event[field])}")
+    if event.get("status") == "tentative":
+        lines.append("STATUS:TENTATIVE")
+    # The API stores recurrence as iCalendar lines already
+    lines.extend(event.get("recurrence", []))
+    for override in (event.get("reminders") or {}).get("overrides", []):
+        action = "EMAIL" if override.get("method") == "email" else "DISPLAY"
+        lines += ["BEGIN:VALARM", f"ACTION:{action}", f"TRIGGER:-PT{int(override['minutes'])}M"]
+        if action == "DISPLAY":
+            lines.append(f"DESCRIPTION:{escape(event.get('summary', 'Reminder'))}")
+        lines.append("END:VALARM")
+    lines.append("END:VEVENT")
+    return lines
+
+
+def export_file(path, service=None, since=None):
+    """
+    Streams every event of the primary calendar into an .ics file.
+
+    Args:
+        path: The .ics file to write, or "-" for stdout
+        service: Optional Calendar service, defaults to the shared one
+        since: Optional 'YYYY-MM-DD'; only events ending after it are exported
+    """
+    if service is None:
+        from calendar_service import get_calendar_service
+
+        service = get_calendar_service()
+
+    progress = Progress("events", "exported", "skipped", "errors")
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    params = {"calendarId": "primary", "maxResults": 2500, "showDeleted": True}
+    if since:
+        params["timeMin"] = datetime.strptime(since, "%Y-%m-%d").strftime("%Y-%m-%dT00:00:00Z")
+
+    out = sys.stdout if path == "-" else open(path, "w", encoding="utf-8", newline="")
+    try:
+        out.write(fold("BEGIN:VCALENDAR") + fold("VERSION:2.0") + fold("PRODID:-//EventElf//EN")
+                  + fold("CALSCALE:GREGORIAN"))
+        page_token = None
+        while True:
+            request = service.events().list(pageToken=page_token, **params)
+            response = scheduler.call("calendar", request.execute)
+            for event in response.get("items", []):
+                progress.events += 1
+                lines = vevent_lines(event, stamp)
+                if lines:
+                    out.write("".join(fold(line) for line in lines))
+                    progress.exported += 1
+                else:
+                    progress.skipped += 1
+                progress.update()
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                break
+        out.write(fold("END:VCALENDAR"))
+    finally:
+        progress.update(force=True)
+        if out is not sys.stdout:
+            out.close()
+    return 0
@@ -0,0 +1,90 @@
+"""
+Image caches for the chat UI.
+
+Bubble backgrounds are memoized in a bounded LRU keyed by (width, height, color, radius),
+with widths rounded up to fixed buckets so similar messages share one image. Fixed assets
+(avatars, icons) are rendered once with PIL and stored as PNGs on disk; later launches load
+them straight into Tk without touching PIL at all.
+"""
+import hashlib
+import os
+import tkinter as tk
+from collections import OrderedDict
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "eventelf")
+
+
+def quantize(value, step):
+    """Round value up to the next multiple of step"""
+    return -(-value // step) * step
+
+
+class BubbleImageCache:
+    """Bounded LRU of rounded-rectangle PhotoImages"""
+
+    def __init__(self, maxsize=256, width_step=16):
+        self.maxsize = maxsize
+        self.width_step = width_step
+        self._images = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, width, height, color, radius=15):
+        """Returns a rounded rectangle image at least width pixels wide"""
+        key = (quantize(width, self.width_step), height, color, radius)
+        image = self._images.get(key)
+        if image is not None:
+            self._images.move_to_end(key)
+            self.hits += 1
+            return image
+
+        self.misses += 1
+        image = self._render(*key)
+        self._images[key] = image
+        if len(self._images) > self.maxsize:
+            self._images.popitem(last=False)
+        return image
+
+    @staticmethod
+    def _render(width, height, color, radius):
+        from PIL import Image, ImageDraw, ImageTk
+
+        image = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(image)
+
+        # Draw a rounded rectangle
+        draw.rounded_rectangle([(0, 0), (width, height)], radius, fill=color)
+
+        return ImageTk.PhotoImage(image)
+
+
+def cached_asset(name, params, render):
+    """
+    Load a pre-rendered asset from the disk cache, rendering and storing it on a miss.
+
+    Args:
+        name: Asset name used in the cache file name
+        params: Values the rendering depends on (size, colors, source file mtime...)
+        render: Function returning a PIL Image, only called on a cache miss
+
+    Returns:
+        A PhotoImage for the asset
+    """
+    digest = hashlib.sha1(repr((name, params)).encode("utf-8")).hexdigest()[:16]
+    path = os.path.join(CACHE_DIR, f"{name}-{digest}.png")
+    if os.path.exists(path):
+        try:
+            # Tk reads PNGs natively, so a warm start needs no PIL work
+            return tk.PhotoImage(file=path)
+        except tk.TclError:
+            pass  # Corrupt or unreadable cache file; render it again
+
+    from PIL import ImageTk
+
+    image = render()
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        image.save(path, format="PNG")
+    except OSError as e:
+        print(f"Image cache write error: {e}")
+    return ImageTk.PhotoImage(image)
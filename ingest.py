@@ -0,0 +1,143 @@
+"""
+Headless bulk ingestion: parse a JSONL file of prompts into events.
+
+Usage: python main.py ingest requests.jsonl [-o events.jsonl] [--workers 8] [--commit]
+
+Each input line is a JSON object with a "prompt" field, a JSON string, or plain text.
+Prompts go through ai_model.run_conversation on a bounded worker pool and results are
+written to the output JSONL as they finish, so memory stays flat for any input size.
+With --commit the events go through the outbox, so inserts that fail stay queued there.
+"""
+import json
+import sys
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from progress import Progress
+
+
+def read_prompts(path):
+    """Yields (line_number, prompt) for every non-empty line of a JSONL file"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError:
+                item = line
+            if isinstance(item, dict):
+                item = item.get("prompt") or item.get("content") or item.get("text") or ""
+            yield line_number, str(item)
+
+
+def parse_prompt(prompt):
+    """Runs one prompt through the model and returns its parsed events"""
+    import ai_model
+
+    parsed = []
+    message = ai_model.run_conversation(prompt, lambda events, text: parsed.extend(events))
+    if not parsed:
+        raise ValueError(message or "No event details were parsed.")
+    return parsed
+
+
+def run(input_path, output_path=None, workers=8, commit=False):
+    """
+    Parse every prompt in input_path and stream the results to output_path.
+
+    Args:
+        input_path: JSONL file of prompts
+        output_path: Output JSONL file, or None / "-" for stdout
+        workers: Number of prompts parsed concurrently
+        commit: Also create the parsed events in Google Calendar
+
+    Returns:
+        0 when every prompt was parsed (and with commit, created), 1 otherwise
+    """
+    if output_path in (None, "-"):
+        out = sys.stdout
+    else:
+        out = open(output_path, "w", encoding="utf-8")
+
+    progress = Progress("prompts", "events", "errors", "created")
+    # Finished items wait here until enough events are collected for one Calendar batch
+    pending_commit = []
+    # Outbox results of the batch being flushed, by event id
+    finished = {}
+    if commit:
+        from outbox import outbox
+
+        outbox.add_listener(lambda results: finished.update((r["event_id"], r) for r in results))
+
+    def write(item):
+        out.write(json.dumps(item) + "\n")
+        out.flush()
+
+    def flush_commit():
+        # Recorded durably first, with deterministic event ids: a retried insert that already
+        # went through is a 409, not a duplicate, and whatever is not sent now stays queued
+        event_ids = outbox.enqueue([event for item in pending_commit for event in item["events"]], start=False)
+        problem = "Not sent yet; it stays queued and is sent the next time the outbox runs"
+        try:
+            outbox.flush(event_ids)
+        except Exception as e:
+            problem = f"Not sent yet ({e}); it stays queued and is sent the next time the outbox runs"
+        ids = iter(event_ids)
+        for item in pending_commit:
+            outcomes = [finished.pop(next(ids), None) for _ in item["events"]]
+            item["created"] = [o["created"].get("id") if o and o["created"] else None for o in outcomes]
+            errors = [str(o["error"]) if o else problem for o in outcomes if not o or o["error"] is not None]
+            if errors:
+                item["commit_error"] = "; ".join(errors)
+                progress.errors += 1
+            progress.created += sum(1 for event_id in item["created"] if event_id)
+            write(item)
+        pending_commit.clear()
+
+    def finish(line_number, prompt, future):
+        item = {"line": line_number, "prompt": prompt}
+        try:
+            item["events"] = future.result()
+            progress.events += len(item["events"])
+        except Exception as e:
+            item["error"] = str(e)
+            progress.errors += 1
+        progress.prompts += 1
+
+        if commit and "events" in item:
+            from calendar_service import BATCH_LIMIT
+
+            pending_commit.append(item)
+            if sum(len(i["events"]) for i in pending_commit) >= BATCH_LIMIT:
+                flush_commit()
+        else:
+            write(item)
+        progress.update()
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="eventelf-ingest") as executor:
+            in_flight = {}
+            for line_number, prompt in read_prompts(input_path):
+                # Bound the number of queued prompts so memory does not grow with the input
+                while len(in_flight) >= workers * 2:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    # In input order, so items finishing together are written and batched in order
+                    for future in sorted(done, key=lambda future: in_flight[future][0]):
+                        finish(*in_flight.pop(future), future)
+                future = executor.submit(parse_prompt, prompt)
+                in_flight[future] = (line_number, prompt)
+
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in sorted(done, key=lambda future: in_flight[future][0]):
+                    finish(*in_flight.pop(future), future)
+
+        if pending_commit:
+            flush_commit()
+    finally:
+        progress.update(force=True)
+        if out is not sys.stdout:
+            out.close()
+
+    return 1 if progress.errors else 0
@@ -1,63 +1,153 @@
-from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from datetime import datetime, timedelta, timezone
+import argparse
 import os.path
-import pickle
-
-# If modifying these SCOPES, delete the file token.pickle.
-SCOPES = ['https://www.googleapis.com/auth/calendar']
-
-def get_calendar_service():
-    """Authenticates and returns a Google Calendar service object, or uses credentials from existing token.pickle file""" 
-    creds = None
-    if os.path.exists('token.pickle'):
-        with open('token.pickle', 'rb') as token:
-            creds = pickle.load(token)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            credentials_path = os.path.join(script_dir, 'config', 'credentials.json')
-            flow = InstalledAppFlow.from_client_secrets_file(
-                credentials_path, SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open('token.pickle', 'wb') as token:
-            pickle.dump(creds, token)
-    service = build('calendar', 'v3', credentials=creds)
-    return service
-    
-def create_event(event_params):
-    """Creates a Google Calendar event"""
-    service = get_calendar_service()
-
-    # Build the start and end datetime strings (assuming UTC here, adjust as needed)
-    start_datetime = f"{event_params['date']}T{event_params['start_time']}:00"
-    end_datetime = f"{event_params['date']}T{event_params['end_time']}:00"
-
-    event_body = {
-        "summary": event_params['title'],
-        "start": {"dateTime": start_datetime, "timeZone": "UTC"},
-        "end": {"dateTime": end_datetime, "timeZone": "UTC"}
-    }
-
-    if 'recurrence' in event_params and event_params['recurrence']:
-        # The API expects a list of recurrence rules.
-        event_body["recurrence"] = [event_params['recurrence']]
-
-    if 'reminder' in event_params and event_params['reminder']:
-        event_body["reminders"] = {
-            "useDefault": False,
-            "overrides": [{"method": "popup", "minutes": event_params['reminder']}]
-        }
-
-    created_event = service.events().insert(calendarId='primary', body=event_body).execute()
-    return created_event
-
-def main():
+import sys
+import threading
+
+def warm_up_clients():
+    """Loads the OpenAI and Google client stacks; meant to run on a background thread"""
+    import ai_model
+    import calendar_mirror
+    import calendar_service
+
+    # The last synced copy of the calendar is usable for conflict checks right away
+    calendar_mirror.mirror.load()
+    try:
+        ai_model.warm_up()
+    except Exception as e:
+        print(f"OpenAI warm-up failed: {e}")
+    service_manager = calendar_service.service_manager
+    service_manager.warm_up()
+    if os.path.exists(service_manager.token_path):
+        calendar_mirror.mirror.start_background_sync(service_manager)
+
+def start_warm_up():
+    """Starts warm_up_clients on a daemon thread"""
+    thread = threading.Thread(target=warm_up_clients, name="eventelf-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    profiler = None
+    if '--profile-startup' in argv:
+        # Started before the app's own modules are imported, so their import time is counted too
+        import startup_profile
+        profiler = startup_profile.StartupProfiler()
+        profiler.start()
+
+    import cli
+    import metrics
+    from calendar_service import BATCH_LIMIT
+
+    parser = argparse.ArgumentParser(description="EventElf: natural-language Google Calendar events")
+    parser.add_argument('--profile-startup', action='store_true', help="print an import-time breakdown once the window appears")
+    parser.add_argument('--metrics', metavar='PATH', help="record stage latencies and write them to PATH on exit (.json or Prometheus text)")
+    parser.add_argument('--trace', metavar='PATH', help="append a JSON line per timed stage to PATH")
+    subparsers = parser.add_subparsers(dest='command')
+
+    ingest_parser = subparsers.add_parser('ingest', help="parse a JSONL file of prompts without the GUI")
+    ingest_parser.add_argument('input', help="JSONL file with one prompt per line")
+    ingest_parser.add_argument('-o', '--output', default='-', help="output JSONL file (default: stdout)")
+    ingest_parser.add_argument('-w', '--workers', type=int, default=8, help="prompts parsed concurrently")
+    ingest_parser.add_argument('--commit', action='store_true', help="also create the events in Google Calendar")
+
+    serve_parser = subparsers.add_parser('serve', help="run the multi-user HTTP service")
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8080)
+    serve_parser.add_argument('--tokens-dir', default='tokens', help="directory of per-user <user>.pickle tokens")
+    serve_parser.add_argument('--openai-concurrency', type=int, default=64, help="overlapping OpenAI requests allowed")
+    serve_parser.add_argument('--issue-key', metavar='USER', help="print a new bearer key for USER and exit")
+
+    parse_parser = subparsers.add_parser('parse', help="parse one prompt without the GUI, optionally creating its events")
+    parse_parser.add_argument('prompt', nargs='+')
+    repl_parser = subparsers.add_parser('repl', help="parse one prompt per line of input, keeping the clients warm")
+    for cli_parser in (parse_parser, repl_parser):
+        cli.add_arguments(cli_parser)
+
+    watch_parser = subparsers.add_parser('watch', help="turn text files, .eml files and mbox mail dropped into a folder into events")
+    watch_parser.add_argument('paths', nargs='*', help="directories and mbox files to watch")
+    watch_parser.add_argument('--review', action='store_true', help="confirm the events parsed so far instead of watching")
+    watch_parser.add_argument('--commit', action='store_true', help="create parsed events right away instead of holding them for --review")
+    watch_parser.add_argument('-w', '--workers', type=int, default=4, help="items parsed concurrently")
+    watch_parser.add_argument('--interval', type=float, default=2.0, help="seconds between scans")
+    watch_parser.add_argument('--max-per-hour', type=int, default=200, help="items parsed per hour at most")
+    watch_parser.add_argument('--once', action='store_true', help="exit once everything already there is parsed")
+    watch_parser.add_argument('--state', default='watch.db', help="file recording what was read and what awaits review")
+
+    ics_parser = subparsers.add_parser('ics', help="import or export .ics files")
+    ics_subparsers = ics_parser.add_subparsers(dest='ics_command', required=True)
+    ics_import = ics_subparsers.add_parser('import', help="add every event of an .ics file to the calendar")
+    ics_import.add_argument('input', help=".ics file (or - for stdin)")
+    ics_import.add_argument('--dry-run', action='store_true', help="print the event bodies as JSONL instead of creating them")
+    ics_export = ics_subparsers.add_parser('export', help="write the calendar to an .ics file")
+    ics_export.add_argument('output', help=".ics file (or - for stdout)")
+    ics_export.add_argument('--since', metavar='YYYY-MM-DD', help="only events ending after this date")
+
+    bench_parser = subparsers.add_parser('bench', help="benchmark the hot paths against local fake OpenAI and Calendar servers")
+    bench_parser.add_argument('-n', '--requests', type=int, default=200, help="prompts or events per scenario")
+    bench_parser.add_argument('-c', '--concurrency', type=int, default=8, help="concurrent callers")
+    bench_parser.add_argument('--scenarios', default='conversation,stream,insert,batch,ingest')
+    bench_parser.add_argument('--batch-size', type=int, default=BATCH_LIMIT)
+    bench_parser.add_argument('--events-per-prompt', type=int, default=1)
+    bench_parser.add_argument('--openai-latency', type=float, default=0.05, help="seconds per fake OpenAI response")
+    bench_parser.add_argument('--calendar-latency', type=float, default=0.02, help="seconds per fake Calendar response")
+    bench_parser.add_argument('--jitter', type=float, default=0.25, help="latency jitter as a fraction of the latency")
+    bench_parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of fake responses that fail (429/5xx)")
+    bench_parser.add_argument('--seed', type=int, default=None)
+    bench_parser.add_argument('--real-limits', action='store_true', help="keep the production rate limits")
+    bench_parser.add_argument('--json', metavar='PATH', help="write the results as JSON")
+    bench_parser.add_argument('--baseline', metavar='PATH', help="earlier --json results to check for regressions")
+    bench_parser.add_argument('--max-regression', type=float, default=0.2, help="allowed slowdown before failing (0.2 = 20%%)")
+
+    args = parser.parse_args(argv)
+    if profiler is not None and args.command is not None:
+        profiler.stop()  # Only the window's startup is reported
+
+    if args.metrics or args.trace:
+        metrics.enable(args.metrics, args.trace)
+
+    if args.command == 'ingest':
+        import ingest
+        return ingest.run(args.input, args.output, workers=args.workers, commit=args.commit)
+
+    if args.command in ('parse', 'repl'):
+        prompt = " ".join(args.prompt) if args.command == 'parse' else None
+        return cli.run(prompt, yes=args.yes, dry_run=args.dry_run, output_format=args.format)
+
+    if args.command == 'watch':
+        import watch
+        if args.review:
+            return watch.review(args.state)
+        if not args.paths:
+            parser.error("watch needs at least one directory or mbox file (or --review)")
+        return watch.run(args.paths, workers=args.workers, commit=args.commit, interval=args.interval,
+                         once=args.once, state_path=args.state, max_per_hour=args.max_per_hour)
+
+    if args.command == 'ics':
+        import ical
+        if args.ics_command == 'import':
+            return ical.import_file(args.input, dry_run=args.dry_run)
+        return ical.export_file(args.output, since=args.since)
+
+    if args.command == 'bench':
+        import benchmark
+        return benchmark.run(args)
+
+    if args.command == 'serve':
+        import server
+        if args.issue_key:
+            return server.issue_key(args.tokens_dir, args.issue_key)
+        return server.run(args.host, args.port, args.tokens_dir, args.openai_concurrency)
+
     import GUI
-    GUI.main()
+
+    def on_first_frame():
+        if profiler is not None:
+            profiler.report()
+        # Load the API clients while the user types their first message
+        start_warm_up()
+
+    GUI.main(on_first_frame=on_first_frame)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,233 @@
+"""
+Lightweight per-stage latency and counter metrics.
+
+Off by default. Turn it on with `python main.py --metrics metrics.prom` (or the
+EVENTELF_METRICS environment variable); the histograms are written there on exit, as JSON
+if the path ends in .json and as Prometheus text otherwise. `--trace trace.jsonl` (or
+EVENTELF_TRACE) also appends one JSON line per timed stage, tagged with a request id.
+
+While disabled, timer() hands back a shared no-op context manager and inc() returns at
+once, so instrumented code pays a single attribute check.
+"""
+import atexit
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+
+# Upper bounds in seconds, from a local parse up to a throttled API call
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_request_id = contextvars.ContextVar("eventelf_request_id", default=None)
+
+
+class Histogram:
+    """Cumulative bucket counts plus count, sum, min and max"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Estimate of the q-th quantile, interpolated linearly inside the bucket that holds it
+
+        The bucket edges are narrowed to the observed min and max, so a stage whose samples
+        all fall in one bucket still reports where in that bucket they are.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            if count and seen + count >= rank:
+                low, high = max(lower, self.min), min(bound, self.max)
+                return low + (high - low) * max(rank - seen, 0) / count
+            seen += count
+            lower = bound
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min or 0.0,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": dict(zip([str(bound) for bound in self.buckets] + ["+Inf"], self.counts)),
+        }
+
+
+class _Timer:
+    __slots__ = ("registry", "name", "fields", "started")
+
+    def __init__(self, registry, name, fields):
+        self.registry = registry
+        self.name = name
+        self.fields = fields
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        fields = self.fields
+        if exc_type is not None:
+            fields = dict(fields, error=exc_type.__name__)
+        self.registry.observe(self.name, time.perf_counter() - self.started, **fields)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _RequestScope:
+    __slots__ = ("token",)
+
+    def __enter__(self):
+        self.token = _request_id.set(uuid.uuid4().hex[:12])
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _request_id.reset(self.token)
+        return False
+
+
+class Registry:
+    """Named histograms (seconds) and counters, with optional file export and tracing"""
+
+    def __init__(self):
+        self.enabled = False
+        self.histograms = {}
+        self.counters = Counter()
+        self.export_path = None
+        self._trace_file = None
+        self._lock = threading.Lock()
+
+    def enable(self, export_path=None, trace_path=None):
+        """Starts recording; export_path is written at exit, trace_path gets one line per stage"""
+        with self._lock:
+            if export_path and self.export_path is None:
+                atexit.register(self._export_at_exit)
+            self.export_path = export_path or self.export_path
+            if trace_path and self._trace_file is None:
+                self._trace_file = open(trace_path, "a", encoding="utf-8", buffering=1)
+            self.enabled = True
+
+    def timer(self, name, **fields):
+        """Context manager recording the duration of its block under name"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, fields)
+
+    def request(self):
+        """Context manager tagging trace lines inside it with a fresh request id (unless one is set)"""
+        if not self.enabled or _request_id.get() is not None:
+            return _NULL_TIMER
+        return _RequestScope()
+
+    def observe(self, name, seconds, **fields):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+            if self._trace_file is not None:
+                line = {"ts": time.time(), "request": _request_id.get(), "stage": name,
+                        "ms": round(seconds * 1000, 3)}
+                line.update(fields)
+                self._trace_file.write(json.dumps(line, default=str) + "\n")
+
+    def inc(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] += value
+
+    def snapshot(self):
+        """{"histograms": {...}, "counters": {...}} as plain JSON-ready data"""
+        with self._lock:
+            return {
+                "histograms": {name: h.snapshot() for name, h in sorted(self.histograms.items())},
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+    def to_prometheus(self):
+        """The metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for name, histogram in sorted(self.histograms.items()):
+                metric = f"eventelf_{name}_seconds"
+                lines.append(f"# TYPE {metric} histogram")
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_bucket{{le="+Inf"}} {histogram.count}')
+                lines.append(f"{metric}_sum {histogram.sum:.6f}")
+                lines.append(f"{metric}_count {histogram.count}")
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE eventelf_{name}_total counter")
+                lines.append(f"eventelf_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """Writes the metrics to path: JSON for *.json, Prometheus text otherwise"""
+        if path.endswith(".json"):
+            text = json.dumps(self.snapshot(), indent=2)
+        else:
+            text = self.to_prometheus()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    def _export_at_exit(self):
+        try:
+            self.export(self.export_path)
+        except OSError as e:
+            print(f"Could not write metrics to {self.export_path}: {e}")
+        if self._trace_file is not None:
+            self._trace_file.close()
+            self._trace_file = None
+
+
+registry = Registry()
+timer = registry.timer
+request = registry.request
+observe = registry.observe
+inc = registry.inc
+snapshot = registry.snapshot
+enable = registry.enable
+
+if os.environ.get("EVENTELF_METRICS") or os.environ.get("EVENTELF_TRACE"):
+    enable(os.environ.get("EVENTELF_METRICS"), os.environ.get("EVENTELF_TRACE"))
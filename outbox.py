@@ -0,0 +1,281 @@
+"""
+Durable outbox for confirmed events.
+
+Confirmed events are appended to a local SQLite (WAL) log before anything touches the
+network, each with a deterministic Calendar event id. A background flusher drains the log
+in batches, keeps transient failures for later, and survives restarts. Because the id is
+fixed when the event is confirmed, a resend after a crash gets a 409 "already exists",
+which counts as success, so every confirmed event is created exactly once.
+
+While a confirmation is on screen, prepare() has the flusher thread build the request
+bodies and get the Calendar connection ready (fresh credentials, an open HTTPS
+connection), so a "yes" costs one batch round-trip. A "no" just drops the bodies.
+"""
+import base64
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+import scheduler
+
+# Flushed entries older than this are dropped from the log on startup
+RETENTION_DAYS = 30
+MAX_BACKOFF = 300
+
+
+def event_id_for(confirmation_id, index, event_params):
+    """
+    Deterministic Calendar event id for one event of a confirmation.
+
+    Calendar ids must be 5-1024 characters from base32hex (0-9, a-v).
+    """
+    canonical = json.dumps(event_params, sort_keys=True, separators=(",", ":"))
+    digest = hashlib.sha256(f"{confirmation_id}:{index}:{canonical}".encode("utf-8")).digest()
+    return base64.b32hexencode(digest).decode("ascii").rstrip("=").lower()[:32]
+
+
+class Outbox:
+    """Append-only SQLite log of confirmed events plus the thread that sends them"""
+
+    def __init__(self, path="outbox.db", batch_size=None):
+        self.path = path
+        self.batch_size = batch_size
+        self._db = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._listeners = []
+        # Confirmations waiting for prepare work on the flusher thread, as (confirmation_id, events)
+        self._preparing = []
+        # Request bodies built ahead of time by event id, and the ids of each prepared confirmation
+        self._bodies = {}
+        self._prepared = {}
+        # Set when entries were enqueued and should be sent without waiting out a backoff
+        self._flush_due = threading.Event()
+
+    def _connect(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=FULL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, event_id TEXT UNIQUE, "
+                "confirmation_id TEXT, params TEXT, created_at REAL)"
+            )
+            # One row per attempt outcome: 'retry', 'done' or 'failed'
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS outbox_log ("
+                "event_id TEXT, status TEXT, detail TEXT, at REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS outbox_log_event ON outbox_log (event_id)")
+            self._compact()
+        return self._db
+
+    def _compact(self):
+        cutoff = time.time() - RETENTION_DAYS * 86400
+        finished = "SELECT event_id FROM outbox_log WHERE status IN ('done', 'failed') AND at < ?"
+        self._db.execute(f"DELETE FROM outbox WHERE event_id IN ({finished})", (cutoff,))
+        self._db.execute("DELETE FROM outbox_log WHERE event_id NOT IN (SELECT event_id FROM outbox)")
+        self._db.commit()
+
+    def add_listener(self, listener):
+        """Registers listener(results), called from the flusher thread after each batch.
+
+        results has one dict per finished event with "event_id", "event", "created" and "error".
+        """
+        self._listeners.append(listener)
+
+    def prepare(self, events):
+        """
+        Builds request bodies and readies the Calendar connection for events not confirmed yet.
+
+        The work runs on the flusher thread, which is the one that sends them.
+
+        Returns:
+            A confirmation id: pass it to enqueue() on "yes" so the prepared bodies are
+            used, or to discard() on "no".
+        """
+        confirmation_id = uuid.uuid4().hex
+        with self._lock:
+            self._preparing.append((confirmation_id, list(events)))
+        self.start()
+        self._wake.set()
+        return confirmation_id
+
+    def discard(self, confirmation_id):
+        """Drops whatever prepare() built for a confirmation that was cancelled or edited"""
+        with self._lock:
+            self._preparing = [item for item in self._preparing if item[0] != confirmation_id]
+            for event_id in self._prepared.pop(confirmation_id, []):
+                self._bodies.pop(event_id, None)
+
+    def _prepare_waiting(self):
+        """Builds the bodies for every confirmation handed to prepare() and warms the Calendar service"""
+        from calendar_service import build_event_body, service_manager
+
+        with self._lock:
+            preparing = list(self._preparing)
+        if not preparing:
+            return
+        for item in preparing:
+            confirmation_id, events = item
+            bodies = {}
+            for i, event in enumerate(events):
+                try:
+                    bodies[event_id_for(confirmation_id, i, event)] = build_event_body(event)
+                except (KeyError, ValueError):
+                    continue  # Reported by create_events if the event is confirmed anyway
+            with self._lock:
+                if item not in self._preparing:
+                    continue  # Discarded while the bodies were being built
+                self._preparing.remove(item)
+                self._bodies.update(bodies)
+                self._prepared[confirmation_id] = list(bodies)
+        try:
+            service_manager.prepare()
+        except Exception as e:
+            # e.g. not signed in yet; the send does the usual sign-in
+            print(f"Calendar prepare skipped: {e}")
+
+    def enqueue(self, events, start=True, confirmation_id=None):
+        """Durably records confirmed events and returns their Calendar event ids
+
+        With start=False the background flusher is not started; the caller flushes itself.
+        Pass the confirmation id from prepare() to send the bodies it built.
+        """
+        if confirmation_id is None:
+            confirmation_id = uuid.uuid4().hex
+        ids = [event_id_for(confirmation_id, i, event) for i, event in enumerate(events)]
+        with self._lock:
+            # The flusher prepares before it flushes, so a quick "yes" still gets the prepared
+            # bodies. Bodies of events that changed since prepare() have other ids and go.
+            for event_id in self._prepared.pop(confirmation_id, []):
+                if event_id not in ids:
+                    self._bodies.pop(event_id, None)
+            db = self._connect()
+            with db:
+                db.executemany(
+                    "INSERT OR IGNORE INTO outbox (event_id, confirmation_id, params, created_at) VALUES (?, ?, ?, ?)",
+                    [(event_id, confirmation_id, json.dumps(event), time.time()) for event_id, event in zip(ids, events)]
+                )
+        if start:
+            self.start()
+            self._flush_due.set()
+            self._wake.set()
+        return ids
+
+    def pending(self, event_ids=None):
+        """[(event_id, params, attempts)] for entries that are neither done nor failed, oldest first
+
+        With event_ids, only those entries; other processes (the GUI, another CLI run) may share the log.
+        """
+        with self._lock:
+            db = self._connect()
+            rows = db.execute(
+                "SELECT o.event_id, o.params, "
+                "(SELECT COUNT(*) FROM outbox_log l WHERE l.event_id = o.event_id AND l.status = 'retry') "
+                "FROM outbox o WHERE NOT EXISTS (SELECT 1 FROM outbox_log l WHERE l.event_id = o.event_id "
+                "AND l.status IN ('done', 'failed')) ORDER BY o.seq"
+            ).fetchall()
+        wanted = None if event_ids is None else set(event_ids)
+        return [(event_id, json.loads(params), attempts) for event_id, params, attempts in rows
+                if wanted is None or event_id in wanted]
+
+    def _record(self, outcomes):
+        with self._lock:
+            db = self._connect()
+            with db:
+                db.executemany(
+                    "INSERT INTO outbox_log VALUES (?, ?, ?, ?)",
+                    [(event_id, status, detail, time.time()) for event_id, status, detail in outcomes]
+                )
+
+    def flush(self, event_ids=None):
+        """
+        Sends every pending entry once, in batches.
+
+        Args:
+            event_ids: Optional ids from enqueue(); only these entries are sent
+
+        Returns:
+            The delay in seconds before transient failures should be retried, or None
+            when nothing is left pending.
+        """
+        from calendar_service import BATCH_LIMIT, create_events
+
+        retry_delay = None
+        entries = self.pending(event_ids)
+        batch_size = self.batch_size or BATCH_LIMIT
+        for offset in range(0, len(entries), batch_size):
+            batch = entries[offset:offset + batch_size]
+            ids = [event_id for event_id, _, _ in batch]
+            with self._lock:
+                bodies = [self._bodies.pop(event_id, None) for event_id in ids]
+                # Forget confirmations whose bodies have all been sent
+                self._prepared = {
+                    key: prepared_ids for key, prepared_ids in self._prepared.items()
+                    if any(event_id in self._bodies for event_id in prepared_ids)
+                }
+            results = create_events([params for _, params, _ in batch], event_ids=ids, bodies=bodies)
+
+            outcomes = []
+            finished = []
+            for (event_id, params, attempts), result in zip(batch, results):
+                error = result["error"]
+                if error is None or scheduler.status_of(error) == 409:
+                    # 409 means an earlier attempt already created this exact event
+                    created = result["created"] or {"id": event_id}
+                    outcomes.append((event_id, "done", json.dumps(created)))
+                    finished.append({"event_id": event_id, "event": params, "created": created, "error": None})
+                elif scheduler.is_retryable(error) or isinstance(error, scheduler.CircuitOpenError):
+                    outcomes.append((event_id, "retry", str(error)))
+                    delay = min(MAX_BACKOFF, 2 ** (attempts + 1))
+                    retry_delay = delay if retry_delay is None else min(retry_delay, delay)
+                else:
+                    outcomes.append((event_id, "failed", str(error)))
+                    finished.append({"event_id": event_id, "event": params, "created": None, "error": error})
+            self._record(outcomes)
+            if finished:
+                for listener in self._listeners:
+                    listener(finished)
+        return retry_delay
+
+    def start(self):
+        """Starts the background flusher (idempotent); it drains leftovers from earlier runs too"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="eventelf-outbox", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self):
+        next_flush = time.monotonic()  # None when nothing is left to retry
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                self._prepare_waiting()
+            except Exception as e:
+                print(f"Outbox prepare failed: {e}")
+            # Waking up to prepare does not cut a retry backoff short
+            if self._flush_due.is_set() or (next_flush is not None and time.monotonic() >= next_flush):
+                self._flush_due.clear()
+                try:
+                    delay = self.flush()
+                except Exception as e:
+                    # e.g. no network or credentials yet; everything stays pending
+                    print(f"Outbox flush failed: {e}")
+                    delay = 30
+                next_flush = None if delay is None else time.monotonic() + delay
+            self._wake.wait(None if next_flush is None else max(next_flush - time.monotonic(), 0))
+
+
+outbox = Outbox()
@@ -0,0 +1,46 @@
+"""
+Progress reporting for the headless commands (ingest, watch, ics import and export).
+"""
+import sys
+import time
+
+
+class Progress:
+    """
+    Counts work and prints a progress line to stderr at most once per interval.
+
+    Each name in counters becomes a counter attribute starting at 0, shown in order
+    ("3 prompts, 5 events, ..."); the rate is reported in the first one.
+    """
+
+    def __init__(self, *counters, interval=1.0):
+        self.counters = counters
+        self.interval = interval
+        self.started = time.monotonic()
+        self.last_report = 0.0
+        self.reasons = {}
+        for name in counters:
+            setattr(self, name, 0)
+
+    def skip(self, reason):
+        """Counts a skipped item (needs a "skipped" counter); the reasons are listed at the end"""
+        self.skipped += 1
+        self.reasons[reason] = self.reasons.get(reason, 0) + 1
+
+    def update(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_report < self.interval:
+            return
+        self.last_report = now
+        elapsed = max(now - self.started, 1e-9)
+        unit = self.counters[0]
+        counts = ", ".join(f"{getattr(self, name)} {name}" for name in self.counters)
+        print(
+            f"\r{counts}, {getattr(self, unit) / elapsed:.1f} {unit}/s",
+            end="\n" if force else "",
+            file=sys.stderr,
+            flush=True
+        )
+        if force:
+            for reason, count in sorted(self.reasons.items(), key=lambda item: -item[1]):
+                print(f"  skipped {count}: {reason}", file=sys.stderr)
@@ -0,0 +1,436 @@
+"""
+Local RRULE expansion and validation.
+
+Expands the recurrence rules Google Calendar stores on recurring events (FREQ, INTERVAL,
+COUNT, UNTIL, WKST and the BYMONTH, BYWEEKNO, BYYEARDAY, BYMONTHDAY, BYDAY and BYSETPOS
+parts) into concrete occurrences, so recurring events can be
+checked for conflicts without asking the API for every instance. normalize_rule() fixes
+the mistakes the model makes in the rules it writes (day names like "Mon", a missing
+"RRULE:" prefix, absurd COUNT/UNTIL values) and rejects what cannot be fixed, before
+anything reaches the network.
+"""
+import calendar
+import functools
+import itertools
+import re
+from datetime import date, datetime, time, timedelta, timezone
+
+RRULE_DAYS = ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]
+FREQUENCIES = ("DAILY", "WEEKLY", "MONTHLY", "YEARLY")
+
+# Stop expanding a rule that goes this long without an occurrence; a leap day recurs within eight years
+MAX_GAP_YEARS = 8
+
+BYDAY_RE = re.compile(r"^([+-]?\d{1,2})?(MO|TU|WE|TH|FR|SA|SU)$")
+
+# Longest series normalize_rule lets through; longer COUNT and UNTIL values are clamped
+MAX_COUNT = 1000
+MAX_YEARS = 20
+# Order of the parts in a normalized rule; anything else is rejected
+RULE_PARTS = ("FREQ", "INTERVAL", "COUNT", "UNTIL", "BYMONTH", "BYWEEKNO", "BYYEARDAY", "BYMONTHDAY",
+              "BYDAY", "BYSETPOS", "WKST")
+DAY_NAMES = {
+    "MONDAY": "MO", "MON": "MO", "MO": "MO", "TUESDAY": "TU", "TUES": "TU", "TUE": "TU", "TU": "TU",
+    "WEDNESDAY": "WE", "WED": "WE", "WE": "WE", "THURSDAY": "TH", "THURS": "TH", "THUR": "TH",
+    "THU": "TH", "TH": "TH", "FRIDAY": "FR", "FRI": "FR", "FR": "FR", "SATURDAY": "SA", "SAT": "SA",
+    "SA": "SA", "SUNDAY": "SU", "SUN": "SU", "SU": "SU",
+}
+DAY_NAME_RE = re.compile(r"^([+-]?\d{1,2})?\s*([A-Z]+)$")
+UNTIL_FORMATS = (("%Y%m%dT%H%M%SZ", True), ("%Y%m%dT%H%M%S", True), ("%Y%m%d", False),
+                 ("%Y-%m-%dT%H:%M:%SZ", True), ("%Y-%m-%dT%H:%M:%S", True), ("%Y-%m-%d", False))
+
+
+def parse_rule(rule):
+    """Splits 'RRULE:FREQ=WEEKLY;BYDAY=MO,WE' into {'FREQ': 'WEEKLY', 'BYDAY': 'MO,WE'}"""
+    rule = rule.strip()
+    if rule.upper().startswith("RRULE:"):
+        rule = rule[6:]
+    parts = {}
+    for part in rule.split(";"):
+        if not part:
+            continue
+        key, _, value = part.partition("=")
+        parts[key.strip().upper()] = value.strip().upper()
+    return parts
+
+
+def parse_until(value):
+    """Parses an UNTIL value (YYYYMMDD or YYYYMMDDTHHMMSSZ) into an aware UTC datetime"""
+    if "T" in value:
+        return datetime.strptime(value.rstrip("Z"), "%Y%m%dT%H%M%S").replace(tzinfo=timezone.utc)
+    # A date-only UNTIL includes the whole day
+    day = datetime.strptime(value, "%Y%m%d")
+    return datetime.combine(day.date(), time(23, 59, 59), tzinfo=timezone.utc)
+
+
+def _integers(key, value, low, high, allow_negative=False):
+    numbers = []
+    for item in filter(None, value.split(",")):
+        try:
+            number = int(item)
+        except ValueError:
+            raise ValueError(f"{key} must be a list of numbers, not {value!r}")
+        if not (low <= abs(number) <= high) or (number < 0 and not allow_negative):
+            raise ValueError(f"{key} value {number} is out of range")
+        numbers.append(str(number))
+    if not numbers:
+        raise ValueError(f"{key} is empty")
+    return ",".join(numbers)
+
+
+def _normalize_until(value):
+    """UNTIL in the form the API expects (UTC date-time, or a date for all-day rules)"""
+    for fmt, timed in UNTIL_FORMATS:
+        try:
+            until = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if not timed:
+            return until, until.strftime("%Y%m%d")
+        return until, until.strftime("%Y%m%dT%H%M%SZ")
+    raise ValueError(f"UNTIL {value!r} is not a date")
+
+
+@functools.lru_cache(maxsize=1024)
+def normalize_rule(rule, dtstart=None):
+    """
+    Validates a recurrence rule and returns it in canonical form.
+
+    Fixes what can be fixed: a missing "RRULE:" prefix, lower case, day names ("Mon",
+    "thursday"), ordinals in a weekly BYDAY, COUNT and UNTIL together (COUNT wins),
+    ISO-formatted or floating UNTIL values, and series longer than MAX_COUNT occurrences
+    or MAX_YEARS years, which are clamped.
+
+    Args:
+        rule: The rule as written, e.g. "FREQ=weekly;BYDAY=Mon,Wed"
+        dtstart: Optional naive start of the first occurrence, to check UNTIL against
+
+    Returns:
+        The normalized rule, e.g. "RRULE:FREQ=WEEKLY;BYDAY=MO,WE"
+
+    Raises:
+        ValueError: with a readable reason when the rule cannot be repaired
+    """
+    if not isinstance(rule, str) or not rule.strip():
+        raise ValueError("The recurrence rule is empty")
+    text = rule.strip().upper()
+    if text.startswith("RRULE:"):
+        text = text[6:]
+    elif text.startswith(("EXDATE", "RDATE", "EXRULE")):
+        raise ValueError(f"Expected an RRULE, got {rule!r}")
+
+    parts = {}
+    for part in filter(None, (piece.strip() for piece in text.split(";"))):
+        key, sep, value = part.partition("=")
+        key, value = key.strip(), value.strip()
+        if not sep or not value:
+            raise ValueError(f"Malformed recurrence part {part!r}")
+        if key not in RULE_PARTS:
+            raise ValueError(f"Unsupported recurrence part {key}")
+        parts[key] = value
+
+    freq = parts.get("FREQ")
+    if freq is None:
+        raise ValueError("The recurrence rule has no FREQ")
+    if freq not in FREQUENCIES:
+        raise ValueError(f"Unsupported frequency {freq}")
+
+    if "INTERVAL" in parts:
+        parts["INTERVAL"] = _integers("INTERVAL", parts["INTERVAL"], 1, 1000)
+        if parts["INTERVAL"] == "1":
+            del parts["INTERVAL"]
+    if "BYMONTH" in parts:
+        parts["BYMONTH"] = _integers("BYMONTH", parts["BYMONTH"], 1, 12)
+    if "BYMONTHDAY" in parts:
+        parts["BYMONTHDAY"] = _integers("BYMONTHDAY", parts["BYMONTHDAY"], 1, 31, allow_negative=True)
+    if "BYYEARDAY" in parts:
+        parts["BYYEARDAY"] = _integers("BYYEARDAY", parts["BYYEARDAY"], 1, 366, allow_negative=True)
+    if "BYWEEKNO" in parts:
+        parts["BYWEEKNO"] = _integers("BYWEEKNO", parts["BYWEEKNO"], 1, 53, allow_negative=True)
+    if "BYSETPOS" in parts:
+        parts["BYSETPOS"] = _integers("BYSETPOS", parts["BYSETPOS"], 1, 366, allow_negative=True)
+    # Parts RFC 5545 does not define for the frequency would be silently ignored by the API
+    if "BYWEEKNO" in parts and freq != "YEARLY":
+        raise ValueError("BYWEEKNO only applies to yearly rules")
+    if "BYYEARDAY" in parts and freq in ("WEEKLY", "MONTHLY"):
+        raise ValueError(f"BYYEARDAY does not apply to {freq.lower()} rules")
+    if "BYMONTHDAY" in parts and freq == "WEEKLY":
+        raise ValueError("BYMONTHDAY does not apply to weekly rules")
+    if not _possible(freq, parts):
+        raise ValueError("BYMONTH, BYMONTHDAY and BYYEARDAY never select the same day")
+    if "WKST" in parts:
+        if parts["WKST"] not in DAY_NAMES:
+            raise ValueError(f"WKST {parts['WKST']!r} is not a day")
+        parts["WKST"] = DAY_NAMES[parts["WKST"]]
+
+    if "BYDAY" in parts:
+        days = []
+        for item in filter(None, (piece.strip() for piece in parts["BYDAY"].split(","))):
+            match = DAY_NAME_RE.match(item)
+            if not match or match.group(2) not in DAY_NAMES:
+                raise ValueError(f"BYDAY value {item!r} is not a day")
+            ordinal = match.group(1)
+            if ordinal and (freq not in ("MONTHLY", "YEARLY") or not 1 <= abs(int(ordinal)) <= 53):
+                # "2MO" only means something in a monthly or yearly rule
+                ordinal = None
+            day = (str(int(ordinal)) if ordinal else "") + DAY_NAMES[match.group(2)]
+            if day not in days:
+                days.append(day)
+        if not days:
+            raise ValueError("BYDAY is empty")
+        parts["BYDAY"] = ",".join(days)
+
+    if "COUNT" in parts:
+        try:
+            count = int(parts["COUNT"])
+        except ValueError:
+            raise ValueError(f"COUNT must be a number, not {parts['COUNT']!r}")
+        if count < 1:
+            raise ValueError("COUNT must be at least 1")
+        parts["COUNT"] = str(min(count, MAX_COUNT))
+        parts.pop("UNTIL", None)
+    elif "UNTIL" in parts:
+        until, parts["UNTIL"] = _normalize_until(parts["UNTIL"])
+        if dtstart is not None:
+            if until < dtstart.replace(hour=0, minute=0, second=0, microsecond=0):
+                raise ValueError("UNTIL is before the first occurrence")
+            try:
+                latest = dtstart.replace(year=dtstart.year + MAX_YEARS)
+            except ValueError:
+                latest = dtstart + timedelta(days=365 * MAX_YEARS)
+            if until > latest:
+                parts["UNTIL"] = latest.strftime("%Y%m%dT%H%M%SZ" if "T" in parts["UNTIL"] else "%Y%m%d")
+
+    return "RRULE:" + ";".join(f"{key}={parts[key]}" for key in RULE_PARTS if key in parts)
+
+
+def _possible(freq, parts):
+    """Whether any day of a leap or a common year passes the rule's BYMONTH, BYMONTHDAY and BYYEARDAY"""
+    filters = {"bymonth": _numbers(parts, "BYMONTH"), "byyearday": _numbers(parts, "BYYEARDAY"),
+               "bymonthday": _numbers(parts, "BYMONTHDAY"), "byday": [], "byweekno": []}
+    if not (filters["byyearday"] or filters["bymonthday"]):
+        return True
+    return any(_selected(date(year, 1, 1) + timedelta(days=offset), freq, filters)
+               for year in (2023, 2024) for offset in range(366 if calendar.isleap(year) else 365))
+
+
+def preview(dtstart, rule, count=5):
+    """The first count occurrence starts of a rule (which must be valid), for showing before creating"""
+    found = []
+    for start in occurrences(dtstart, rule):
+        found.append(start)
+        if len(found) >= count:
+            break
+    return found
+
+
+def _byday(parts):
+    """[(ordinal or None, weekday index)] from a BYDAY value"""
+    days = []
+    for item in filter(None, parts.get("BYDAY", "").split(",")):
+        match = BYDAY_RE.match(item)
+        if match:
+            ordinal = int(match.group(1)) if match.group(1) else None
+            days.append((ordinal, RRULE_DAYS.index(match.group(2))))
+    return days
+
+
+def _numbers(parts, key):
+    return [int(value) for value in filter(None, parts.get(key, "").split(","))]
+
+
+def _add_months(dt, months):
+    month_index = dt.month - 1 + months
+    return dt.year + month_index // 12, month_index % 12 + 1
+
+
+def _week_one(year, wkst):
+    """First day of week 1 of a year: the first week (starting on wkst) with four or more days in the year"""
+    jan1 = date(year, 1, 1)
+    start = jan1 - timedelta(days=(jan1.weekday() - wkst) % 7)
+    return start if (jan1 - start).days < 4 else start + timedelta(weeks=1)
+
+
+def _matches(value, position, length):
+    """Whether a BY* value (negative values count from the end) selects position of 1..length"""
+    return position == (value if value > 0 else length + 1 + value)
+
+
+def _period_days(dtstart, freq, step, filters):
+    """Every day of the step-th period after dtstart's period that the BY* parts could select"""
+    first = dtstart.date()
+    if freq == "DAILY":
+        return [first + timedelta(days=step)]
+    if freq == "WEEKLY":
+        week_start = first - timedelta(days=(first.weekday() - filters["wkst"]) % 7) + timedelta(weeks=step)
+        return [week_start + timedelta(days=offset) for offset in range(7)]
+    if freq == "MONTHLY":
+        year, month = _add_months(dtstart, step)
+        return [date(year, month, day) for day in range(1, calendar.monthrange(year, month)[1] + 1)]
+    # YEARLY
+    year = dtstart.year + step
+    if filters["byweekno"]:
+        week_one = _week_one(year, filters["wkst"])
+        weeks = (_week_one(year + 1, filters["wkst"]) - week_one).days // 7
+        days = set()
+        for week in filters["byweekno"]:
+            week = week if week > 0 else weeks + 1 + week
+            if 1 <= week <= weeks:
+                days.update(week_one + timedelta(weeks=week - 1, days=offset) for offset in range(7))
+        return sorted(days)
+    return [date(year, month, day)
+            for month in filters["bymonth"] or range(1, 13)
+            for day in range(1, calendar.monthrange(year, month)[1] + 1)]
+
+
+def _selected(day, freq, filters):
+    """Whether a day of a period passes every BY* part of the rule"""
+    if filters["bymonth"] and day.month not in filters["bymonth"]:
+        return False
+    if filters["byyearday"]:
+        year_length = 366 if calendar.isleap(day.year) else 365
+        yearday = day.timetuple().tm_yday
+        if not any(_matches(value, yearday, year_length) for value in filters["byyearday"]):
+            return False
+    month_length = calendar.monthrange(day.year, day.month)[1]
+    if filters["bymonthday"] and not any(_matches(value, day.day, month_length) for value in filters["bymonthday"]):
+        return False
+    if filters["byday"]:
+        # "2SU" counts within the month for monthly rules and yearly rules with BYMONTH, otherwise within the year
+        if freq == "MONTHLY" or (freq == "YEARLY" and filters["bymonth"]):
+            position, length = day.day, month_length
+        else:
+            position, length = day.timetuple().tm_yday, 366 if calendar.isleap(day.year) else 365
+        for ordinal, weekday in filters["byday"]:
+            if day.weekday() != weekday:
+                continue
+            if ordinal is None or freq in ("DAILY", "WEEKLY") or filters["byweekno"]:
+                return True
+            nth = (position - 1) // 7 + 1 if ordinal > 0 else -((length - position) // 7 + 1)
+            if nth == ordinal:
+                return True
+        return False
+    return True
+
+
+def _filters(parts, dtstart):
+    """The BY* parts of a rule as numbers, with the defaults RFC 5545 takes from dtstart"""
+    filters = {
+        "bymonth": _numbers(parts, "BYMONTH"),
+        "byweekno": _numbers(parts, "BYWEEKNO"),
+        "byyearday": _numbers(parts, "BYYEARDAY"),
+        "bymonthday": _numbers(parts, "BYMONTHDAY"),
+        "byday": _byday(parts),
+        "bysetpos": _numbers(parts, "BYSETPOS"),
+        "wkst": RRULE_DAYS.index(parts["WKST"]) if parts.get("WKST") in RRULE_DAYS else 0,
+    }
+    freq = parts["FREQ"]
+    if not (filters["byweekno"] or filters["byyearday"] or filters["bymonthday"] or filters["byday"]):
+        # Without a day part the rule repeats on dtstart's day
+        if freq == "YEARLY":
+            filters["bymonth"] = filters["bymonth"] or [dtstart.month]
+            filters["bymonthday"] = [dtstart.day]
+        elif freq == "MONTHLY":
+            filters["bymonthday"] = [dtstart.day]
+        elif freq == "WEEKLY":
+            filters["byday"] = [(None, dtstart.weekday())]
+    return filters
+
+
+def _period_start(dtstart, freq, step):
+    """First day of the step-th period after dtstart's period"""
+    first = dtstart.date()
+    if freq == "DAILY":
+        return first + timedelta(days=step)
+    if freq == "WEEKLY":
+        return first + timedelta(weeks=step)
+    if freq == "MONTHLY":
+        return date(*_add_months(dtstart, step), 1)
+    return date(dtstart.year + step, 1, 1)
+
+
+def _period_candidates(dtstart, freq, step, filters):
+    """Occurrence candidates in the step-th period after dtstart's period"""
+    days = [day for day in _period_days(dtstart, freq, step, filters) if _selected(day, freq, filters)]
+    if filters["bysetpos"]:
+        days = [day for position, day in enumerate(days, 1)
+                if any(_matches(value, position, len(days)) for value in filters["bysetpos"])]
+    return [dtstart.replace(year=day.year, month=day.month, day=day.day) for day in days]
+
+
+def occurrences(dtstart, rule):
+    """
+    Yields the start of every occurrence of an RRULE, in order, beginning with dtstart.
+
+    Args:
+        dtstart: Start of the first occurrence (aware datetimes compare with UNTIL in UTC)
+        rule: RRULE string, with or without the 'RRULE:' prefix
+
+    Unbounded rules yield forever; callers stop once they pass their window. A rule that
+    goes MAX_GAP_YEARS without an occurrence is taken to have ended.
+    """
+    parts = parse_rule(rule)
+    freq = parts.get("FREQ")
+    if freq not in FREQUENCIES:
+        raise ValueError(f"Unsupported or missing FREQ in recurrence rule: {rule}")
+    interval = max(int(parts.get("INTERVAL", "1")), 1)
+    count = int(parts["COUNT"]) if "COUNT" in parts else None
+    until = parse_until(parts["UNTIL"]) if "UNTIL" in parts else None
+    if until is not None and dtstart.tzinfo is None:
+        until = until.replace(tzinfo=None)
+    filters = _filters(parts, dtstart)
+
+    produced = 0
+    last = dtstart.date()
+    for period in itertools.count():
+        try:
+            if (_period_start(dtstart, freq, period * interval) - last).days > 366 * MAX_GAP_YEARS:
+                return
+            candidates = _period_candidates(dtstart, freq, period * interval, filters)
+        except (ValueError, OverflowError):
+            return  # Past year 9999 without reaching COUNT
+        for candidate in candidates:
+            if candidate < dtstart:
+                continue
+            if until is not None and candidate > until:
+                return
+            yield candidate
+            last = candidate.date()
+            produced += 1
+            if count is not None and produced >= count:
+                return
+
+
+def expand(dtstart, rules, window_start, window_end, exdates=()):
+    """
+    Occurrence starts of the given rules that fall inside [window_start, window_end).
+
+    Args:
+        dtstart: Start of the first occurrence
+        rules: Iterable of recurrence lines; EXDATE lines exclude occurrences, RDATE is ignored
+        window_start, window_end: The window to expand over
+        exdates: Occurrence starts to leave out
+
+    Returns:
+        A sorted list of datetimes
+    """
+    excluded = set(exdates)
+    excluded_stamps = set()
+    for rule in rules:
+        if rule.upper().startswith("EXDATE"):
+            # EXDATE;TZID=...:20261020T100000,20261027T100000 or EXDATE;VALUE=DATE:20261020
+            excluded_stamps.update(value.rstrip("Z") for value in rule.partition(":")[2].split(","))
+
+    found = set()
+    for rule in rules:
+        if not rule.upper().startswith("RRULE:"):
+            continue
+        for start in occurrences(dtstart, rule):
+            if start >= window_end:
+                break
+            if start < window_start or start in excluded:
+                continue
+            if start.strftime("%Y%m%dT%H%M%S") in excluded_stamps or start.strftime("%Y%m%d") in excluded_stamps:
+                continue
+            found.add(start)
+    return sorted(found)
@@ -0,0 +1,212 @@
+"""
+Date-normalized cache of parsed events for run_conversation.
+
+Prompts are keyed without the "Today's date is ..." prefix, and dates in the cached
+events are stored as day offsets from the day they were parsed. On a hit the offsets are
+resolved against today, so "weekly sync tomorrow 10am" hits on any day. Prompts whose
+dates depend on the weekday ("friday", "next week", "this weekend") are keyed by it, and
+prompts that depend on the day of the month ("the 15th", "next month") are not cached.
+Entries live in an in-memory LRU backed by a size-limited SQLite file.
+"""
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from fast_parser import DAY_MONTH_RE, MONTH_DAY_RE, MONTHS, WEEKDAYS
+
+TODAY_PREFIX_RE = re.compile(r"^\s*today'?s date is \d{4}-\d{2}-\d{2}\.?\s*", re.IGNORECASE)
+# Explicit calendar dates pin events to an absolute day rather than one relative to today
+ABSOLUTE_DATE_RE = re.compile(r"\b\d{4}-\d{1,2}-\d{1,2}\b|\b\d{1,2}/\d{1,2}(?:/\d{2,4})?\b")
+MONTH_NAME_RE = re.compile(r"\b(?:" + "|".join(sorted(MONTHS, key=len, reverse=True)) + r")\b")
+# Dates (and weekly BYDAY rules) that differ depending on the weekday today
+WEEKDAY_NAME_RE = re.compile(
+    r"\b(?:" + "|".join(sorted(WEEKDAYS, key=len, reverse=True)) + r")s?\b|\bweek(?:end|day|ly)?s?\b"
+)
+# Dates that depend on the day of the month ("the 15th", "next month", "end of month")
+MONTH_DAY_DEPENDENT_RE = re.compile(r"\b\d{1,2}(?:st|nd|rd|th)\b|\bmonth(?:s|ly)?\b|\beom\b|\byear(?:s|ly)?\b|\bquarter(?:s|ly)?\b")
+UNTIL_RE = re.compile(r"UNTIL=(\d{8})")
+
+
+def canonicalize(content):
+    """
+    Returns (key, relative) for a prompt: the normalized text and whether dates are relative.
+
+    key is None for prompts that cannot be cached: dates tied to the day of the month,
+    and month names that are not part of a date ("may" is usually the verb).
+    """
+    text = TODAY_PREFIX_RE.sub("", content)
+    text = re.sub(r"\s+", " ", text.strip().lower()).rstrip(".!")
+    absolute = bool(ABSOLUTE_DATE_RE.search(text) or MONTH_DAY_RE.search(text) or DAY_MONTH_RE.search(text))
+    if absolute:
+        return text, False
+    if MONTH_DAY_DEPENDENT_RE.search(text) or MONTH_NAME_RE.search(text):
+        return None, True
+    if WEEKDAY_NAME_RE.search(text):
+        # "friday" and "next week" are a different offset depending on what day it is today
+        text += f" @weekday={datetime.now().weekday()}"
+    return text, True
+
+
+def _shift_events(events, days, to_offset):
+    """Converts event dates to offsets from today (to_offset=True) or back to absolute dates"""
+    today = datetime.now().date()
+    shifted = []
+    for event in events:
+        event = dict(event)
+        if to_offset:
+            event_date = datetime.strptime(event["date"], "%Y-%m-%d").date()
+            event["date"] = (event_date - today).days
+        else:
+            event["date"] = (today + timedelta(days=event["date"])).strftime("%Y-%m-%d")
+        recurrence = event.get("recurrence")
+        if recurrence:
+            event["recurrence"] = UNTIL_RE.sub(
+                lambda m: "UNTIL=" + (datetime.strptime(m.group(1), "%Y%m%d") + timedelta(days=days)).strftime("%Y%m%d"),
+                recurrence
+            )
+        shifted.append(event)
+    return shifted
+
+
+class ResponseCache:
+    """In-memory LRU of parsed events backed by an on-disk SQLite store"""
+
+    def __init__(self, path="response_cache.db", memory_size=256, disk_size=5000):
+        self.path = path
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _connect(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, relative INTEGER, events TEXT, cached_on TEXT, last_used REAL)"
+            )
+        return self._db
+
+    def get(self, content):
+        """Returns cached events for the prompt with dates resolved against today, or None"""
+        key, _ = canonicalize(content)
+        with self._lock:
+            if key is None:
+                self.misses += 1
+                return None
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+            else:
+                entry = self._load(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            relative, events = entry
+            if relative:
+                events = _shift_events(events, self._days_since(events), to_offset=False)
+            elif any(event["date"] < datetime.now().strftime("%Y-%m-%d") for event in events):
+                # An absolute date that is now in the past is no longer a useful answer
+                self.misses += 1
+                return None
+            self.hits += 1
+            return [{k: v for k, v in event.items() if not k.startswith("_")} for event in events]
+
+    def put(self, content, events):
+        """Stores the parsed events for a prompt"""
+        key, relative = canonicalize(content)
+        if key is None:
+            return
+        try:
+            stored = _shift_events(events, 0, to_offset=True) if relative else [dict(e) for e in events]
+        except (KeyError, ValueError):
+            return  # Events without a parseable date are not worth caching
+        if relative:
+            # Remember the parse day so relative UNTIL dates can be shifted on a hit
+            for event in stored:
+                event["_cached_on"] = datetime.now().strftime("%Y-%m-%d")
+        with self._lock:
+            self._remember(key, (relative, stored))
+            try:
+                db = self._connect()
+                db.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                    (key, int(relative), json.dumps(stored), datetime.now().strftime("%Y-%m-%d"), time.time())
+                )
+                # Evict the least recently used rows beyond the size limit
+                db.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM responses "
+                    "ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.disk_size,)
+                )
+                db.commit()
+            except sqlite3.Error as e:
+                print(f"Response cache write error: {e}")
+
+    def stats(self):
+        """Returns hit/miss counters for the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory)
+            }
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _load(self, key):
+        try:
+            db = self._connect()
+            row = db.execute("SELECT relative, events FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            db.commit()
+        except sqlite3.Error as e:
+            print(f"Response cache read error: {e}")
+            return None
+        entry = (bool(row[0]), json.loads(row[1]))
+        self._remember(key, entry)
+        self.disk_hits += 1
+        return entry
+
+    @staticmethod
+    def _days_since(events):
+        cached_on = events[0].get("_cached_on") if events else None
+        if not cached_on:
+            return 0
+        return (datetime.now().date() - datetime.strptime(cached_on, "%Y-%m-%d").date()).days
+
+
+cache = ResponseCache()
+
+
+def get(content):
+    """Looks up a prompt in the shared cache"""
+    return cache.get(content)
+
+
+def put(content, events):
+    """Stores a prompt's parsed events in the shared cache"""
+    cache.put(content, events)
+
+
+def stats():
+    """Returns hit/miss counters for the shared cache"""
+    return cache.stats()
@@ -0,0 +1,357 @@
+"""
+Shared rate limiting and retry scheduling for outbound API calls.
+
+Every call to OpenAI or Google Calendar goes through call(backend, fn, ...), or acall() from
+asyncio code. Each backend has an adaptive token bucket (the rate backs off on 429s and
+creeps back up on success), a cap on concurrent calls, exponential backoff with jitter that
+honors Retry-After, and a circuit breaker that fails fast while the backend is down.
+"""
+import asyncio
+import contextlib
+import random
+import socket
+import threading
+import time
+
+# Calendar quota errors come back as 403s with one of these reasons
+QUOTA_REASONS = ("rateLimitExceeded", "userRateLimitExceeded", "quotaExceeded")
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the backend while its circuit breaker is open"""
+
+
+class TokenBucket:
+    """Token bucket whose refill rate adapts to throttling (AIMD)"""
+
+    def __init__(self, rate, burst, min_rate=0.5):
+        self.max_rate = rate
+        self.min_rate = min_rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, cost=1):
+        """Takes cost tokens if available and returns 0, else returns the seconds to wait
+
+        A cost above the burst size would never fit, so it goes through once the bucket is
+        full and leaves it in debt: later calls wait until the whole cost has been refilled.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            needed = min(cost, self.burst)
+            if self.tokens >= needed:
+                self.tokens -= cost
+                return 0
+            return (needed - self.tokens) / self.rate
+
+    def acquire(self, cost=1):
+        """Blocks until cost tokens are available"""
+        while True:
+            delay = self.try_acquire(cost)
+            if not delay:
+                return
+            time.sleep(delay)
+
+    def throttled(self):
+        """Halves the rate after the backend reports throttling"""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def succeeded(self):
+        """Slowly raises the rate back towards its configured maximum"""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+
+class CircuitBreaker:
+    """Opens after repeated failures and lets a single trial call through after a cooldown"""
+
+    def __init__(self, failure_threshold=5, cooldown=30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.cooldown or self._trial_running:
+                raise CircuitOpenError("Service temporarily unavailable, please try again shortly.")
+            # Half-open: allow one trial call
+            self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    def record_throttled(self):
+        """The backend answered but asked us to slow down; the token bucket deals with the rate"""
+        with self._lock:
+            if self._trial_running:
+                # The trial call reached a live backend, so the breaker closes
+                self.failures = 0
+                self.opened_at = None
+                self._trial_running = False
+
+
+class Backend:
+    """Rate limit, concurrency cap, retry policy and circuit breaker for one API"""
+
+    def __init__(self, name, rate, burst, max_concurrency, max_retries=5,
+                 base_delay=0.5, max_delay=30.0, failure_threshold=5, cooldown=30.0):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.max_concurrency = max_concurrency
+        self.concurrency = threading.BoundedSemaphore(max_concurrency)
+        self._async_concurrency = None
+        self.breaker = CircuitBreaker(failure_threshold, cooldown)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def async_concurrency(self):
+        """asyncio counterpart of self.concurrency, created inside the running event loop"""
+        if self._async_concurrency is None:
+            self._async_concurrency = asyncio.Semaphore(self.max_concurrency)
+        return self._async_concurrency
+
+    def backoff(self, attempt, retry_after=None):
+        """Delay before the next attempt: Retry-After if given, else full-jitter exponential"""
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+backends = {
+    # gpt-4o-mini tier limits are per minute; these keep a steady flow just under them
+    "openai": Backend("openai", rate=8.0, burst=16, max_concurrency=8),
+    # Calendar allows roughly 10 queries per second per user
+    "calendar": Backend("calendar", rate=10.0, burst=10, max_concurrency=4),
+}
+
+
+def status_of(error):
+    """HTTP status of an OpenAI or googleapiclient error, or None"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "resp", None), "status", None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after_of(error):
+    """Seconds from a Retry-After header on the error's response, or None"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if headers is None:
+        headers = getattr(error, "resp", None)  # httplib2 responses are dicts of headers
+    try:
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        return max(0.0, float(value)) if value is not None else None
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def is_throttled(error):
+    """True for 429s and Calendar quota 403s"""
+    status = status_of(error)
+    if status == 429:
+        return True
+    if status == 403:
+        content = getattr(error, "content", b"") or b""
+        if isinstance(content, bytes):
+            content = content.decode("utf-8", "replace")
+        return any(reason in str(content) for reason in QUOTA_REASONS)
+    return False
+
+
+def is_retryable(error):
+    """True for throttling, server errors and transient connection failures"""
+    if is_throttled(error):
+        return True
+    status = status_of(error)
+    if status is not None:
+        return status >= 500
+    # Connection resets, timeouts, DNS failures and the clients' connection errors carry no
+    # status. Other OSErrors (a missing credentials.json, a permission error) are not transient.
+    return isinstance(error, (ConnectionError, TimeoutError, socket.gaierror)) or \
+        type(error).__name__ in ("APIConnectionError", "APITimeoutError", "ServerNotFoundError")
+
+
+def _settings_of(backend):
+    return {
+        "rate": backend.bucket.max_rate,
+        "burst": backend.bucket.burst,
+        "max_concurrency": backend.max_concurrency,
+        "max_retries": backend.max_retries,
+        "base_delay": backend.base_delay,
+        "max_delay": backend.max_delay,
+        "failure_threshold": backend.breaker.failure_threshold,
+        "cooldown": backend.breaker.cooldown,
+    }
+
+
+def configure(backend, **settings):
+    """Replaces a backend's limits, e.g. configure("openai", max_concurrency=64)"""
+    options = _settings_of(backends[backend])
+    options.update(settings)
+    backends[backend] = Backend(backend, **options)
+
+
+def clone(backend, name):
+    """A new Backend with the limits of backends[backend] but its own bucket and breaker state"""
+    return Backend(name, **_settings_of(backends[backend]))
+
+
+def get_backend(backend):
+    """The Backend for a name in backends, or backend itself when it is a Backend"""
+    return backends[backend] if isinstance(backend, str) else backend
+
+
+def _record_failure(policy, error):
+    """Feeds a failed attempt to the bucket and breaker"""
+    if not is_retryable(error):
+        # The backend answered; a bad request says nothing about its health
+        policy.breaker.record_success()
+    elif is_throttled(error):
+        policy.bucket.throttled()
+        policy.breaker.record_throttled()
+    else:
+        policy.breaker.record_failure()
+
+
+def _retry_delay(policy, error, attempt):
+    """Records a failed attempt and returns how long to wait before the next, or raises error"""
+    _record_failure(policy, error)
+    if not is_retryable(error) or attempt >= policy.max_retries:
+        raise error
+    return policy.backoff(attempt, retry_after_of(error))
+
+
+def call(backend, fn, *args, cost=1, **kwargs):
+    """
+    Call fn(*args, **kwargs) under the named backend's rate limit and retry policy.
+
+    Args:
+        backend: "openai" or "calendar", or a Backend of its own (e.g. one per user)
+        fn: The outbound call to make
+        cost: Number of quota units the call uses (e.g. the size of a batch request)
+
+    Returns:
+        Whatever fn returns. Non-retryable errors are raised immediately, retryable ones
+        after the retries run out; CircuitOpenError is raised while the backend is down.
+    """
+    policy = get_backend(backend)
+    attempt = 0
+    while True:
+        policy.breaker.before_call()
+        policy.bucket.acquire(cost)
+        with policy.concurrency:
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                error = e
+            else:
+                policy.bucket.succeeded()
+                policy.breaker.record_success()
+                return result
+
+        time.sleep(_retry_delay(policy, error, attempt))
+        attempt += 1
+
+
+def call_once(backend, fn, *args, cost=1, **kwargs):
+    """
+    One attempt of call(): rate limit, concurrency cap and breaker bookkeeping, but no retries.
+
+    For callers that retry themselves, such as create_events, which resends only the
+    inserts of a batch that failed; retrying here as well would multiply the attempts.
+    """
+    policy = get_backend(backend)
+    policy.breaker.before_call()
+    policy.bucket.acquire(cost)
+    with policy.concurrency:
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            _record_failure(policy, e)
+            raise
+    policy.bucket.succeeded()
+    policy.breaker.record_success()
+    return result
+
+
+@contextlib.contextmanager
+def stream(backend, fn, *args, cost=1, **kwargs):
+    """
+    call() for requests that return a stream: yields the stream and keeps the concurrency
+    slot until the with block has read it (the response is still arriving until then).
+
+    Opening the stream is retried like call(); errors while reading it are not.
+    """
+    policy = get_backend(backend)
+    attempt = 0
+    while True:
+        policy.breaker.before_call()
+        policy.bucket.acquire(cost)
+        policy.concurrency.acquire()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            policy.concurrency.release()
+            error = e
+        else:
+            break
+        time.sleep(_retry_delay(policy, error, attempt))
+        attempt += 1
+    policy.bucket.succeeded()
+    policy.breaker.record_success()
+    try:
+        yield result
+    finally:
+        close = getattr(result, "close", None)
+        if close is not None:
+            close()  # Frees the connection when the reader stops early
+        policy.concurrency.release()
+
+
+async def acall(backend, fn, *args, cost=1, **kwargs):
+    """Async counterpart of call() for coroutine functions such as AsyncOpenAI methods"""
+    policy = get_backend(backend)
+    attempt = 0
+    while True:
+        policy.breaker.before_call()
+        delay = policy.bucket.try_acquire(cost)
+        while delay:
+            await asyncio.sleep(delay)
+            delay = policy.bucket.try_acquire(cost)
+        async with policy.async_concurrency():
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                error = e
+            else:
+                policy.bucket.succeeded()
+                policy.breaker.record_success()
+                return result
+
+        await asyncio.sleep(_retry_delay(policy, error, attempt))
+        attempt += 1
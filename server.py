@@ -0,0 +1,355 @@
+"""
+Asyncio HTTP service mode: serve many users from one process.
+
+Usage: python main.py serve [--host 127.0.0.1] [--port 8080] [--tokens-dir tokens]
+       python main.py serve --issue-key USER [--tokens-dir tokens]
+
+Endpoints (JSON in, JSON out; all but /health need "Authorization: Bearer <key>"):
+    POST /parse    {"prompt": ...}     -> {"session", "events", "message"}
+    POST /confirm  {"session": ...}    -> {"results": [...]}
+    POST /create   {"events": [...]}   -> {"results": [...]}
+    GET  /health                       -> {"status": "ok", ...}
+    GET  /metrics                      -> stage latency histograms and counters
+
+The user is the one the bearer key was issued to; --issue-key prints a new key and stores
+only its SHA-256 in <tokens-dir>/api_keys.json. Each user's OAuth token lives in
+<tokens-dir>/<user>.pickle, created beforehand with the desktop app. Parsing awaits the shared AsyncOpenAI client, whose connection pool is reused
+across requests. Calendar calls are blocking, so they run on a thread pool with one cached,
+authorized service per user. Each user also has their own Calendar rate limit and circuit
+breaker, so one user's throttling or outage never slows anyone else down.
+"""
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+import re
+import secrets
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import ai_model
+import metrics
+import scheduler
+from calendar_service import CalendarServiceManager, create_events
+from outbox import event_id_for
+
+USER_RE = re.compile(r"^[A-Za-z0-9_.@-]{1,128}$")
+MAX_BODY = 1024 * 1024
+SESSION_TTL = 15 * 60
+API_KEYS_FILE = "api_keys.json"
+REASONS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+           405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error",
+           503: "Service Unavailable"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _digest(key):
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class ApiKeys:
+    """The SHA-256 of each issued bearer key and the user it belongs to, reloaded when the file changes"""
+
+    def __init__(self, tokens_dir):
+        self.path = os.path.join(tokens_dir, API_KEYS_FILE)
+        self._users = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            self._users, self._mtime = {}, None
+            return
+        if mtime != self._mtime:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._users = json.load(f)
+            self._mtime = mtime
+
+    def user_for(self, authorization):
+        """The user an "Authorization: Bearer <key>" header belongs to; HTTPError(401) otherwise"""
+        scheme, _, key = (authorization or "").partition(" ")
+        if scheme.lower() != "bearer" or not key.strip():
+            raise HTTPError(401, "Missing bearer key")
+        with self._lock:
+            self._load()
+            user = self._users.get(_digest(key.strip()))
+        if user is None or not USER_RE.match(user):
+            raise HTTPError(401, "Unknown bearer key")
+        return user
+
+    def issue(self, user):
+        """Creates a new key for user and returns it; only its hash is written to disk"""
+        if not USER_RE.match(user):
+            raise ValueError(f"{user!r} is not a simple user name")
+        key = secrets.token_urlsafe(32)
+        with self._lock:
+            self._load()
+            users = dict(self._users, **{_digest(key): user})
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            temporary = self.path + ".tmp"
+            with open(os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w", encoding="utf-8") as f:
+                json.dump(users, f, indent=1)
+            os.replace(temporary, self.path)
+            self._mtime = None
+        return key
+
+
+class UserCalendars:
+    """LRU cache of per-user Calendar service managers, each with its own authorized transport"""
+
+    def __init__(self, tokens_dir, max_users=1000):
+        self.tokens_dir = tokens_dir
+        self.max_users = max_users
+        self._managers = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user):
+        """(manager, lock, backend) for a user
+
+        The lock serializes use of that user's transport; backend is their own Calendar
+        rate limit, retry policy and circuit breaker.
+        """
+        token_path = os.path.join(self.tokens_dir, f"{user}.pickle")
+        with self._lock:
+            entry = self._managers.get(user)
+            if entry is not None:
+                self._managers.move_to_end(user)
+                return entry
+            if not os.path.exists(token_path):
+                raise HTTPError(401, f"No Calendar credentials on file for user {user!r}")
+            entry = (
+                # No refresh timer per cached user: get_service refreshes expired credentials on use
+                CalendarServiceManager(token_path=token_path, background_refresh=False),
+                threading.Lock(),
+                scheduler.clone("calendar", f"calendar:{user}"),
+            )
+            self._managers[user] = entry
+            while len(self._managers) > self.max_users:
+                _, (evicted, _, _) = self._managers.popitem(last=False)
+                evicted.close()
+            return entry
+
+    def create(self, user, events, event_ids):
+        """Creates events in a user's calendar (blocking; run it on the executor)"""
+        manager, lock, backend = self.get(user)
+        with lock:
+            try:
+                service = manager.get_service(interactive=False)
+            except RuntimeError as e:
+                # No usable token (get_service never opens a browser here)
+                raise HTTPError(401, f"Calendar sign-in required for user {user!r}: {e}")
+            except Exception as e:
+                if type(e).__name__ != "RefreshError":
+                    raise
+                raise HTTPError(401, f"Calendar credentials for user {user!r} were revoked or expired: {e}")
+            return create_events(events, service=service, event_ids=event_ids, backend=backend)
+
+
+class EventElfServer:
+    """Routes HTTP requests to the parse, confirm and create handlers"""
+
+    def __init__(self, tokens_dir="tokens", calendar_workers=32):
+        self.calendars = UserCalendars(tokens_dir)
+        self.api_keys = ApiKeys(tokens_dir)
+        self.executor = ThreadPoolExecutor(max_workers=calendar_workers, thread_name_prefix="eventelf-calendar")
+        self.sessions = {}
+        self.started = time.time()
+        self.requests = 0
+        self.routes = {
+            ("POST", "/parse"): self.parse,
+            ("POST", "/confirm"): self.confirm,
+            ("POST", "/create"): self.create,
+            ("GET", "/health"): self.health,
+            ("GET", "/metrics"): self.report_metrics,
+        }
+        self.public_routes = {("GET", "/health")}
+
+    async def parse(self, body, user):
+        prompt = body.get("prompt")
+        if not isinstance(prompt, str) or not prompt.strip():
+            raise HTTPError(400, "'prompt' must be a non-empty string")
+        with metrics.request(), metrics.timer("server_parse"):
+            events, message = await ai_model.run_conversation_async(prompt)
+        session = None
+        if events:
+            self._expire_sessions()
+            session = uuid.uuid4().hex
+            self.sessions[session] = (user, events, time.time() + SESSION_TTL)
+        return {"session": session, "events": events or [], "message": message}
+
+    async def confirm(self, body, user):
+        if not isinstance(body.get("session"), str):
+            raise HTTPError(400, "'session' must be a string")
+        entry = self.sessions.get(body["session"])
+        if entry is None or entry[0] != user or entry[2] < time.time():
+            raise HTTPError(404, "Unknown or expired session")
+        _, events, _ = entry
+        # Ids derived from the session make a repeated confirm a no-op instead of a duplicate
+        ids = [event_id_for(body["session"], i, event) for i, event in enumerate(events)]
+        results = await self._create(user, events, ids)
+        if all(result["error"] is None for result in results):
+            self.sessions.pop(body["session"], None)
+        return {"results": results}
+
+    async def create(self, body, user):
+        events = body.get("events")
+        if not isinstance(events, list) or not all(isinstance(event, dict) for event in events):
+            raise HTTPError(400, "'events' must be a list of event objects")
+        return {"results": await self._create(user, events, None)}
+
+    async def health(self, body, user):
+        return {
+            "status": "ok",
+            "uptime": round(time.time() - self.started),
+            "requests": self.requests,
+            "sessions": len(self.sessions),
+            "parse_paths": ai_model.get_parse_path_stats(),
+        }
+
+    async def report_metrics(self, body, user):
+        return metrics.snapshot()
+
+    async def _create(self, user, events, ids):
+        loop = asyncio.get_running_loop()
+        with metrics.request(), metrics.timer("server_create"):
+            # run_in_executor does not carry contextvars over; the copy keeps the request id on Calendar spans
+            results = await loop.run_in_executor(
+                self.executor, contextvars.copy_context().run, self.calendars.create, user, events, ids
+            )
+        return [
+            {
+                "event": result["event"],
+                "id": result["created"]["id"] if result["created"] else None,
+                # A 409 on a session-derived id means the event already exists
+                "error": None if result["error"] is None or (ids and scheduler.status_of(result["error"]) == 409)
+                else str(result["error"]),
+            }
+            for result in results
+        ]
+
+    def _expire_sessions(self):
+        now = time.time()
+        for session in [s for s, (_, _, expires) in self.sessions.items() if expires < now]:
+            del self.sessions[session]
+
+    async def handle_connection(self, reader, writer):
+        """Serves HTTP/1.1 requests on one connection, keeping it open between requests"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "Malformed request line"}, close=True)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get("connection", "").lower() != "close"
+
+                status, payload, unread = await self._dispatch(method, path.split("?", 1)[0], headers, reader)
+                # An unread body would be parsed as the next request, so such a connection ends here
+                await self._respond(writer, status, payload, close=unread or not keep_alive)
+                if unread or not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, path, headers, reader):
+        """(status, payload, unread): unread is True when the request body was left on the connection"""
+        self.requests += 1
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            return 400, {"error": "Invalid Content-Length"}, True
+        if length < 0:
+            return 400, {"error": "Invalid Content-Length"}, True
+        if length > MAX_BODY:
+            return 413, {"error": "Request body too large"}, True
+        try:
+            raw = await reader.readexactly(length) if length else b""
+            handler = self.routes.get((method, path))
+            if handler is None:
+                allowed = any(route_path == path for _, route_path in self.routes)
+                raise HTTPError(405 if allowed else 404, f"No route for {method} {path}")
+            user = None
+            if (method, path) not in self.public_routes:
+                user = self.api_keys.user_for(headers.get("authorization"))
+            try:
+                body = json.loads(raw) if raw else {}
+            except json.JSONDecodeError:
+                raise HTTPError(400, "Body must be JSON")
+            if not isinstance(body, dict):
+                raise HTTPError(400, "Body must be a JSON object")
+            return 200, await handler(body, user), False
+        except HTTPError as e:
+            return e.status, {"error": str(e)}, False
+        except scheduler.CircuitOpenError as e:
+            return 503, {"error": str(e)}, False
+        except ValueError as e:
+            return 400, {"error": str(e)}, False
+        except Exception as e:
+            print(f"Error handling {method} {path}: {e}")
+            return 500, {"error": "Internal server error"}, False
+
+    @staticmethod
+    async def _respond(writer, status, payload, close=False):
+        body = json.dumps(payload).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, 'Error')}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+
+async def serve(host="127.0.0.1", port=8080, tokens_dir="tokens", openai_concurrency=64):
+    """Runs the service until cancelled"""
+    # One process now multiplexes many users, so allow more overlapping model calls
+    scheduler.configure("openai", max_concurrency=openai_concurrency)
+    app = EventElfServer(tokens_dir=tokens_dir)
+    server = await asyncio.start_server(app.handle_connection, host, port, backlog=1024)
+    print(f"EventElf service listening on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def issue_key(tokens_dir, user):
+    """Prints a new bearer key for user; it is shown only this once"""
+    try:
+        key = ApiKeys(tokens_dir).issue(user)
+    except ValueError as e:
+        print(e)
+        return 1
+    print(key)
+    return 0
+
+
+def run(host="127.0.0.1", port=8080, tokens_dir="tokens", openai_concurrency=64):
+    try:
+        asyncio.run(serve(host, port, tokens_dir, openai_concurrency))
+    except KeyboardInterrupt:
+        pass
+    return 0
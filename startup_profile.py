@@ -0,0 +1,58 @@
+"""
+Startup profiler for `python main.py --profile-startup`.
+
+Times every top-level import made on the main thread until the first frame is drawn and
+prints a breakdown to stderr, so slow imports that creep into the startup path stand out.
+"""
+import builtins
+import sys
+import threading
+import time
+from collections import defaultdict
+
+
+class StartupProfiler:
+    """Measures import time per top-level package and the time to first frame"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.imports = defaultdict(float)
+        self._depth = 0
+        self._original_import = None
+
+    def start(self):
+        """Begin timing imports"""
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def stop(self):
+        """Stop timing imports"""
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        original = self._original_import
+        # Only the outermost import on the main thread is charged, so nested imports add up once
+        if self._depth or threading.current_thread() is not threading.main_thread():
+            return original(name, globals, locals, fromlist, level)
+        self._depth += 1
+        started = time.perf_counter()
+        try:
+            return original(name, globals, locals, fromlist, level)
+        finally:
+            self._depth -= 1
+            package = name.split(".")[0] if name else (globals or {}).get("__package__") or "<relative>"
+            self.imports[package] += time.perf_counter() - started
+
+    def report(self, out=None, limit=15):
+        """Stop timing and print the breakdown (call once the first frame is drawn)"""
+        self.stop()
+        out = out or sys.stderr
+        total = time.perf_counter() - self.started
+        imported = sum(self.imports.values())
+        print(f"Time to first frame: {total * 1000:.0f} ms", file=out)
+        print(f"  imports: {imported * 1000:.0f} ms", file=out)
+        for package, seconds in sorted(self.imports.items(), key=lambda item: item[1], reverse=True)[:limit]:
+            print(f"    {package:<24} {seconds * 1000:8.1f} ms", file=out)
+        print(f"  window setup and first paint: {(total - imported) * 1000:.0f} ms", file=out)
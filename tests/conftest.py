@@ -0,0 +1,8 @@
+import sys
+import types
+
+# ai_model reads the OpenAI key from config/config.py, which every user creates locally
+try:
+    import config.config  # noqa: F401
+except ImportError:
+    sys.modules["config.config"] = types.SimpleNamespace(API_KEY="test-key")
@@ -0,0 +1,46 @@
+import json
+from types import SimpleNamespace
+
+import ai_model
+from ai_model import StreamingToolCallParser
+
+EVENT = {"title": "Lunch {with} \"Sam\"", "date": "2026-10-19", "start_time": "12:00", "end_time": "13:00"}
+
+
+def delta(index, fragment):
+    return SimpleNamespace(index=index, function=SimpleNamespace(arguments=fragment))
+
+
+def fragments(text, size=7):
+    return [text[start:start + size] for start in range(0, len(text), size)]
+
+
+def test_stream_parser_reports_each_event_when_its_json_closes():
+    parser = StreamingToolCallParser()
+    first = json.dumps(EVENT)
+    second = json.dumps(dict(EVENT, title="Dentist"))
+    completed = []
+    for piece in fragments(first):
+        completed += parser.feed([delta(0, piece)])
+    assert completed == [(0, EVENT)]  # Braces and quotes inside the title do not close it early
+    for piece in fragments(second)[:-1]:
+        assert parser.feed([delta(1, piece)]) == []
+    assert parser.feed([delta(1, fragments(second)[-1])])[0][1]["title"] == "Dentist"
+    assert [event["title"] for event in parser.finish()] == [EVENT["title"], "Dentist"]
+
+
+def test_stream_parser_limits_arguments():
+    parser = StreamingToolCallParser()
+    parser.feed([delta(0, json.dumps(dict(EVENT, title="x" * 500, reminder=10 ** 6, color="red")))])
+    [event] = parser.finish()
+    assert len(event["title"]) == ai_model.MAX_TITLE_CHARS
+    assert event["reminder"] == ai_model.MAX_REMINDER_MINUTES
+    assert "color" not in event
+
+
+def test_request_prefix_is_identical_across_messages():
+    first = ai_model._model_messages("lunch tomorrow")
+    second = ai_model._model_messages("standup monday at 9")
+    assert first[0] is second[0] is ai_model._SYSTEM_MESSAGE
+    assert first[1]["content"].endswith("\nlunch tomorrow")
+    assert "Today's date" not in ai_model.SYSTEM_PROMPT
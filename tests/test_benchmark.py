@@ -0,0 +1,22 @@
+import benchmark
+
+
+def result(scenario, p95_ms, events_per_sec):
+    return {"scenario": scenario, "p95_ms": p95_ms, "events_per_sec": events_per_sec}
+
+
+def test_percentile_is_nearest_rank():
+    samples = list(range(1, 101))
+    assert benchmark.percentile(samples, 0.50) == 50
+    assert benchmark.percentile(samples, 0.95) == 95
+    assert benchmark.percentile([3.0], 0.99) == 3.0
+    assert benchmark.percentile([], 0.5) == 0.0
+
+
+def test_compare_flags_only_regressions_beyond_the_allowance():
+    baseline = {"results": [result("insert", 100.0, 50.0), result("batch", 20.0, 500.0)]}
+    current = [result("insert", 109.0, 46.0), result("batch", 30.0, 300.0), result("stream", 1.0, 1.0)]
+    assert benchmark.compare(current, baseline, 0.10) == [
+        "batch: p95 20.0 -> 30.0 ms",
+        "batch: 500.0 -> 300.0 events/s",
+    ]
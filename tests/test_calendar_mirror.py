@@ -0,0 +1,99 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import calendar_mirror
+from calendar_mirror import CalendarMirror, IntervalIndex
+
+
+def utc(day, hour, minute=0):
+    return datetime(2026, 10, day, hour, minute, tzinfo=timezone.utc)
+
+
+def test_interval_index_matches_a_linear_scan():
+    rng = random.Random(7)
+    intervals = []
+    for n in range(300):
+        start = rng.uniform(0, 1000)
+        intervals.append((start, start + rng.uniform(0.1, 50), n))
+    index = IntervalIndex(intervals)
+    for _ in range(200):
+        start = rng.uniform(-10, 1010)
+        end = start + rng.uniform(0.1, 30)
+        expected = {n for s, e, n in intervals if s < end and e > start}
+        assert set(index.overlapping(start, end)) == expected
+
+
+def test_touching_intervals_do_not_overlap():
+    index = IntervalIndex([(10, 20, "a")])
+    assert index.overlapping(20, 30) == []
+    assert index.overlapping(0, 10) == []
+    assert index.overlapping(19, 21) == ["a"]
+
+
+def mirror_with(*events):
+    mirror = CalendarMirror(":memory:")
+    mirror.index = IntervalIndex(
+        (start.timestamp(), end.timestamp(), (summary, start.timestamp(), end.timestamp()))
+        for summary, start, end in events
+    )
+    mirror.loaded = True
+    mirror._window_day = datetime.now(timezone.utc).date()
+    return mirror
+
+
+def test_conflict_note_suggests_free_slots():
+    mirror = mirror_with(("Standup", utc(20, 9), utc(20, 10)))
+    event = {"title": "Call", "date": "2026-10-20", "start_time": "09:30", "end_time": "10:00"}
+    [note] = mirror.describe_conflicts(event)
+    assert note.startswith("Conflicts on 2026-10-20 with Standup (09:00-10:00). Free at: ")
+    assert mirror.describe_conflicts(dict(event, start_time="10:00", end_time="10:30")) == []
+
+
+def test_recurring_event_is_checked_on_the_dates_its_rule_selects():
+    # The rule selects the last weekday of each month, so the Monday review never clashes
+    mirror = mirror_with(("Offsite", utc(30, 8), utc(30, 18)), ("Review", utc(26, 8), utc(26, 18)))
+    event = {"title": "Report", "date": "2026-10-19", "start_time": "15:00", "end_time": "16:00",
+             "recurrence": "FREQ=MONTHLY;BYDAY=MO,TU,WE,TH,FR;BYSETPOS=-1"}
+    notes = mirror.describe_conflicts(event)
+    assert len(notes) == 1 and notes[0].startswith("Conflicts on 2026-10-30 with Offsite")
+
+
+def test_unloaded_mirror_reports_nothing():
+    assert calendar_mirror.CalendarMirror(":memory:").describe_conflicts(
+        {"date": "2026-10-20", "start_time": "09:00", "end_time": "10:00"}) == []
+
+
+def test_transparent_and_all_day_events_are_not_conflicts():
+    day = (datetime.now(timezone.utc) + timedelta(days=2)).date()
+
+    def at(hour):
+        return {"dateTime": f"{day}T{hour:02d}:00:00Z"}
+
+    mirror = CalendarMirror(":memory:")
+    db = mirror._connect()
+    mirror._store(db, {"id": "a", "summary": "Standup", "start": at(9), "end": at(10)})
+    mirror._store(db, {"id": "b", "summary": "Focus time", "start": at(9), "end": at(12), "transparency": "transparent"})
+    mirror._store(db, {"id": "c", "summary": "Offsite", "start": {"date": str(day)},
+                       "end": {"date": str(day + timedelta(days=1))}})
+    mirror.load()
+    event = {"title": "Call", "date": str(day), "start_time": "09:30", "end_time": "10:00"}
+    conflict, all_day = mirror.describe_conflicts(event)
+    assert conflict.startswith(f"Conflicts on {day} with Standup (09:00-10:00). Free at: ")
+    assert all_day == f"All day on {day}: Offsite"
+    assert mirror.describe_conflicts(dict(event, start_time="11:00", end_time="11:30")) == [f"All day on {day}: Offsite"]
+
+
+def test_mirror_from_before_transparency_resyncs(tmp_path):
+    import sqlite3
+
+    path = str(tmp_path / "mirror.db")
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE events (id TEXT PRIMARY KEY, status TEXT, summary TEXT, start REAL, end REAL, "
+               "recurrence TEXT, recurring_event_id TEXT, original_start REAL)")
+    db.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+    db.execute("INSERT INTO meta VALUES ('sync_token', 'old')")
+    db.commit()
+    db.close()
+    db = CalendarMirror(path)._connect()
+    assert db.execute("SELECT value FROM meta WHERE key = 'sync_token'").fetchone() is None
+    assert {"transparent", "all_day"} <= {row[1] for row in db.execute("PRAGMA table_info(events)")}
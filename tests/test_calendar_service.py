@@ -0,0 +1,186 @@
+import sys
+import time
+import types
+
+import pytest
+
+import scheduler
+from calendar_service import BATCH_LIMIT, CalendarServiceManager, create_events
+
+
+class FakeCreds:
+    def __init__(self, valid=True, refresh_token=None):
+        self.valid = valid
+        self.refresh_token = refresh_token
+        self.expiry = None
+
+
+@pytest.fixture
+def built(monkeypatch):
+    """Credentials each service was built with; googleapiclient is replaced by a fake build()"""
+    services = []
+    discovery = types.ModuleType("googleapiclient.discovery")
+
+    def build(*args, credentials=None, **kwargs):
+        services.append(credentials)
+        return object()
+
+    discovery.build = build
+    monkeypatch.setitem(sys.modules, "googleapiclient", types.ModuleType("googleapiclient"))
+    monkeypatch.setitem(sys.modules, "googleapiclient.discovery", discovery)
+    return services
+
+
+def manager_loading(tmp_path, *results):
+    manager = CalendarServiceManager(token_path=str(tmp_path / "token.pickle"))
+    results = list(results)
+
+    def load(interactive=True):
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    manager._load_credentials = load
+    return manager
+
+
+def test_service_is_built_once(tmp_path, built):
+    creds = FakeCreds()
+    manager = manager_loading(tmp_path, creds)
+    service = manager.get_service()
+    assert manager.get_service() is service
+    assert built == [creds]
+
+
+def test_invalid_credentials_without_refresh_token_raise_when_not_interactive(tmp_path, built):
+    creds = FakeCreds()
+    manager = manager_loading(tmp_path, creds, RuntimeError("sign-in is required"))
+    manager.get_service()
+    creds.valid = False
+    with pytest.raises(RuntimeError):
+        manager.get_service(interactive=False)
+
+
+def test_invalid_credentials_without_refresh_token_sign_in_again(tmp_path, built):
+    first, second = FakeCreds(), FakeCreds()
+    manager = manager_loading(tmp_path, first, second)
+    old_service = manager.get_service()
+    first.valid = False
+    assert manager.get_service() is not old_service
+    assert built == [first, second]
+
+
+def test_invalid_credentials_with_refresh_token_are_refreshed_in_place(tmp_path, built):
+    creds = FakeCreds(refresh_token="refresh")
+    manager = manager_loading(tmp_path, creds)
+    service = manager.get_service()
+    refreshed = []
+    manager._refresh = lambda: refreshed.append(True)
+    creds.valid = False
+    assert manager.get_service() is service
+    assert refreshed == [True]
+
+
+class FakeRequest:
+    def __init__(self, body):
+        self.body = body
+
+
+class FakeBatch:
+    def __init__(self, callback, responses):
+        self.callback = callback
+        self.responses = responses
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        for request_id, request in self.requests:
+            error = self.responses.pop(0) if self.responses else None
+            self.callback(request_id, None if error else dict(request.body), error)
+
+
+class FakeService:
+    """Answers batch inserts with the given errors (None for success), in order"""
+
+    def __init__(self, responses=()):
+        self.responses = list(responses)
+        self.batches = []
+
+    def new_batch_http_request(self, callback):
+        batch = FakeBatch(callback, self.responses)
+        self.batches.append(batch)
+        return batch
+
+    def events(self):
+        return self
+
+    def insert(self, calendarId, body):
+        return FakeRequest(body)
+
+
+EVENT = {"title": "Standup", "date": "2026-10-19", "start_time": "09:00", "end_time": "09:15"}
+
+
+def test_create_events_uses_prebuilt_bodies_and_ids():
+    service = FakeService()
+    bodies = [{"summary": "Prebuilt"}, None]
+    results = create_events([EVENT, EVENT], service=service, event_ids=["id0", "id1"], bodies=bodies)
+    assert [result["created"]["summary"] for result in results] == ["Prebuilt", "Standup"]
+    assert [result["created"]["id"] for result in results] == ["id0", "id1"]
+    assert bodies[0] == {"summary": "Prebuilt"}  # Not modified
+
+
+def test_create_events_reports_invalid_events_without_sending_them():
+    service = FakeService()
+    results = create_events([{"title": "No date"}, EVENT], service=service)
+    assert isinstance(results[0]["error"], ValueError)
+    assert results[1]["created"]["summary"] == "Standup"
+    assert len(service.batches[0].requests) == 1
+
+
+def test_create_events_splits_into_batches_and_keeps_order():
+    service = FakeService(responses=[None, RuntimeError("boom")])
+    events = [dict(EVENT, title=f"Event {n}") for n in range(BATCH_LIMIT + 3)]
+    # A backend of its own, so the shared Calendar rate limit does not slow the test down
+    backend = scheduler.Backend("test-calendar", rate=1000.0, burst=1000, max_concurrency=1)
+    results = create_events(events, service=service, backend=backend)
+    assert [len(batch.requests) for batch in service.batches] == [BATCH_LIMIT, 3]
+    assert str(results[1]["error"]) == "boom"
+    assert [result["event"]["title"] for result in results] == [event["title"] for event in events]
+    assert results[-1]["created"]["summary"] == f"Event {BATCH_LIMIT + 2}"
+
+
+class ApiError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.status_code = status
+
+
+def test_failed_batch_is_resent_by_one_retry_layer(monkeypatch):
+    monkeypatch.setattr(time, "sleep", lambda seconds: None)
+    service = FakeService(responses=[None, ApiError(503)])
+    executed = []
+    original = service.new_batch_http_request
+
+    def new_batch(callback):
+        batch = original(callback)
+        execute = batch.execute
+
+        def flaky_execute():
+            executed.append(len(batch.requests))
+            if len(executed) == 1:
+                raise ApiError(503)  # The whole batch request fails once
+            execute()
+
+        batch.execute = flaky_execute
+        return batch
+
+    service.new_batch_http_request = new_batch
+    backend = scheduler.Backend("test-retry", rate=1000.0, burst=1000, max_concurrency=1)
+    results = create_events([EVENT, EVENT], service=service, event_ids=["a", "b"], backend=backend)
+    # Batch of two fails, both are resent; the second insert is throttled inside it and resent alone
+    assert executed == [2, 2, 1]
+    assert [result["created"]["id"] for result in results] == ["a", "b"]
@@ -0,0 +1,92 @@
+import pytest
+
+import ai_model
+from chunking import (MAX_CHUNK_CHARS, MAX_CHUNK_DATES, date_lines, has_date, merge_events, needs_chunking,
+                      split_schedule)
+
+
+def schedule(weeks, lines_per_week=3):
+    paragraphs = []
+    for week in range(1, weeks + 1):
+        lines = [f"Week {week}"]
+        lines += [f"Oct {week * 3 + day}: Lecture {week}.{day} on topic number {week * 10 + day}, room B{day}"
+                  for day in range(lines_per_week)]
+        paragraphs.append("\n".join(lines))
+    return "CS 101 - Fall 2026\n\n" + "\n\n".join(paragraphs)
+
+
+@pytest.mark.parametrize("line, dated", [
+    ("Team sync Monday at 10", True),
+    ("Fridays: office hours", True),
+    ("Mar 5 exam", True),
+    ("5th of May", True),
+    ("Sat 5/3 party", True),
+    ("mon 9am standup", True),
+    ("2026-11-03 offsite", True),
+    ("I may be late", False),
+    ("The sun was out", False),
+    ("Sat through the whole talk", False),
+    ("We marched on", False),
+])
+def test_month_and_short_weekday_names_need_a_date_context(line, dated):
+    assert has_date(line) is dated
+
+
+def test_long_email_about_one_event_is_not_chunked():
+    email = (
+        "Hi all,\n\n" + "We have been talking about the roadmap for a while now. " * 20 +
+        "\n\nLet's meet on Thursday at 3pm in the big room to go over it.\n\n" +
+        "Thanks,\nAna\n" + "Some signature text that goes on and on. " * 5
+    )
+    assert len(email) > MAX_CHUNK_CHARS and date_lines(email) == 1
+    assert not needs_chunking(email)
+    assert split_schedule(email) == [email]
+
+
+def test_short_schedule_is_one_chunk():
+    text = schedule(2)
+    assert len(text) < MAX_CHUNK_CHARS
+    assert split_schedule(text) == [text]
+
+
+def test_many_dated_lines_are_chunked_with_context():
+    text = schedule(8)
+    chunks = split_schedule(text)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk.splitlines()[0] == "CS 101 - Fall 2026"
+        assert date_lines(chunk) <= MAX_CHUNK_DATES + 1
+    # Every dated line lands in some chunk
+    dated = [line for line in text.splitlines() if has_date(line)]
+    assert all(any(line in chunk for chunk in chunks) for line in dated)
+
+
+def test_chunks_without_a_date_are_dropped():
+    prose = "\n\n".join("Notes paragraph %d. " % i + "Nothing scheduled here, just words. " * 30 for i in range(3))
+    text = schedule(6) + "\n\n" + prose
+    chunks = split_schedule(text)
+    assert len(chunks) > 1
+    assert all(date_lines(chunk) for chunk in chunks)
+    assert not any("Notes paragraph 2" in chunk for chunk in chunks)
+
+
+def test_merge_drops_overlap_duplicates_and_keeps_the_fuller_one():
+    first = [{"title": "Lecture 1", "date": "2026-10-03", "start_time": "09:00"}]
+    second = [{"title": "lecture  1", "date": "2026-10-03", "start_time": "09:00", "reminder": 10},
+              {"title": "Lecture 2", "date": "2026-10-04", "start_time": "09:00"}]
+    merged = merge_events([first, second])
+    assert [event["title"] for event in merged] == ["lecture  1", "Lecture 2"]
+
+
+def test_chunk_failures_become_notes():
+    events, notes = ai_model._merge_chunk_results([
+        [{"title": "A", "date": "2026-10-03", "start_time": "09:00"}],
+        RuntimeError("timed out"),
+    ])
+    assert [event["title"] for event in events] == ["A"]
+    assert notes == ["Part 2 of your message could not be read (timed out), so its events may be missing."]
+
+
+def test_all_chunks_failing_raises():
+    with pytest.raises(RuntimeError):
+        ai_model._merge_chunk_results([RuntimeError("a"), RuntimeError("b")])
@@ -0,0 +1,73 @@
+import io
+
+import pytest
+
+import cli
+
+EVENT = {"title": "Standup", "date": "2026-10-19", "start_time": "09:00", "end_time": "09:30"}
+
+
+@pytest.fixture
+def answers(monkeypatch):
+    replies = []
+    monkeypatch.setattr("builtins.input", lambda prompt="": replies.pop(0))
+    return replies
+
+
+def test_confirm_accepts_common_affirmatives(answers):
+    session = cli.Session(io.StringIO(), interactive=True)
+    for reply in ("yes please", "Sure!", "looks good"):
+        answers.append(reply)
+        assert session.confirm([EVENT], "Create it?") == [EVENT]
+    answers.append("no thanks")
+    assert session.confirm([EVENT], "Create it?") is None
+
+
+def test_confirm_applies_edits_and_queues_new_prompts(answers):
+    session = cli.Session(io.StringIO(), interactive=True)
+    answers.extend(["lunch with Sam tomorrow at noon", "make it 10am", "ok"])
+    confirmed = session.confirm([EVENT], "Create it?")
+    assert confirmed == [dict(EVENT, start_time="10:00", end_time="10:30")]
+    assert session.queued == ["lunch with Sam tomorrow at noon"]
+
+
+def test_create_sends_only_its_own_events(tmp_path, monkeypatch):
+    import calendar_service
+    import history
+    import outbox
+
+    box = outbox.Outbox(str(tmp_path / "outbox.db"))
+    monkeypatch.setattr(outbox, "outbox", box)
+    monkeypatch.setattr(history.history, "record", lambda *args, **kwargs: None)
+    sent = []
+
+    def create_events(events, event_ids=None, **kwargs):
+        sent.extend(event_ids)
+        return [{"event": event, "created": {"id": event_id}, "error": None} for event, event_id in zip(events, event_ids)]
+
+    monkeypatch.setattr(calendar_service, "create_events", create_events)
+    other = box.enqueue([dict(EVENT, title="From the GUI")], start=False)
+
+    session = cli.Session(io.StringIO())
+    results = session.create("standup", [EVENT])
+    assert results == [{"id": sent[0], "error": None}]
+    assert sent[0] not in other and len(sent) == 1
+    assert [event_id for event_id, _, _ in box.pending()] == other
+    assert session._finished == {}
+
+
+def test_create_reports_unsent_events_as_queued(tmp_path, monkeypatch):
+    import history
+    import outbox
+
+    box = outbox.Outbox(str(tmp_path / "outbox.db"))
+    monkeypatch.setattr(outbox, "outbox", box)
+    monkeypatch.setattr(history.history, "record", lambda *args, **kwargs: None)
+
+    def flush(event_ids=None):
+        raise ConnectionError("offline")
+
+    monkeypatch.setattr(box, "flush", flush)
+    [result] = cli.Session(io.StringIO()).create("standup", [EVENT])
+    assert result["id"] is None and "offline" in result["error"] and "stays queued" in result["error"]
+    assert len(box.pending()) == 1
@@ -0,0 +1,147 @@
+from datetime import date
+
+import pytest
+
+import fast_parser
+from fast_parser import CONFIDENCE_THRESHOLD, apply_edit, confirmation_answer, parse_event, refers_to_events, reschedule
+
+TODAY = date(2026, 10, 18)  # A Sunday
+
+
+def confident(content):
+    event, confidence = parse_event(content, TODAY)
+    assert event is not None and confidence >= CONFIDENCE_THRESHOLD, (content, event, confidence)
+    return event
+
+
+@pytest.mark.parametrize("content, expected", [
+    ("team meeting tomorrow at 11am", {"title": "Team Meeting", "date": "2026-10-19", "start_time": "11:00", "end_time": "12:00"}),
+    ("dentist Friday 3-4pm", {"title": "Dentist", "date": "2026-10-23", "start_time": "15:00", "end_time": "16:00"}),
+    ("lunch with Sam tomorrow at 1", {"title": "Lunch with Sam", "start_time": "13:00"}),
+    ("call mom tomorrow at 5pm", {"title": "Call Mom", "start_time": "17:00"}),
+    ("Can you add lunch tomorrow at noon", {"title": "Lunch", "start_time": "12:00"}),
+    ("PT appointment tomorrow at 3pm", {"title": "PT Appointment", "start_time": "15:00"}),
+])
+def test_simple_requests(content, expected):
+    event = confident(content)
+    assert {key: event[key] for key in expected} == expected
+
+
+def test_weekday_recurrence():
+    event = confident("standup every weekday at 9")
+    assert event["start_time"] == "09:00"
+    assert event["recurrence"] == "RRULE:FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR"
+    assert event["date"] == "2026-10-19"
+
+
+def test_reminder_and_duration():
+    event = confident("yoga tomorrow at 6pm for 90 minutes with a 15 minute reminder")
+    assert (event["start_time"], event["end_time"], event["reminder"]) == ("18:00", "19:30", 15)
+
+
+@pytest.mark.parametrize("content, start", [
+    ("dinner Friday at 7", "19:00"),
+    ("drinks with Jo saturday at 8", "20:00"),
+    ("breakfast with Ana tomorrow at 8", "08:00"),
+    ("gym tonight at 6", "18:00"),
+    ("dinner 7-9 saturday", "19:00"),
+])
+def test_bare_hours_follow_meal_and_evening_context(content, start):
+    assert confident(content)["start_time"] == start
+
+
+@pytest.mark.parametrize("content", ["meeting at 7 tomorrow", "meeting tomorrow at 6"])
+def test_ambiguous_bare_hours_go_to_the_model(content):
+    event, confidence = parse_event(content, TODAY)
+    assert confidence < CONFIDENCE_THRESHOLD
+
+
+@pytest.mark.parametrize("content", [
+    "what's on tomorrow at 9am",
+    "do I have anything friday at 3pm",
+    "lunch tomorrow at noon?",
+    "cancel my meeting tomorrow at 3pm",
+    "please delete the dentist on friday at 4pm",
+    "can you move standup to 10am tomorrow",
+    "call off dinner friday at 7",
+    "Meeting with Bob at 2pm EST tomorrow",
+    "sync with Tokyo tomorrow at 9am JST",
+    "dentist tomorrow at 3pm pt",
+    "call tomorrow at 10am eastern time",
+    "standup tomorrow 9:30 UTC+2",
+])
+def test_questions_changes_and_time_zones_are_refused(content):
+    assert parse_event(content, TODAY) == (None, 0.0)
+    assert fast_parser.needs_model(content)
+
+
+def test_words_that_only_contain_zone_abbreviations_are_not_refused():
+    assert confident("pick up Estelle tomorrow at 4pm")["title"] == "Pick Up Estelle"
+    assert confident("dentist tomorrow at 2pm")["title"] == "Dentist"
+
+
+EVENT = {"title": "Standup", "date": "2026-10-19", "start_time": "09:00", "end_time": "09:30"}
+
+
+def test_apply_edit_new_time_keeps_length():
+    assert apply_edit([EVENT], "make it 3pm", TODAY) == [dict(EVENT, start_time="15:00", end_time="15:30")]
+
+
+def test_apply_edit_moves_date():
+    assert apply_edit([EVENT], "move it to thursday", TODAY)[0]["date"] == "2026-10-22"
+
+
+def test_apply_edit_targets_one_event():
+    other = dict(EVENT, title="Retro")
+    edited = apply_edit([EVENT, other], "the second one at 4pm", TODAY)
+    assert edited[0] == EVENT and edited[1]["start_time"] == "16:00"
+
+
+def test_apply_edit_rejects_what_it_does_not_understand():
+    assert apply_edit([EVENT], "invite the whole marketing team", TODAY) is None
+
+
+def test_reschedule_keeps_title_and_length():
+    past = {"title": "1:1 with Sam", "date": "2026-10-06", "start_time": "14:00", "end_time": "14:30", "reminder": 10}
+    event, words = reschedule(past, "1:1 with sam tomorrow", TODAY)
+    assert event == dict(past, date="2026-10-19")
+    assert "sam" in words
+
+
+def test_apply_edit_that_changes_nothing_returns_the_events():
+    assert apply_edit([EVENT], "make it 9am", TODAY) == [EVENT]
+
+
+@pytest.mark.parametrize("reply, expected", [
+    ("yes", "yes"), ("ok", "yes"), ("Sure!", "yes"), ("yeah", "yes"), ("yes please", "yes"),
+    ("go ahead", "yes"), ("looks good", "yes"), ("no", "no"), ("nope", "no"), ("no thanks", "no"),
+    ("never mind", "no"), ("cancel", "no"), ("that's not right", None), ("no, make it 3pm", None), ("lunch tomorrow", None),
+])
+def test_confirmation_answer(reply, expected):
+    assert confirmation_answer(reply) == expected
+
+
+@pytest.mark.parametrize("reply, expected", [
+    ("make it 3pm", True), ("move them to friday", True), ("the second one at 4", True),
+    ("no, lunch on thursday", True), ("lunch with Sam tomorrow at noon", False), ("dentist friday at 3", False),
+])
+def test_refers_to_events(reply, expected):
+    assert refers_to_events(reply) is expected
+
+
+@pytest.mark.parametrize("content, title, byday", [
+    ("yoga mondays and wednesdays at 6pm", "Yoga", "MO,WE"),
+    ("gym tuesdays, thursdays 7am", "Gym", "TU,TH"),
+    ("class Mondays & Wednesdays 10-11am", "Class", "MO,WE"),
+    ("soccer practice tuesdays and thursdays 5-6pm", "Soccer Practice", "TU,TH"),
+    ("Yoga Mondays, Wednesdays, and Fridays at 7am", "Yoga", "MO,WE,FR"),
+])
+def test_lists_of_plural_weekdays_recur_on_every_day(content, title, byday):
+    event = confident(content)
+    assert event["title"] == title
+    assert event["recurrence"] == f"RRULE:FREQ=WEEKLY;BYDAY={byday}"
+
+
+def test_stray_plural_weekday_lowers_confidence():
+    event, confidence = parse_event("lunch with Sam mondays 12pm and fridays", TODAY)
+    assert confidence < CONFIDENCE_THRESHOLD
@@ -0,0 +1,43 @@
+from datetime import date
+
+import pytest
+
+from history import History
+
+TODAY = date(2026, 10, 18)  # A Sunday
+ONE_ON_ONE = {"title": "1:1 with Sam", "date": "2026-10-13", "start_time": "10:00", "end_time": "10:30"}
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = History(str(tmp_path / "history.db"))
+    history._connect()
+    if not history.fts:
+        pytest.skip("SQLite has no FTS5")
+    return history
+
+
+def test_messages_page_backwards(history):
+    ids = [history.log_message(f"message {n}", is_user=n % 2 == 0) for n in range(5)]
+    assert history.messages_before(limit=2) == [(ids[3], "message 3", False), (ids[4], "message 4", True)]
+    assert [text for _, text, _ in history.messages_before(ids[3], limit=10)] == ["message 0", "message 1", "message 2"]
+
+
+def test_lookup_reuses_a_confirmed_event(history):
+    history.record("1:1 with Sam tuesday 10am", [ONE_ON_ONE], ["abc"])
+    [event] = history.lookup("book the usual 1:1 with Sam", TODAY)
+    assert event["title"] == "1:1 with Sam"
+    assert (event["start_time"], event["end_time"]) == ("10:00", "10:30")
+    assert date.fromisoformat(event["date"]) > TODAY
+
+
+def test_lookup_ignores_cancelled_and_loose_matches(history):
+    history.record("1:1 with Sam tuesday 10am", [ONE_ON_ONE], confirmed=False)
+    assert history.lookup("book the usual 1:1 with Sam", TODAY) is None
+    history.record("1:1 with Sam tuesday 10am", [ONE_ON_ONE], ["abc"])
+    assert history.lookup("lunch with Sam and the design team", TODAY) is None
+
+
+def test_lookup_leaves_changes_to_the_model(history):
+    history.record("1:1 with Sam tuesday 10am", [ONE_ON_ONE], ["abc"])
+    assert history.lookup("cancel the usual 1:1 with Sam", TODAY) is None
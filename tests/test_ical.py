@@ -0,0 +1,69 @@
+import io
+
+import pytest
+
+import ical
+
+
+def vevent(*lines):
+    text = "BEGIN:VCALENDAR\r\nBEGIN:VEVENT\r\n" + "\r\n".join(lines) + "\r\nEND:VEVENT\r\nEND:VCALENDAR\r\n"
+    events = list(ical.iter_vevents(io.StringIO(text)))
+    assert len(events) == 1
+    return events[0]
+
+
+def test_all_day_event_without_end_lasts_one_day():
+    body, uid = ical.event_body(vevent("UID:a", "SUMMARY:Holiday", "DTSTART;VALUE=DATE:20261019"))
+    assert uid == "a"
+    assert body["start"] == {"date": "2026-10-19"}
+    assert body["end"] == {"date": "2026-10-20"}
+
+
+def test_timed_event_without_end_has_no_length():
+    body, _ = ical.event_body(vevent("UID:b", "DTSTART:20261019T090000Z"))
+    assert body["start"] == body["end"] == {"dateTime": "2026-10-19T09:00:00Z", "timeZone": "UTC"}
+
+
+def test_all_day_event_with_short_duration_still_ends_next_day():
+    body, _ = ical.event_body(vevent("UID:c", "DTSTART;VALUE=DATE:20261019", "DURATION:PT1H"))
+    assert body["end"] == {"date": "2026-10-20"}
+
+
+def test_duration_and_reminders():
+    body, _ = ical.event_body(vevent(
+        "UID:d", "SUMMARY:Review\\, part 2", "DTSTART;TZID=Europe/Paris:20261019T100000", "DURATION:PT1H30M",
+        "BEGIN:VALARM", "ACTION:DISPLAY", "TRIGGER:-PT15M", "END:VALARM",
+    ))
+    assert body["summary"] == "Review, part 2"
+    assert body["end"] == {"dateTime": "2026-10-19T11:30:00", "timeZone": "Europe/Paris"}
+    assert body["reminders"] == {"useDefault": False, "overrides": [{"method": "popup", "minutes": 15}]}
+
+
+@pytest.mark.parametrize("tzid, expected", [
+    ("Pacific Standard Time", "America/Los_Angeles"),
+    ("W. Europe Standard Time", "Europe/Berlin"),
+    ("/mozilla.org/20050126_1/Europe/Berlin", "Europe/Berlin"),
+    ("America/New_York", "America/New_York"),
+])
+def test_time_zone_names_are_mapped(tzid, expected):
+    body, _ = ical.event_body(vevent("UID:e", f'DTSTART;TZID="{tzid}":20261019T100000', f'DTEND;TZID="{tzid}":20261019T110000'))
+    assert body["start"]["timeZone"] == body["end"]["timeZone"] == expected
+
+
+def test_unknown_time_zone_is_skipped_with_a_reason(monkeypatch, capsys):
+    text = (
+        "BEGIN:VCALENDAR\r\n"
+        "BEGIN:VEVENT\r\nUID:x\r\nDTSTART;TZID=Somewhere Standard Time:20261019T100000\r\nEND:VEVENT\r\n"
+        "BEGIN:VEVENT\r\nUID:y\r\nDTSTART:20261019T100000Z\r\nEND:VEVENT\r\n"
+        "END:VCALENDAR\r\n"
+    )
+    monkeypatch.setattr("sys.stdin", io.StringIO(text))
+    out = io.StringIO()
+    assert ical.import_file("-", dry_run=True, out=out) == 0
+    assert len(out.getvalue().splitlines()) == 1
+    assert "skipped 1: unknown time zone 'Somewhere Standard Time'" in capsys.readouterr().err
+
+
+def test_cancelled_and_modified_occurrences_are_not_imported():
+    assert ical.event_body(vevent("UID:f", "DTSTART:20261019T100000Z", "STATUS:CANCELLED")) == (None, "cancelled")
+    assert ical.event_body(vevent("UID:g", "DTSTART:20261019T100000Z", "RECURRENCE-ID:20261019T100000Z"))[0] is None
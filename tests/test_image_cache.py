@@ -0,0 +1,37 @@
+import pytest
+
+from image_cache import BubbleImageCache, quantize
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    rendered = []
+
+    def render(width, height, color, radius):
+        rendered.append((width, height, color, radius))
+        return object()
+
+    monkeypatch.setattr(BubbleImageCache, "_render", staticmethod(render))
+    cache = BubbleImageCache(maxsize=2, width_step=16)
+    cache.rendered = rendered
+    return cache
+
+
+def test_quantize_rounds_up():
+    assert [quantize(value, 16) for value in (1, 16, 17, 32)] == [16, 16, 32, 32]
+
+
+def test_similar_widths_share_one_image(cache):
+    assert cache.get(100, 40, "#fff") is cache.get(110, 40, "#fff")
+    assert cache.rendered == [(112, 40, "#fff", 15)]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_image_is_evicted(cache):
+    first = cache.get(16, 40, "#fff")
+    cache.get(32, 40, "#fff")
+    cache.get(16, 40, "#fff")  # Now the most recently used
+    cache.get(48, 40, "#fff")
+    assert cache.get(16, 40, "#fff") is first
+    cache.get(32, 40, "#fff")
+    assert len(cache.rendered) == 4
@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+import calendar_service
+import ingest
+import outbox
+
+
+class ApiError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.status_code = status
+
+EVENT = {"title": "Standup", "date": "2026-10-19", "start_time": "09:00", "end_time": "09:30"}
+
+
+def test_read_prompts_accepts_objects_strings_and_text(tmp_path):
+    path = tmp_path / "prompts.jsonl"
+    path.write_text('{"prompt": "standup monday 9am"}\n\n"lunch friday"\ndentist at 3\n')
+    assert list(ingest.read_prompts(str(path))) == [(1, "standup monday 9am"), (3, "lunch friday"), (4, "dentist at 3")]
+
+
+def fake_parse(prompt):
+    if prompt == "gibberish":
+        raise ValueError("No event details were parsed.")
+    return [dict(EVENT, title=prompt)]
+
+
+def test_run_writes_one_line_per_prompt(tmp_path, monkeypatch):
+    source = tmp_path / "prompts.jsonl"
+    source.write_text("standup\ngibberish\nreview\n")
+    output = tmp_path / "events.jsonl"
+    monkeypatch.setattr(ingest, "parse_prompt", fake_parse)
+    assert ingest.run(str(source), str(output), workers=2) == 1
+    items = sorted((json.loads(line) for line in output.read_text().splitlines()), key=lambda item: item["line"])
+    assert [item.get("error") for item in items] == [None, "No event details were parsed.", None]
+    assert items[2]["events"][0]["title"] == "review"
+
+
+@pytest.fixture
+def box(tmp_path, monkeypatch):
+    box = outbox.Outbox(str(tmp_path / "outbox.db"))
+    monkeypatch.setattr(outbox, "outbox", box)
+    return box
+
+
+def test_commit_sends_events_in_shared_batches(tmp_path, monkeypatch, box):
+    source = tmp_path / "prompts.jsonl"
+    source.write_text("standup\nreview\n")
+    output = tmp_path / "events.jsonl"
+    calls = []
+
+    def create_events(events, event_ids=None, **kwargs):
+        calls.append([event["title"] for event in events])
+        return [{"event": event, "created": {"id": event["title"]}, "error": None} for event in events]
+
+    monkeypatch.setattr(ingest, "parse_prompt", fake_parse)
+    monkeypatch.setattr(calendar_service, "create_events", create_events)
+    assert ingest.run(str(source), str(output), workers=1, commit=True) == 0
+    assert calls == [["standup", "review"]]
+    created = [json.loads(line)["created"] for line in output.read_text().splitlines()]
+    assert created == [["standup"], ["review"]]
+
+
+def test_commit_failures_fail_the_run_and_stay_queued(tmp_path, monkeypatch, box):
+    source = tmp_path / "prompts.jsonl"
+    source.write_text("standup\nreview\n")
+    output = tmp_path / "events.jsonl"
+    sent = []
+
+    def create_events(events, event_ids=None, **kwargs):
+        sent.extend(event_ids)
+        return [{"event": event, "created": None if event["title"] == "review" else {"id": event_id},
+                 "error": ApiError(503) if event["title"] == "review" else None}
+                for event, event_id in zip(events, event_ids)]
+
+    monkeypatch.setattr(ingest, "parse_prompt", fake_parse)
+    monkeypatch.setattr(calendar_service, "create_events", create_events)
+    assert ingest.run(str(source), str(output), workers=1, commit=True) == 1
+    items = sorted((json.loads(line) for line in output.read_text().splitlines()), key=lambda item: item["line"])
+    assert [item["created"] for item in items] == [sent[:1], [None]]
+    assert "stays queued" in items[1]["commit_error"]
+    # The failed insert keeps its id in the outbox, so resending it cannot create a duplicate
+    assert [event_id for event_id, _, _ in box.pending()] == sent[1:]
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+import metrics
+from metrics import Histogram, Registry
+
+
+def test_quantiles_interpolate_within_a_bucket():
+    histogram = Histogram()
+    for ms in range(110, 210, 10):  # 110..200ms, all in the 100-250ms bucket
+        histogram.observe(ms / 1000)
+    assert histogram.quantile(0.5) == pytest.approx(0.155)
+    assert 0.19 < histogram.quantile(0.95) <= 0.2
+
+
+def test_quantiles_show_a_shift_smaller_than_a_bucket():
+    before, after = Histogram(), Histogram()
+    for i in range(100):
+        before.observe(0.120 + i * 0.0005)
+        after.observe(0.135 + i * 0.0005)
+    assert after.quantile(0.5) - before.quantile(0.5) == pytest.approx(0.015, abs=0.003)
+
+
+def test_quantiles_of_the_overflow_bucket_stay_within_the_observed_range():
+    histogram = Histogram()
+    for seconds in (40.0, 50.0, 60.0):
+        histogram.observe(seconds)
+    assert 40.0 <= histogram.quantile(0.5) <= 60.0
+    assert histogram.quantile(1.0) == 60.0
+
+
+def test_empty_histogram():
+    assert Histogram().quantile(0.5) == 0.0
+    assert Histogram().snapshot()["min"] == 0.0
+
+
+def test_disabled_registry_records_nothing():
+    registry = Registry()
+    with registry.timer("stage"):
+        pass
+    registry.inc("calls")
+    assert registry.snapshot() == {"histograms": {}, "counters": {}}
+
+
+def test_trace_lines_carry_the_request_id(tmp_path):
+    registry = Registry()
+    trace = tmp_path / "trace.jsonl"
+    registry.enable(trace_path=str(trace))
+    with registry.request():
+        with registry.timer("outer", kind="test"):
+            pass
+    registry.observe("untagged", 0.001)
+    registry._trace_file.close()
+    lines = [json.loads(line) for line in trace.read_text().splitlines()]
+    assert lines[0]["stage"] == "outer" and lines[0]["kind"] == "test" and lines[0]["request"]
+    assert lines[1]["request"] is None
+
+
+def test_prometheus_export(tmp_path):
+    registry = Registry()
+    registry.enable()
+    registry.observe("calendar_batch", 0.03)
+    registry.inc("calendar_events_created", 3)
+    text = registry.to_prometheus()
+    assert 'eventelf_calendar_batch_seconds_bucket{le="0.05"} 1' in text
+    assert "eventelf_calendar_events_created_total 3" in text
+
+
+def test_chunk_spans_keep_the_request_id(monkeypatch):
+    import ai_model
+
+    seen = []
+
+    def extract(chunk, index, total):
+        seen.append(metrics._request_id.get())
+        return [{"title": chunk, "date": "2026-10-19", "start_time": "10:00", "end_time": "11:00"}]
+
+    monkeypatch.setattr(ai_model, "_extract_chunk", extract)
+    monkeypatch.setattr(metrics.registry, "enabled", True)
+    with metrics.request():
+        request_id = metrics._request_id.get()
+        ai_model._extract_chunks(["a", "b", "c"])
+    assert seen == [request_id] * 3
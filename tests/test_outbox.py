@@ -0,0 +1,138 @@
+import pytest
+
+import calendar_service
+import scheduler
+from outbox import Outbox, event_id_for
+
+
+class StatusError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.status_code = status
+
+
+EVENTS = [
+    {"title": "Standup", "date": "2026-10-19", "start_time": "09:00", "end_time": "09:30"},
+    {"title": "Review", "date": "2026-10-19", "start_time": "14:00", "end_time": "15:00"},
+]
+
+
+@pytest.fixture
+def box(tmp_path):
+    box = Outbox(str(tmp_path / "outbox.db"))
+    finished = []
+    box.add_listener(finished.extend)
+    box.finished = finished
+    return box
+
+
+@pytest.fixture
+def calendar(monkeypatch):
+    """Fake create_events: outcomes maps an event title to the error its insert raises"""
+    sent = []
+    outcomes = {}
+
+    def create_events(events, service=None, event_ids=None, build=None, bodies=None, backend="calendar"):
+        sent.append(list(event_ids))
+        results = []
+        for event, event_id in zip(events, event_ids):
+            error = outcomes.get(event["title"])
+            results.append({"event": event, "created": None if error else {"id": event_id}, "error": error})
+        return results
+
+    monkeypatch.setattr(calendar_service, "create_events", create_events)
+    return sent, outcomes
+
+
+def test_event_ids_are_deterministic_and_valid():
+    event_id = event_id_for("confirmation", 0, EVENTS[0])
+    assert event_id == event_id_for("confirmation", 0, dict(EVENTS[0]))
+    assert event_id != event_id_for("confirmation", 1, EVENTS[0])
+    assert 5 <= len(event_id) <= 1024 and set(event_id) <= set("0123456789abcdefghijklmnopqrstuv")
+
+
+def test_flush_sends_entries_once(box, calendar):
+    sent, _ = calendar
+    ids = box.enqueue(EVENTS, start=False)
+    assert box.flush() is None
+    assert sent == [ids]
+    assert [result["event_id"] for result in box.finished] == ids
+    assert box.pending() == []
+    box.flush()
+    assert len(sent) == 1
+
+
+def test_conflict_counts_as_created(box, calendar):
+    _, outcomes = calendar
+    outcomes["Standup"] = StatusError(409)
+    ids = box.enqueue(EVENTS, start=False)
+    box.flush()
+    assert box.pending() == []
+    assert [result["error"] for result in box.finished] == [None, None]
+    assert box.finished[0]["created"] == {"id": ids[0]}
+
+
+def test_transient_failure_is_retried_with_backoff(box, calendar):
+    sent, outcomes = calendar
+    outcomes["Review"] = StatusError(503)
+    ids = box.enqueue(EVENTS, start=False)
+    assert box.flush() == 2
+    assert [event_id for event_id, _, _ in box.pending()] == [ids[1]]
+    assert box.flush() == 4  # One more retry recorded, so a longer wait
+    del outcomes["Review"]
+    assert box.flush() is None
+    assert sent[-1] == [ids[1]]
+    assert box.pending() == []
+
+
+def test_permanent_failure_is_reported_and_dropped(box, calendar):
+    _, outcomes = calendar
+    outcomes["Standup"] = StatusError(400)
+    box.enqueue(EVENTS, start=False)
+    box.flush()
+    assert [result["event"]["title"] for result in box.finished] == ["Standup", "Review"]
+    assert scheduler.status_of(box.finished[0]["error"]) == 400 and box.finished[1]["error"] is None
+    assert box.pending() == []
+
+
+def test_flush_can_be_limited_to_some_entries(box, calendar):
+    sent, _ = calendar
+    other = box.enqueue(EVENTS[:1], start=False)
+    mine = box.enqueue(EVENTS[1:], start=False)
+    box.flush(mine)
+    assert sent == [mine]
+    assert [event_id for event_id, _, _ in box.pending()] == other
+
+
+def test_enqueue_is_idempotent_per_confirmation(box, calendar):
+    first = box.enqueue(EVENTS, start=False, confirmation_id="c1")
+    assert box.enqueue(EVENTS, start=False, confirmation_id="c1") == first
+    assert len(box.pending()) == 2
+
+
+def test_discard_drops_prepared_bodies(box, monkeypatch):
+    monkeypatch.setattr(box, "start", lambda: None)  # No flusher thread: nothing is built yet
+    confirmation_id = box.prepare(EVENTS)
+    assert [item[0] for item in box._preparing] == [confirmation_id]
+    box.discard(confirmation_id)
+    assert box._preparing == [] and box._prepared == {}
+
+
+def test_confirmed_events_use_the_bodies_prepared_for_them(box, monkeypatch):
+    monkeypatch.setattr(box, "start", lambda: None)
+    monkeypatch.setattr(calendar_service.service_manager, "prepare", lambda: None)
+    received = []
+
+    def create_events(events, event_ids=None, bodies=None, **kwargs):
+        received.extend(bodies)
+        return [{"event": event, "created": {"id": event_id}, "error": None} for event, event_id in zip(events, event_ids)]
+
+    monkeypatch.setattr(calendar_service, "create_events", create_events)
+    confirmation_id = box.prepare(EVENTS)
+    box._prepare_waiting()
+    edited = [EVENTS[0], dict(EVENTS[1], start_time="15:00", end_time="16:00")]
+    box.enqueue(edited, start=False, confirmation_id=confirmation_id)
+    box.flush()
+    # The unchanged event is sent with its prepared body, the edited one is built at send time
+    assert received[0]["summary"] == "Standup" and received[1] is None
+    assert box._bodies == {} and box._prepared == {}
@@ -0,0 +1,22 @@
+from progress import Progress
+
+
+def test_update_prints_the_counters_in_order(capsys):
+    progress = Progress("prompts", "events", "errors")
+    progress.prompts += 2
+    progress.events += 3
+    progress.update(force=True)
+    line = capsys.readouterr().err
+    assert line.startswith("\r2 prompts, 3 events, 0 errors, ") and line.endswith(" prompts/s\n")
+
+
+def test_skip_reasons_are_listed_at_the_end(capsys):
+    progress = Progress("events", "imported", "skipped")
+    progress.events += 3
+    progress.skip("no DTSTART")
+    progress.skip("no DTSTART")
+    progress.skip("same UID twice in the file")
+    progress.update(force=True)
+    lines = capsys.readouterr().err.split("\n")
+    assert lines[0].startswith("\r3 events, 0 imported, 3 skipped, ")
+    assert lines[1:] == ["  skipped 2: no DTSTART", "  skipped 1: same UID twice in the file", ""]
@@ -0,0 +1,98 @@
+from datetime import datetime
+
+import pytest
+
+import recurrence
+
+START = datetime(2026, 10, 19, 9, 0)  # A Monday
+
+
+def dates(rule, count=4, start=START):
+    return [occurrence.date().isoformat() for occurrence in recurrence.preview(start, rule, count)]
+
+
+@pytest.mark.parametrize("rule, expected", [
+    ("FREQ=DAILY;COUNT=3", ["2026-10-19", "2026-10-20", "2026-10-21"]),
+    ("FREQ=WEEKLY;BYDAY=MO,WE", ["2026-10-19", "2026-10-21", "2026-10-26", "2026-10-28"]),
+    ("FREQ=WEEKLY;INTERVAL=2", ["2026-10-19", "2026-11-02", "2026-11-16", "2026-11-30"]),
+    ("FREQ=MONTHLY", ["2026-10-19", "2026-11-19", "2026-12-19", "2027-01-19"]),
+    ("FREQ=YEARLY", ["2026-10-19", "2027-10-19", "2028-10-19", "2029-10-19"]),
+])
+def test_simple_rules(rule, expected):
+    assert dates(rule) == expected
+
+
+def test_bymonth_limits_daily_rules():
+    assert dates("FREQ=DAILY;BYMONTH=1") == ["2027-01-01", "2027-01-02", "2027-01-03", "2027-01-04"]
+
+
+def test_bymonth_with_ordinal_byday_in_yearly_rules():
+    assert dates("FREQ=YEARLY;BYMONTH=3;BYDAY=2SU") == ["2027-03-14", "2028-03-12", "2029-03-11", "2030-03-10"]
+
+
+def test_bysetpos_picks_last_weekday_of_the_month():
+    assert dates("FREQ=MONTHLY;BYDAY=MO,TU,WE,TH,FR;BYSETPOS=-1") == [
+        "2026-10-30", "2026-11-30", "2026-12-31", "2027-01-29"]
+
+
+def test_byyearday_counts_from_both_ends():
+    assert dates("FREQ=YEARLY;BYYEARDAY=1,-1") == ["2026-12-31", "2027-01-01", "2027-12-31", "2028-01-01"]
+
+
+def test_byweekno_follows_rfc_5545_examples():
+    assert dates("FREQ=YEARLY;BYWEEKNO=20;BYDAY=MO", 3, datetime(1997, 5, 12, 9)) == [
+        "1997-05-12", "1998-05-11", "1999-05-17"]
+    # Week 1 of 1998 starts in December 1997
+    assert dates("FREQ=YEARLY;BYWEEKNO=1;BYDAY=MO", 2, datetime(1997, 1, 1, 9)) == ["1997-12-29", "1999-01-04"]
+
+
+def test_yearly_byday_ordinal_counts_within_the_year():
+    assert dates("FREQ=YEARLY;BYDAY=20MO", 2) == ["2027-05-17", "2028-05-15"]
+
+
+def test_monthly_byday_and_bymonthday_intersect():
+    assert dates("FREQ=MONTHLY;BYDAY=FR;BYMONTHDAY=13", 3) == ["2026-11-13", "2027-08-13", "2028-10-13"]
+
+
+def test_monthly_negative_bymonthday_and_byday():
+    assert dates("FREQ=MONTHLY;BYMONTHDAY=-1", 3) == ["2026-10-31", "2026-11-30", "2026-12-31"]
+    assert dates("FREQ=MONTHLY;BYDAY=-1FR", 3) == ["2026-10-30", "2026-11-27", "2026-12-25"]
+
+
+def test_rule_that_never_matches_ends():
+    assert dates("FREQ=YEARLY;BYMONTH=2;BYMONTHDAY=30") == []
+    # Feb 29 is never the first Monday; the scan gives up after MAX_GAP_YEARS, not thousands of days
+    assert dates("FREQ=DAILY;BYMONTH=2;BYMONTHDAY=29;BYDAY=1MO") == []
+
+
+def test_rare_rule_spans_its_gaps():
+    assert dates("FREQ=DAILY;BYMONTH=2;BYMONTHDAY=29", 2) == ["2028-02-29", "2032-02-29"]
+
+
+def test_until_and_expand_window():
+    assert dates("FREQ=DAILY;UNTIL=20261021") == ["2026-10-19", "2026-10-20", "2026-10-21"]
+    starts = recurrence.expand(START, ["RRULE:FREQ=WEEKLY", "EXDATE:20261026T090000"],
+                               datetime(2026, 10, 20), datetime(2026, 11, 10))
+    assert [start.date().isoformat() for start in starts] == ["2026-11-02", "2026-11-09"]
+
+
+@pytest.mark.parametrize("rule, expected", [
+    ("freq=weekly;byday=Mon,thursday", "RRULE:FREQ=WEEKLY;BYDAY=MO,TH"),
+    ("RRULE:FREQ=WEEKLY;BYDAY=2MO", "RRULE:FREQ=WEEKLY;BYDAY=MO"),
+    ("FREQ=DAILY;COUNT=5000;UNTIL=20270101", "RRULE:FREQ=DAILY;COUNT=1000"),
+    ("FREQ=MONTHLY;INTERVAL=1;BYDAY=-1FR", "RRULE:FREQ=MONTHLY;BYDAY=-1FR"),
+    ("FREQ=YEARLY;BYMONTH=2,4;BYMONTHDAY=30", "RRULE:FREQ=YEARLY;BYMONTH=2,4;BYMONTHDAY=30"),
+])
+def test_normalize_rule_repairs(rule, expected):
+    assert recurrence.normalize_rule(rule, START) == expected
+
+
+@pytest.mark.parametrize("rule", [
+    "", "FREQ=HOURLY", "BYDAY=MO", "FREQ=WEEKLY;BYHOUR=9", "FREQ=MONTHLY;BYWEEKNO=3",
+    "FREQ=WEEKLY;BYMONTHDAY=1", "FREQ=MONTHLY;BYYEARDAY=100", "FREQ=DAILY;UNTIL=20250101",
+    "FREQ=YEARLY;BYMONTH=2;BYMONTHDAY=30", "FREQ=MONTHLY;BYMONTH=2;BYMONTHDAY=31",
+    "FREQ=YEARLY;BYYEARDAY=366;BYMONTH=1",
+])
+def test_normalize_rule_rejects(rule):
+    with pytest.raises(ValueError):
+        recurrence.normalize_rule(rule, START)
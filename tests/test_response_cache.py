@@ -0,0 +1,93 @@
+from datetime import datetime
+
+import pytest
+
+import response_cache
+from response_cache import ResponseCache, canonicalize
+
+
+@pytest.fixture
+def today(monkeypatch):
+    """Sets the date the cache sees; returns a setter"""
+    current = {"now": datetime(2026, 10, 18, 9, 0)}  # A Sunday
+
+    class FakeDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return current["now"]
+
+    monkeypatch.setattr(response_cache, "datetime", FakeDatetime)
+
+    def set_today(year, month, day):
+        current["now"] = datetime(year, month, day, 9, 0)
+
+    return set_today
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(path=str(tmp_path / "cache.db"))
+
+
+def event(day, **fields):
+    return {"title": "Sync", "date": day, "start_time": "10:00", "end_time": "11:00", **fields}
+
+
+def test_today_prefix_and_spacing_are_ignored(today):
+    assert canonicalize("Today's date is 2026-10-18. Weekly  sync tomorrow 10am.") == \
+        canonicalize("weekly sync tomorrow 10am")
+
+
+@pytest.mark.parametrize("content", [
+    "lunch on the 15th at noon",
+    "review next month on the 3rd",
+    "pay rent at the end of the month",
+    "book club monthly at 7pm",
+    "I may be late, lunch tomorrow at noon",
+])
+def test_day_of_month_prompts_are_not_cached(today, cache, content):
+    assert canonicalize(content)[0] is None
+    cache.put(content, [event("2026-10-19")])
+    assert cache.get(content) is None
+
+
+@pytest.mark.parametrize("content", [
+    "party this weekend", "lunch on friday", "meeting next week", "weekly sync tomorrow 10am",
+])
+def test_weekday_dependent_prompts_are_keyed_by_weekday(today, cache, content):
+    cache.put(content, [event("2026-10-24")])
+    assert cache.get(content) == [event("2026-10-24")]
+    today(2026, 10, 19)  # Monday: a different offset
+    assert cache.get(content) is None
+    today(2026, 10, 25)  # The next Sunday: the same offset a week later
+    assert cache.get(content) == [event("2026-10-31")]
+
+
+def test_relative_prompt_hits_on_any_day(today, cache):
+    cache.put("dentist tomorrow at 3pm", [event("2026-10-19")])
+    today(2026, 10, 21)
+    assert cache.get("dentist tomorrow at 3pm") == [event("2026-10-22")]
+
+
+def test_relative_until_moves_with_the_event(today, cache):
+    cache.put("standup daily for 14 days starting tomorrow", [event("2026-10-19", recurrence="RRULE:FREQ=DAILY;UNTIL=20261102")])
+    today(2026, 10, 20)
+    assert cache.get("standup daily for 14 days starting tomorrow")[0]["recurrence"] == "RRULE:FREQ=DAILY;UNTIL=20261104"
+
+
+def test_absolute_dates_are_kept_until_they_pass(today, cache):
+    for content in ("dentist march 5 at 3pm", "offsite 2026-11-03"):
+        assert canonicalize(content)[1] is False
+    cache.put("offsite 2026-11-03", [event("2026-11-03")])
+    today(2026, 10, 30)
+    assert cache.get("offsite 2026-11-03") == [event("2026-11-03")]
+    today(2026, 11, 4)
+    assert cache.get("offsite 2026-11-03") is None
+
+
+def test_entries_survive_a_restart(today, tmp_path):
+    path = str(tmp_path / "cache.db")
+    ResponseCache(path=path).put("dentist tomorrow at 3pm", [event("2026-10-19")])
+    reopened = ResponseCache(path=path)
+    assert reopened.get("dentist tomorrow at 3pm") == [event("2026-10-19")]
+    assert reopened.stats()["disk_hits"] == 1
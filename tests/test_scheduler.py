@@ -0,0 +1,207 @@
+import asyncio
+import socket
+
+import pytest
+
+import scheduler
+from scheduler import Backend, CircuitBreaker, CircuitOpenError, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(scheduler.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(scheduler.time, "sleep", clock.sleep)
+    monkeypatch.setattr(scheduler.random, "uniform", lambda low, high: high)
+    return clock
+
+
+class ApiError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.status_code = status
+
+
+def test_bucket_charges_the_full_cost_of_a_large_batch(clock):
+    bucket = TokenBucket(rate=10.0, burst=10)
+    assert bucket.try_acquire(50) == 0
+    # The 50-insert batch left the bucket 40 tokens in debt: the next call waits for 41
+    assert bucket.try_acquire(1) == pytest.approx(4.1)
+    clock.now += 4.1
+    assert bucket.try_acquire(1) == 0
+
+
+def test_bucket_sustains_its_rate_for_batches(clock):
+    bucket = TokenBucket(rate=10.0, burst=10)
+    start = clock.now
+    for _ in range(5):
+        bucket.acquire(50)
+    # The first batch goes at once; each later one waits 5s for its 50 units at 10/s
+    assert clock.now - start == pytest.approx(20.0)
+
+
+def test_bucket_rate_backs_off_and_recovers(clock):
+    bucket = TokenBucket(rate=10.0, burst=10)
+    bucket.throttled()
+    assert bucket.rate == 5.0
+    bucket.succeeded()
+    assert bucket.rate == 5.5
+
+
+def test_breaker_opens_after_repeated_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=30)
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    clock.now += 30
+    breaker.before_call()  # Half-open: one trial
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def open_backend(clock, **settings):
+    backend = Backend("test", rate=1000.0, burst=1000, max_concurrency=2, max_retries=0,
+                      failure_threshold=1, cooldown=10, **settings)
+    with pytest.raises(ApiError):
+        scheduler.call(backend, raise_error, ApiError(503))
+    clock.now += 10
+    return backend
+
+
+def raise_error(error):
+    raise error
+
+
+@pytest.mark.parametrize("trial_error", [ApiError(429), ApiError(400)])
+def test_half_open_trial_that_reaches_the_backend_closes_the_breaker(clock, trial_error):
+    backend = open_backend(clock)
+    with pytest.raises(ApiError):
+        scheduler.call(backend, raise_error, trial_error)
+    assert scheduler.call(backend, lambda: "ok") == "ok"
+
+
+def test_half_open_trial_that_fails_reopens_the_breaker(clock):
+    backend = open_backend(clock)
+    with pytest.raises(ApiError):
+        scheduler.call(backend, raise_error, ApiError(500))
+    with pytest.raises(CircuitOpenError):
+        scheduler.call(backend, lambda: "ok")
+    clock.now += 10
+    assert scheduler.call(backend, lambda: "ok") == "ok"
+
+
+def test_call_retries_transient_errors_with_retry_after(clock):
+    backend = Backend("test", rate=1000.0, burst=1000, max_concurrency=2)
+    error = ApiError(429)
+    error.response = type("Response", (), {"headers": {"retry-after": "3"}})()
+    outcomes = [error, ApiError(502), "done"]
+
+    def flaky():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert scheduler.call(backend, flaky) == "done"
+    assert clock.slept[0] == 3.0
+    assert backend.bucket.rate < backend.bucket.max_rate
+
+
+def test_call_raises_permanent_errors_at_once(clock):
+    backend = Backend("test", rate=1000.0, burst=1000, max_concurrency=2)
+    calls = []
+
+    def missing_file():
+        calls.append(1)
+        raise FileNotFoundError("config/credentials.json")
+
+    with pytest.raises(FileNotFoundError):
+        scheduler.call(backend, missing_file)
+    assert calls == [1]
+
+
+def test_acall_retries_like_call(clock):
+    backend = Backend("test", rate=1000.0, burst=1000, max_concurrency=2)
+    outcomes = [ConnectionResetError(), "done"]
+
+    async def flaky():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    async def no_sleep(seconds):
+        pass
+
+    scheduler.asyncio.sleep, real_sleep = no_sleep, asyncio.sleep
+    try:
+        assert asyncio.run(scheduler.acall(backend, flaky)) == "done"
+    finally:
+        scheduler.asyncio.sleep = real_sleep
+
+
+@pytest.mark.parametrize("error, retryable", [
+    (ApiError(429), True),
+    (ApiError(503), True),
+    (ApiError(400), False),
+    (ConnectionResetError(), True),
+    (TimeoutError(), True),
+    (socket.gaierror(), True),
+    (FileNotFoundError(), False),
+    (PermissionError(), False),
+    (ValueError(), False),
+])
+def test_is_retryable(error, retryable):
+    assert scheduler.is_retryable(error) is retryable
+
+
+def test_calendar_quota_403_counts_as_throttling():
+    error = ApiError(403)
+    error.content = b'{"error": {"errors": [{"reason": "rateLimitExceeded"}]}}'
+    assert scheduler.is_throttled(error)
+
+
+def test_call_once_records_the_failure_without_retrying(clock):
+    backend = Backend("once", rate=100.0, burst=100, max_concurrency=1)
+    attempts = []
+
+    def throttled():
+        attempts.append(1)
+        raise ApiError(429)
+
+    with pytest.raises(ApiError):
+        scheduler.call_once(backend, throttled)
+    assert len(attempts) == 1 and clock.slept == []
+    assert backend.bucket.rate < backend.bucket.max_rate
+
+
+def test_stream_holds_the_concurrency_slot_until_read(clock):
+    backend = Backend("stream", rate=100.0, burst=100, max_concurrency=1)
+
+    class Stream(list):
+        closed = False
+
+        def close(self):
+            self.closed = True
+
+    opened = Stream([1, 2])
+    with scheduler.stream(backend, lambda: opened) as stream:
+        assert not backend.concurrency.acquire(blocking=False)
+        assert list(stream) == [1, 2]
+    assert opened.closed
+    assert backend.concurrency.acquire(blocking=False)
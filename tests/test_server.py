@@ -0,0 +1,191 @@
+import asyncio
+import json
+
+import pytest
+
+import ai_model
+import calendar_service
+import scheduler
+import server
+from server import ApiKeys, EventElfServer, HTTPError, UserCalendars
+
+
+class ApiError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.status_code = status
+
+
+class FakeManager:
+    def __init__(self, token_path=None, error=None, background_refresh=True):
+        self.token_path = token_path
+        self.error = error
+
+    def get_service(self, interactive=True):
+        assert not interactive
+        if self.error is not None:
+            raise self.error
+        return object()
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def tokens(tmp_path, monkeypatch):
+    for user in ("ana", "bob"):
+        (tmp_path / f"{user}.pickle").write_bytes(b"")
+    monkeypatch.setattr(server, "CalendarServiceManager", FakeManager)
+    keys = ApiKeys(str(tmp_path))
+    KEYS.update((user, keys.issue(user)) for user in ("ana", "bob"))
+    return tmp_path
+
+
+KEYS = {}
+
+
+def dispatch(app, method, path, body, user="ana", headers=None):
+    """(status, payload) of one request, authorized as user (None for no Authorization header)"""
+    raw = json.dumps(body).encode("utf-8")
+    headers = dict({"content-length": str(len(raw))}, **(headers or {}))
+    if user is not None:
+        headers["authorization"] = f"Bearer {KEYS[user]}"
+
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(raw)
+        reader.feed_eof()
+        return await app._dispatch(method, path, headers, reader)
+
+    status, payload, _ = asyncio.run(run())
+    return status, payload
+
+
+def test_each_user_has_their_own_calendar_backend(tokens, monkeypatch):
+    used = []
+
+    def create_events(events, service=None, event_ids=None, backend="calendar"):
+        used.append(backend)
+        if backend.name == "calendar:ana":
+            # Ana is throttled until her breaker opens
+            scheduler.call(backend, lambda: (_ for _ in ()).throw(ApiError(503)))
+        return [{"event": event, "created": {"id": "x"}, "error": None} for event in events]
+
+    monkeypatch.setattr(server, "create_events", create_events)
+    monkeypatch.setattr(scheduler.time, "sleep", lambda seconds: None)
+    calendars = UserCalendars(str(tokens))
+    with pytest.raises(Exception):
+        calendars.create("ana", [{}], None)
+    assert calendars.get("ana")[2].breaker.opened_at is not None
+    assert calendars.create("bob", [{}], None)[0]["created"] == {"id": "x"}
+    assert used[0] is not used[1]
+    assert used[0] is not scheduler.backends["calendar"]
+    assert used[1].breaker.opened_at is None
+
+
+def test_missing_token_file_is_401(tokens):
+    with pytest.raises(HTTPError) as raised:
+        UserCalendars(str(tokens)).get("carol")
+    assert raised.value.status == 401
+
+
+def test_user_who_must_sign_in_again_gets_401(tokens, monkeypatch):
+    class RefreshError(Exception):
+        pass
+
+    for error in (RuntimeError("Saved credentials cannot be refreshed"), RefreshError("invalid_grant")):
+        monkeypatch.setattr(server, "CalendarServiceManager", lambda token_path, error=error, **kwargs: FakeManager(token_path, error))
+        app = EventElfServer(tokens_dir=str(tokens))
+        status, payload = dispatch(app, "POST", "/create", {"events": [{"title": "x"}]})
+        assert status == 401, payload
+
+
+@pytest.mark.parametrize("session", [{"a": 1}, ["x"], 5, None])
+def test_confirm_with_a_bad_session_field_is_400(tokens, session):
+    status, payload = dispatch(EventElfServer(tokens_dir=str(tokens)), "POST", "/confirm", {"session": session})
+    assert status == 400
+    assert "session" in payload["error"]
+
+
+def test_parse_then_confirm(tokens, monkeypatch):
+    events = [{"title": "Sync", "date": "2026-10-19", "start_time": "10:00", "end_time": "11:00"}]
+
+    async def run_conversation_async(prompt):
+        return events, "Confirm?"
+
+    created = []
+
+    def create_events(events, service=None, event_ids=None, backend="calendar"):
+        created.append(event_ids)
+        return [{"event": event, "created": {"id": event_id}, "error": None} for event, event_id in zip(events, event_ids)]
+
+    monkeypatch.setattr(ai_model, "run_conversation_async", run_conversation_async)
+    monkeypatch.setattr(server, "create_events", create_events)
+    app = EventElfServer(tokens_dir=str(tokens))
+    status, parsed = dispatch(app, "POST", "/parse", {"prompt": "sync tomorrow at 10am"})
+    assert status == 200 and parsed["events"] == events
+    status, payload = dispatch(app, "POST", "/confirm", {"session": parsed["session"]}, user="bob")
+    assert status == 404  # Another user's session
+    status, payload = dispatch(app, "POST", "/confirm", {"session": parsed["session"]})
+    assert status == 200
+    assert payload["results"][0]["id"] == created[0][0]
+    status, payload = dispatch(app, "POST", "/confirm", {"session": parsed["session"]})
+    assert status == 404  # Confirmed sessions are gone
+
+
+def test_cache_lookup_runs_off_the_event_loop(monkeypatch):
+    threads = []
+
+    def local_events(content, use_history=True):
+        threads.append(server.threading.current_thread())
+        assert not use_history
+        return [{"title": "Sync"}]
+
+    monkeypatch.setattr(ai_model, "_local_events", local_events)
+    monkeypatch.setattr(ai_model, "build_confirmation_text", lambda events, notes=None: "Confirm?")
+    events, message = asyncio.run(ai_model.run_conversation_async("sync tomorrow at 10am"))
+    assert events == [{"title": "Sync"}]
+    assert threads[0] is not server.threading.main_thread()
+
+
+def test_requests_need_a_valid_bearer_key(tokens):
+    app = EventElfServer(tokens_dir=str(tokens))
+    assert dispatch(app, "POST", "/create", {"events": []}, user=None)[0] == 401
+    status, _ = dispatch(app, "POST", "/create", {"events": []}, user=None, headers={"authorization": "Bearer guess"})
+    assert status == 401
+    assert dispatch(app, "GET", "/metrics", {}, user=None)[0] == 401
+    assert dispatch(app, "GET", "/health", {}, user=None)[0] == 200
+    # Only a hash of each key is stored
+    assert KEYS["ana"] not in (tokens / server.API_KEYS_FILE).read_text()
+
+
+def test_user_comes_from_the_key_not_the_body(tokens, monkeypatch):
+    users = []
+
+    def create(user, events, event_ids):
+        users.append(user)
+        return []
+
+    app = EventElfServer(tokens_dir=str(tokens))
+    monkeypatch.setattr(app.calendars, "create", create)
+    assert dispatch(app, "POST", "/create", {"user": "ana", "events": []}, user="bob")[0] == 200
+    assert users == ["bob"]
+
+
+@pytest.mark.parametrize("length, status", [("12x", 400), ("-1", 400), (str(server.MAX_BODY + 1), 413)])
+def test_unread_body_closes_the_connection(tokens, length, status):
+    app = EventElfServer(tokens_dir=str(tokens))
+
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(b"GET /health HTTP/1.1\r\n\r\n")
+        reader.feed_eof()
+        return await app._dispatch("POST", "/create", {"content-length": length}, reader)
+
+    assert asyncio.run(run())[::2] == (status, True)
+
+
+def test_cached_users_start_no_refresh_timers(tokens, monkeypatch):
+    monkeypatch.setattr(server, "CalendarServiceManager", calendar_service.CalendarServiceManager)
+    manager = UserCalendars(str(tokens)).get("ana")[0]
+    assert manager.background_refresh is False
@@ -0,0 +1,86 @@
+import os
+import time
+
+import pytest
+
+import calendar_service
+import outbox
+import watch
+
+EVENT = {"title": "Standup", "date": "2026-10-19", "start_time": "09:00", "end_time": "09:30"}
+
+
+@pytest.fixture
+def box(tmp_path, monkeypatch):
+    box = outbox.Outbox(str(tmp_path / "outbox.db"))
+    monkeypatch.setattr(outbox, "outbox", box)
+    monkeypatch.setattr(box, "start", lambda: pytest.fail("the background flusher was started"))
+    return box
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    sent = []
+
+    def create_events(events, event_ids=None, **kwargs):
+        sent.extend(event_ids)
+        return [{"event": event, "created": {"id": event_id}, "error": None} for event, event_id in zip(events, event_ids)]
+
+    monkeypatch.setattr(calendar_service, "create_events", create_events)
+    return sent
+
+
+def drop(directory, name, text):
+    path = directory / name
+    path.write_text(text)
+    past = time.time() - 60
+    os.utime(path, (past, past))
+
+
+def test_own_text_stops_at_quotes_and_signature():
+    body = "Lunch Friday at noon?\n> earlier mail\n--\nAna\n"
+    assert watch.own_text(body) == "Lunch Friday at noon?"
+
+
+def test_commit_once_flushes_before_returning(tmp_path, monkeypatch, box, sent):
+    inbox = tmp_path / "inbox"
+    inbox.mkdir()
+    drop(inbox, "a.txt", "standup monday 9am")
+    drop(inbox, "b.txt", "standup monday 9am\n")  # Same text: parsed once
+    monkeypatch.setattr(watch, "parse_prompt", lambda text: [EVENT])
+    assert watch.run([str(inbox)], workers=1, commit=True, once=True, state_path=str(tmp_path / "watch.db")) == 0
+    assert len(sent) == 1
+    assert box.pending() == []
+
+
+def test_review_reports_unreachable_calendar_as_pending(tmp_path, monkeypatch, box, capsys):
+    state = watch.WatchState(str(tmp_path / "watch.db"))
+    state.add("h1", "a.txt", "standup")
+    state.finish("h1", "parsed", [EVENT])
+    state.add("h2", "b.txt", "other")
+    state.finish("h2", "parsed", [dict(EVENT, title="Other")])
+    state.close()
+
+    def create_events(events, **kwargs):
+        raise ConnectionError("offline")
+
+    monkeypatch.setattr(calendar_service, "create_events", create_events)
+    assert watch.review(str(tmp_path / "watch.db"), answer="1") == 1
+    out = capsys.readouterr()
+    assert "Sent 0 event(s) to the calendar, 0 failed, 1 pending." in out.out
+    assert "offline" in out.err
+    assert [params["title"] for _, params, _ in box.pending()] == ["Standup"]
+
+    state = watch.WatchState(str(tmp_path / "watch.db"))
+    assert state.awaiting_review() == []
+    state.close()
+
+
+def test_review_sends_chosen_items(tmp_path, box, sent, capsys):
+    state = watch.WatchState(str(tmp_path / "watch.db"))
+    state.add("h1", "a.txt", "standup")
+    state.finish("h1", "parsed", [EVENT])
+    state.close()
+    assert watch.review(str(tmp_path / "watch.db"), answer="all") == 0
+    assert len(sent) == 1
+    assert "Sent 1 event(s) to the calendar, 0 failed, 0 pending." in capsys.readouterr().out
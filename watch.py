@@ -0,0 +1,451 @@
+"""
+Watched-inbox ingestion: turn dropped text files, .eml files and mbox mail into events.
+
+Usage:
+    python main.py watch DIR_OR_MBOX [...] [--commit] [--workers 4] [--interval 2]
+    python main.py watch --review
+
+Directories are polled for new or changed .txt/.md/.eml files and mbox files are tailed
+from where the last run stopped. Mail is read with the streaming email parser, and only
+the subject and the message's own text go to run_conversation (no quoted replies,
+signatures or attachments). Items are deduplicated by a hash of that text, so the same
+invite arriving as a file and as mail is parsed once.
+
+Parsed events either go straight to the outbox (--commit) or wait in the state file until
+`watch --review` confirms them in one batch. Only a bounded number of items is read ahead
+of the worker pool and at most --max-per-hour items are parsed per hour, so hundreds of
+files landing at once cost neither unbounded memory nor unbounded API spend.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from email import policy
+from email.parser import BytesFeedParser
+from html.parser import HTMLParser
+
+from ingest import parse_prompt
+from progress import Progress
+
+TEXT_SUFFIXES = (".txt", ".text", ".md")
+MAIL_SUFFIXES = (".eml",)
+MBOX_SUFFIXES = (".mbox", ".mbx")
+# Only this much text of one item is sent to the model
+MAX_TEXT_CHARS = 8000
+# Mail beyond this size is mostly attachments; the rest is not parsed
+MAX_MAIL_BYTES = 1024 * 1024
+READ_CHUNK = 64 * 1024
+# Files modified more recently than this may still be being written
+SETTLE_SECONDS = 1.0
+
+REPLY_HEADER_RE = re.compile(r"^(?:On .+ wrote:|-{2,}\s*Original Message\s*-{2,}|From: .+ Sent: .+)\s*$", re.IGNORECASE)
+MBOX_FROM_ESCAPE_RE = re.compile(rb"^>(>*From )")
+
+
+class _TextExtractor(HTMLParser):
+    """Visible text of an HTML mail body, with line breaks at block elements"""
+
+    BLOCKS = {"p", "div", "br", "tr", "li", "h1", "h2", "h3", "h4", "table", "ul", "ol"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("script", "style", "head"):
+            self._skip += 1
+        elif tag in self.BLOCKS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style", "head"):
+            self._skip = max(0, self._skip - 1)
+        elif tag in self.BLOCKS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.parts.append(data)
+
+
+def html_to_text(html):
+    extractor = _TextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    return re.sub(r"[ \t]+", " ", "".join(extractor.parts))
+
+
+def own_text(body):
+    """The part of a mail body its sender wrote: stops at the signature or quoted reply"""
+    lines = []
+    for line in body.splitlines():
+        if line.rstrip() == "--" or REPLY_HEADER_RE.match(line.strip()):
+            break
+        if line.lstrip().startswith(">"):
+            continue
+        lines.append(line.rstrip())
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+def message_text(message):
+    """Subject plus the plain (or de-HTMLed) body of a parsed email.message.EmailMessage"""
+    subject = str(message.get("Subject", "") or "").strip()
+    body = ""
+    part = message.get_body(preferencelist=("plain", "html"))
+    if part is not None:
+        try:
+            body = part.get_content()
+        except (LookupError, ValueError):
+            body = part.get_payload(decode=True).decode("utf-8", errors="replace")
+        if part.get_content_subtype() == "html":
+            body = html_to_text(body)
+    text = f"{subject}\n{own_text(body)}" if subject else own_text(body)
+    return text.strip()[:MAX_TEXT_CHARS]
+
+
+def read_mail(path):
+    """Parses an .eml file in chunks, ignoring whatever lies past MAX_MAIL_BYTES"""
+    parser = BytesFeedParser(policy=policy.default)
+    read = 0
+    with open(path, "rb") as f:
+        while read < MAX_MAIL_BYTES:
+            chunk = f.read(READ_CHUNK)
+            if not chunk:
+                break
+            parser.feed(chunk)
+            read += len(chunk)
+    return message_text(parser.close())
+
+
+def read_text(path):
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return f.read(MAX_TEXT_CHARS).strip()
+
+
+def iter_mbox(path, offset, final=False):
+    """
+    Yields (message_text, end_offset) for each complete message after offset in an mbox.
+
+    A message counts as complete once the next "From " line follows it, or, with final,
+    at the end of the file (the writer is done with it).
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        parser = None
+        size = 0
+        position = offset
+        start = None
+        previous_blank = True
+        for line in f:
+            line_start = position
+            position += len(line)
+            if line.startswith(b"From ") and (start is None or previous_blank):
+                if parser is not None:
+                    yield message_text(parser.close()), line_start
+                parser = BytesFeedParser(policy=policy.default)
+                size = 0
+                start = line_start
+            elif parser is not None:
+                if size < MAX_MAIL_BYTES:
+                    parser.feed(MBOX_FROM_ESCAPE_RE.sub(rb"\1", line))
+                    size += len(line)
+            previous_blank = line.strip() == b""
+        if parser is not None and final:
+            yield message_text(parser.close()), position
+
+
+def content_hash(text):
+    """Hash of the normalized text, so whitespace or case changes do not count as new"""
+    normalized = re.sub(r"\s+", " ", text).strip().lower()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class WatchState:
+    """SQLite record of read positions, seen items and events awaiting review"""
+
+    def __init__(self, path="watch.db"):
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # How far each file has been read: (size, mtime) for whole files, a byte offset for mboxes
+        self._db.execute("CREATE TABLE IF NOT EXISTS sources (path TEXT PRIMARY KEY, size INTEGER, mtime REAL, offset INTEGER)")
+        # status: 'queued', 'parsed' (awaiting review), 'committed', 'rejected' or 'error'
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS items (hash TEXT PRIMARY KEY, source TEXT, text TEXT, "
+            "status TEXT, events TEXT, error TEXT, at REAL)"
+        )
+        self._db.commit()
+
+    def source(self, path):
+        return self._db.execute("SELECT size, mtime, offset FROM sources WHERE path = ?", (path,)).fetchone()
+
+    def set_source(self, path, size, mtime, offset=0):
+        with self._db:
+            self._db.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)", (path, size, mtime, offset))
+
+    def add(self, item_hash, source, text):
+        """Queues an item unless the same text was seen before; returns whether it was new"""
+        with self._db:
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO items (hash, source, text, status, at) VALUES (?, ?, ?, 'queued', ?)",
+                (item_hash, source, text, time.time())
+            )
+        return cursor.rowcount == 1
+
+    def queued(self):
+        """[(hash, source, text)] for items read but not parsed yet, e.g. after a crash"""
+        return self._db.execute("SELECT hash, source, text FROM items WHERE status = 'queued' ORDER BY at").fetchall()
+
+    def finish(self, item_hash, status, events=None, error=None):
+        with self._db:
+            self._db.execute(
+                "UPDATE items SET status = ?, events = ?, error = ?, text = NULL, at = ? WHERE hash = ?",
+                (status, json.dumps(events) if events is not None else None, error, time.time(), item_hash)
+            )
+
+    def awaiting_review(self):
+        """[(hash, source, events)] for parsed items that still need a yes or no"""
+        rows = self._db.execute("SELECT hash, source, events FROM items WHERE status = 'parsed' ORDER BY at").fetchall()
+        return [(item_hash, source, json.loads(events)) for item_hash, source, events in rows]
+
+    def close(self):
+        self._db.close()
+
+
+def scan(paths, state, now=None):
+    """
+    Yields (source, text) for every new item in the watched paths, oldest file first.
+
+    Read positions are saved as items are yielded, so a consumer that stops early (because
+    its queue is full) picks up where it left off on the next scan.
+    """
+    now = now or time.time()
+    for root in paths:
+        if os.path.isdir(root):
+            entries = [entry for entry in os.scandir(root) if entry.is_file()]
+            entries.sort(key=lambda entry: entry.stat().st_mtime)
+            files = [entry.path for entry in entries]
+        else:
+            files = [root]
+        for path in files:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            suffix = os.path.splitext(path)[1].lower()
+            settled = now - stat.st_mtime >= SETTLE_SECONDS
+            known = state.source(path)
+
+            if suffix in MBOX_SUFFIXES or (not os.path.isdir(root) and suffix not in TEXT_SUFFIXES + MAIL_SUFFIXES):
+                offset = known[2] if known and known[2] <= stat.st_size else 0
+                if known and offset == stat.st_size:
+                    continue
+                for text, end in iter_mbox(path, offset, final=settled):
+                    state.set_source(path, stat.st_size, stat.st_mtime, end)
+                    if text:
+                        yield path, text
+                continue
+
+            if suffix not in TEXT_SUFFIXES + MAIL_SUFFIXES or not settled:
+                continue
+            if known and (known[0], known[1]) == (stat.st_size, stat.st_mtime):
+                continue
+            try:
+                text = read_mail(path) if suffix in MAIL_SUFFIXES else read_text(path)
+            except (OSError, ValueError) as e:
+                print(f"Could not read {path}: {e}", file=sys.stderr)
+                text = ""
+            state.set_source(path, stat.st_size, stat.st_mtime)
+            if text:
+                yield path, text
+
+
+def run(paths, workers=4, commit=False, interval=2.0, once=False, state_path="watch.db",
+        max_per_hour=200, read_ahead=None):
+    """
+    Watches paths until interrupted (or, with once, until everything there is parsed).
+
+    Args:
+        paths: Directories and mbox files to watch
+        workers: Items parsed concurrently
+        commit: Create parsed events right away instead of holding them for review
+        interval: Seconds between scans
+        once: Stop after one scan has been fully processed
+        state_path: SQLite file with read positions, seen items and the review queue
+        max_per_hour: Items sent to run_conversation per hour at most
+        read_ahead: Items read but not yet finished at most (default 2 * workers)
+
+    Returns:
+        0, or 1 if any item failed to parse
+    """
+    state = WatchState(state_path)
+    read_ahead = read_ahead or workers * 2
+    progress = Progress("prompts", "events", "errors")
+    started = deque()  # Start times of recent items, for max_per_hour
+    committed_ids = []  # With once, the daemon flusher may not get to them before exit: flushed at the end
+    if commit:
+        from outbox import outbox
+
+        outbox.add_listener(lambda results: print(
+            f"Created {sum(1 for r in results if r['error'] is None)} event(s), "
+            f"{sum(1 for r in results if r['error'] is not None)} failed", file=sys.stderr
+        ))
+
+    def finish(item_hash, source, future):
+        try:
+            events = future.result()
+        except Exception as e:
+            state.finish(item_hash, "error", error=str(e))
+            progress.errors += 1
+            print(f"{source}: {e}", file=sys.stderr)
+        else:
+            progress.events += len(events)
+            if commit:
+                committed_ids.extend(outbox.enqueue(events, start=not once))
+                state.finish(item_hash, "committed", events)
+            else:
+                state.finish(item_hash, "parsed", events)
+            print(f"{source}: {len(events)} event(s) {'sent to the calendar' if commit else 'waiting for review'}",
+                  file=sys.stderr)
+        progress.prompts += 1
+        progress.update()
+
+    def reap(in_flight, timeout=None):
+        done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            finish(*in_flight.pop(future), future)
+
+    def budget_left():
+        cutoff = time.monotonic() - 3600
+        while started and started[0] < cutoff:
+            started.popleft()
+        return len(started) < max_per_hour
+
+    in_flight = {}
+    # Items a crash left half done come first
+    backlog = deque(state.queued())
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="eventelf-watch") as executor:
+            while True:
+                items = scan(paths, state)
+                while True:
+                    # Backpressure: stop reading while the pool is full or the hourly budget is spent
+                    while len(in_flight) >= read_ahead:
+                        reap(in_flight)
+                    if not budget_left():
+                        break
+                    if backlog:
+                        item_hash, source, text = backlog.popleft()
+                    else:
+                        item = next(items, None)
+                        if item is None:
+                            break
+                        source, text = item
+                        item_hash = content_hash(text)
+                        if not state.add(item_hash, source, text):
+                            continue  # Seen before, e.g. the same invite as a file and as mail
+                    started.append(time.monotonic())
+                    future = executor.submit(parse_prompt, text)
+                    in_flight[future] = (item_hash, source)
+                items.close()
+
+                if once and (not in_flight or not budget_left()):
+                    while in_flight:
+                        reap(in_flight)
+                    break
+                if in_flight:
+                    reap(in_flight, timeout=interval)
+                else:
+                    time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        progress.update(force=True)
+        state.close()
+    if committed_ids and once:
+        progress.errors += _flush(outbox, committed_ids)
+    return 1 if progress.errors else 0
+
+
+def _flush(outbox, event_ids):
+    """Sends enqueued events now; returns how many are left pending (they stay in the outbox)"""
+    try:
+        outbox.flush(event_ids)
+    except Exception as e:
+        print(f"Could not reach the calendar: {e}", file=sys.stderr)
+    left = len(outbox.pending(event_ids))
+    if left:
+        print(f"{left} event(s) are still pending in the outbox and will be sent the next time it runs.",
+              file=sys.stderr)
+    return left
+
+
+def review(state_path="watch.db", answer=None):
+    """
+    Shows every parsed item waiting for review and creates the ones confirmed, in one batch.
+
+    Args:
+        state_path: The watch state file
+        answer: The reply to use instead of asking ("all", "none" or item numbers)
+
+    Returns:
+        0, or 1 if any confirmed event could not be created
+    """
+    from outbox import outbox
+
+    state = WatchState(state_path)
+    pending = state.awaiting_review()
+    if not pending:
+        print("Nothing is waiting for review.")
+        state.close()
+        return 0
+
+    for number, (_, source, events) in enumerate(pending, start=1):
+        print(f"[{number}] {source}")
+        for event in events:
+            line = f"    {event.get('title', 'N/A')}: {event.get('date', 'N/A')} {event.get('start_time', '')}-{event.get('end_time', '')}"
+            if event.get("recurrence"):
+                line += f" ({event['recurrence']})"
+            print(line)
+    if answer is None:
+        answer = input("Create which? (all / none / numbers like 1 3): ")
+    answer = answer.strip().lower()
+    if answer in ("all", "a", "yes", "y"):
+        chosen = set(range(1, len(pending) + 1))
+    elif answer in ("none", "n", "no", ""):
+        chosen = set()
+    else:
+        chosen = {int(number) for number in re.findall(r"\d+", answer) if 1 <= int(number) <= len(pending)}
+
+    confirmed = [event for number, (_, _, events) in enumerate(pending, start=1) if number in chosen
+                 for event in events]
+    # Recorded durably in the outbox before the items are marked committed
+    event_ids = outbox.enqueue(confirmed, start=False) if confirmed else []
+    for number, (item_hash, _, events) in enumerate(pending, start=1):
+        state.finish(item_hash, "committed" if number in chosen else "rejected", events)
+    state.close()
+    if not confirmed:
+        print("Nothing created.")
+        return 0
+
+    created = []
+    failed = []
+    wanted = set(event_ids)
+
+    def on_results(results):
+        for result in results:
+            if result["event_id"] in wanted:
+                (created if result["error"] is None else failed).append(result)
+
+    outbox.add_listener(on_results)
+    left = _flush(outbox, event_ids)
+    print(f"Sent {len(created)} event(s) to the calendar, {len(failed)} failed, {left} pending.")
+    for result in failed:
+        print(f"    {result['event'].get('title', 'N/A')}: {result['error']}")
+    return 1 if failed or left else 0